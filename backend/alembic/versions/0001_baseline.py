@@ -0,0 +1,40 @@
+"""Baseline: schema as of database/migrations/008_hashed_api_keys.sql
+
+Databases created by database/init.sql (or brought up to date with the
+numbered SQL migrations) already have this schema; the revision leaves them
+untouched and just records them as current. Empty databases get init.sql
+on PostgreSQL when it is available (RLS policies, triggers), otherwise the
+tables and indexes declared on the models.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-16
+"""
+from pathlib import Path
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.database import Base
+import app.models  # noqa: F401
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+INIT_SQL = Path(__file__).resolve().parents[3] / "database" / "init.sql"
+
+
+def upgrade():
+    bind = op.get_bind()
+    if sa.inspect(bind).has_table("users"):
+        return
+    if bind.dialect.name == "postgresql" and INIT_SQL.exists():
+        bind.exec_driver_sql(INIT_SQL.read_text())
+    else:
+        Base.metadata.create_all(bind=bind)
+
+
+def downgrade():
+    raise NotImplementedError("The baseline schema cannot be downgraded")
@@ -0,0 +1,35 @@
+"""Leave users.updated_at alone when only last_login is written
+
+Logins are written in batches (app/utils/last_login.py); without the WHEN
+clause every batched row would also be stamped as updated.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-16
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def _replace_trigger(when: str):
+    op.execute("DROP TRIGGER IF EXISTS update_users_updated_at ON users")
+    op.execute(
+        "CREATE TRIGGER update_users_updated_at BEFORE UPDATE ON users FOR EACH ROW "
+        f"{when}EXECUTE FUNCTION update_updated_at_column()"
+    )
+
+
+def upgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    _replace_trigger("WHEN (OLD.last_login IS NOT DISTINCT FROM NEW.last_login) ")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    _replace_trigger("")
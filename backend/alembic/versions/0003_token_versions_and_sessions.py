@@ -0,0 +1,41 @@
+"""Per-user token versions and device details on refresh tokens
+
+users.token_version is embedded in every JWT; bumping it revokes all of the
+user's tokens. refresh_tokens.user_agent/ip_address describe the device of
+each session for /api/auth/sessions. Databases created from the current
+init.sql (or the models) already have the columns.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+NEW_COLUMNS = {
+    "users": [sa.Column("token_version", sa.Integer(), server_default="0", nullable=False)],
+    "refresh_tokens": [
+        sa.Column("user_agent", sa.String(255), nullable=True),
+        sa.Column("ip_address", sa.String(45), nullable=True),
+    ],
+}
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table, columns in NEW_COLUMNS.items():
+        existing = {column["name"] for column in inspector.get_columns(table)}
+        for column in columns:
+            if column.name not in existing:
+                op.add_column(table, column)
+
+
+def downgrade():
+    for table, columns in NEW_COLUMNS.items():
+        for column in columns:
+            op.drop_column(table, column.name)
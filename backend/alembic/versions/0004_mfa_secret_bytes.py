@@ -0,0 +1,33 @@
+"""Store users.mfa_secret as raw bytes
+
+New secrets are written in the compact AEAD envelope (app/utils/mfa.py),
+which is binary. Existing Fernet tokens are kept byte for byte; they still
+decrypt and are re-encrypted lazily or by app.utils.mfa_secret_migration.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    column = next(c for c in sa.inspect(bind).get_columns("users") if c["name"] == "mfa_secret")
+    if isinstance(column["type"], sa.LargeBinary):
+        return  # created from the current init.sql or models
+    if bind.dialect.name == "postgresql":
+        op.execute("ALTER TABLE users ALTER COLUMN mfa_secret TYPE BYTEA USING convert_to(mfa_secret, 'UTF8')")
+    else:
+        # SQLite keeps the declared type loosely; store existing values as blobs
+        op.execute("UPDATE users SET mfa_secret = CAST(mfa_secret AS BLOB) WHERE mfa_secret IS NOT NULL")
+
+
+def downgrade():
+    raise NotImplementedError("Envelope-encrypted secrets cannot be stored as text; decrypt them first")
@@ -1,11 +1,16 @@
 from datetime import datetime, timedelta
 from typing import Optional, Dict
-from jose import JWTError, jwt
+from jose import JWTError
 from passlib.context import CryptContext
 from fastapi import HTTPException, status
 import os
 from dotenv import load_dotenv
 import secrets
+import time
+
+from app.utils.metrics import stage_timer
+from app.utils.signing_keys import load_signing_keyring
+from app.utils.token_verifier import TokenVerifier
 
 load_dotenv()
 
@@ -14,9 +19,45 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
-
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+JWT_VERIFY_BACKEND = os.getenv("JWT_VERIFY_BACKEND", "native")  # native (stdlib HMAC) or jose
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "10000"))  # verified tokens kept until they expire
+
+# Asymmetric signing keys, newest last: "kid:path.pem[:activates_at],..." (EdDSA or RSA PEM files).
+# Empty keeps HS256 with SECRET_KEY. A replaced key still verifies (and stays in
+# the JWKS) for JWT_KEY_OVERLAP_SECONDS after its successor activates.
+JWT_SIGNING_KEYS = os.getenv("JWT_SIGNING_KEYS", "")
+JWT_KEY_OVERLAP_SECONDS = float(os.getenv("JWT_KEY_OVERLAP_SECONDS", str(REFRESH_TOKEN_EXPIRE_DAYS * 86400)))
+# Keep accepting SECRET_KEY-signed tokens after switching to asymmetric keys
+JWT_ACCEPT_LEGACY_HMAC = os.getenv("JWT_ACCEPT_LEGACY_HMAC", "true").lower() == "true"
+
+# Keys are parsed once, at startup
+signing_keys = load_signing_keyring(
+    JWT_SIGNING_KEYS, SECRET_KEY, ALGORITHM, JWT_KEY_OVERLAP_SECONDS, JWT_ACCEPT_LEGACY_HMAC
+)
+token_verifier = TokenVerifier(signing_keys, backend=JWT_VERIFY_BACKEND, cache_size=JWT_CACHE_SIZE)
+
+# Password hashing: new hashes use PASSWORD_HASH_SCHEME; hashes in the other
+# scheme, or with other parameters, still verify and are replaced on login.
+# Tune the costs for this host with `python -m benchmarks.calibrate_password_hash`.
+PASSWORD_HASH_SCHEME = os.getenv("PASSWORD_HASH_SCHEME", "argon2").lower()  # argon2 (Argon2id) or bcrypt
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "2"))  # passes over memory
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "19456"))  # KiB per hash (19 MiB)
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "1"))  # lanes; the hashing pool already runs hashes side by side
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+if PASSWORD_HASH_SCHEME not in ("argon2", "bcrypt"):
+    raise ValueError("PASSWORD_HASH_SCHEME must be 'argon2' or 'bcrypt'")
+
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    default=PASSWORD_HASH_SCHEME,
+    deprecated="auto",  # everything but the default scheme
+    argon2__type="ID",
+    argon2__time_cost=ARGON2_TIME_COST,
+    argon2__memory_cost=ARGON2_MEMORY_COST,
+    argon2__parallelism=ARGON2_PARALLELISM,
+    bcrypt__rounds=BCRYPT_ROUNDS,
+)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -24,6 +65,11 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    """Verify a password; on success also return a new hash if the stored one needs_update, else None"""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
 def get_password_hash(password: str) -> str:
     """Hash a password"""
     return pwd_context.hash(password)
@@ -44,29 +90,34 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         "type": "access"
     })
     
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    with stage_timer("jwt_encode"):
+        encoded_jwt = signing_keys.encode(to_encode)
     return encoded_jwt
 
 
-def create_refresh_token(data: dict) -> tuple[str, datetime]:
-    """Create a JWT refresh token"""
+def create_refresh_token(data: dict, family_id: str) -> tuple[str, datetime]:
+    """Create a JWT refresh token belonging to a rotation family"""
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
     
     to_encode.update({
         "exp": expire,
         "iat": datetime.utcnow(),
-        "type": "refresh"
+        "type": "refresh",
+        "jti": secrets.token_urlsafe(16),  # unique even when issued in the same second
+        "fam": family_id
     })
     
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    with stage_timer("jwt_encode"):
+        encoded_jwt = signing_keys.encode(to_encode)
     return encoded_jwt, expire
 
 
 def verify_token(token: str, token_type: str = "access") -> Dict:
     """Verify and decode a JWT token"""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        with stage_timer("jwt_decode"):
+            payload = token_verifier.decode(token)
         
         # Verify token type
         if payload.get("type") != token_type:
@@ -78,7 +129,7 @@ def verify_token(token: str, token_type: str = "access") -> Dict:
         
         # Check expiration
         exp = payload.get("exp")
-        if exp is None or datetime.fromtimestamp(exp) < datetime.utcnow():
+        if exp is None or exp < time.time():
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Token has expired",
@@ -110,7 +161,8 @@ def create_mfa_pending_token(user_id: str, email: str, company_id: str, role: st
         "mfa_required": True
     }
     
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    with stage_timer("jwt_encode"):
+        encoded_jwt = signing_keys.encode(to_encode)
     return encoded_jwt
 
 
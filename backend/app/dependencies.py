@@ -1,25 +1,34 @@
-from fastapi import Depends, HTTPException, status, Request
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from fastapi import Depends, HTTPException, Security, status, Request
+from fastapi.security import APIKeyHeader, HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError
-from typing import Optional
+from typing import Optional, Union
 from uuid import UUID
 
 from app.database import get_db, set_company_context
 from app.models import User, UserRole, Company
 from app.auth import verify_token
 from app.schemas import TokenData
+from app.utils.audit import audit_writer
+from app.utils.rate_limit import mfa_limiter
+from app.utils.api_key_index import IndexedKey, api_key_index
+from app.utils.principal_cache import Principal, principal_cache
+from app.utils.refresh_tokens import revoked_families
+from app.utils.token_versions import token_versions
+from app.utils.user_responses import company_names
 import json
 from datetime import datetime
 
 security = HTTPBearer()
+api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
 
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
-    """Get current authenticated user from JWT token"""
+    db: AsyncSession = Depends(get_db)
+) -> Principal:
+    """Get current authenticated user from JWT token (served from the principal cache when possible)"""
     token = credentials.credentials
     
     try:
@@ -55,31 +64,91 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Fetch user from database
-    user = db.query(User).filter(User.id == token_data.user_id).first()
+    # Revoked sessions: all of the user's (token_version) or this one (its refresh family)
+    token_version = payload.get("ver", 0)
+    session_id = payload.get("sid")
+    if token_versions.is_stale(token_data.user_id, token_version) or (
+        session_id and revoked_families.might_contain(session_id)
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Session has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     
-    if user is None:
+    principal = principal_cache.get(token_data.user_id)
+    
+    if principal is None:
+        # Cache miss: load the user and company name in one round-trip
+        generation = principal_cache.generation
+        row = (await db.execute(
+            select(User, Company.name)
+            .outerjoin(Company, Company.id == User.company_id)
+            .where(User.id == token_data.user_id)
+        )).first()
+        
+        if row is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        
+        principal = Principal.from_user(row[0], row[1])
+        principal_cache.put(principal, generation)
+        token_versions.note(principal.id, principal.token_version)
+        if row[1] is not None:
+            company_names.put(principal.company_id, row[1])
+    
+    if token_version < principal.token_version:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
+            detail="Session has been revoked",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    if not user.is_active:
+    if not principal.is_active:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Inactive user"
         )
     
     # Set company context for Row-Level Security
-    set_company_context(db, str(user.company_id))
+    await set_company_context(db, str(principal.company_id))
     
-    return user
+    return principal
+
+
+async def get_current_session_id(
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+) -> Optional[str]:
+    """Session (refresh-token family) of the request's access token, if it has one"""
+    return verify_token(credentials.credentials, token_type="access").get("sid")
+
+
+async def get_api_key(api_key: Optional[str] = Security(api_key_header)) -> IndexedKey:
+    """Resolve the X-API-Key header to its company from the in-memory key index (no database round-trip)"""
+    if not api_key:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="API key required",
+            headers={"WWW-Authenticate": "ApiKey"},
+        )
+    
+    key = api_key_index.resolve(api_key)
+    if key is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid API key",
+            headers={"WWW-Authenticate": "ApiKey"},
+        )
+    
+    return key
 
 
 async def get_current_active_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: Principal = Depends(get_current_user)
+) -> Principal:
     """Get current active user"""
     if not current_user.is_active:
         raise HTTPException(
@@ -89,9 +158,39 @@ async def get_current_active_user(
     return current_user
 
 
+async def get_current_active_db_user(
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+) -> User:
+    """Load the current user's row for endpoints that modify it"""
+    user = await db.get(User, current_user.id)
+    
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    return user
+
+
+async def limit_mfa_disable(
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """Throttle MFA disable attempts using the token's claims, before the user is loaded"""
+    try:
+        payload = verify_token(credentials.credentials, token_type="access")
+    except HTTPException:
+        return  # get_current_user rejects the token
+    await mfa_limiter.check(request, payload.get("email"))
+    await mfa_limiter.check_company(payload.get("company_id"))
+
+
 def require_role(allowed_roles: list[UserRole]):
     """Dependency to check if user has required role"""
-    async def role_checker(current_user: User = Depends(get_current_active_user)) -> User:
+    async def role_checker(current_user: Principal = Depends(get_current_active_user)) -> Principal:
         if current_user.role not in allowed_roles:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -102,7 +201,7 @@ def require_role(allowed_roles: list[UserRole]):
 
 
 # Specific role dependencies
-async def require_admin(current_user: User = Depends(get_current_active_user)) -> User:
+async def require_admin(current_user: Principal = Depends(get_current_active_user)) -> Principal:
     """Require admin role"""
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(
@@ -112,7 +211,7 @@ async def require_admin(current_user: User = Depends(get_current_active_user)) -
     return current_user
 
 
-async def require_admin_or_manager(current_user: User = Depends(get_current_active_user)) -> User:
+async def require_admin_or_manager(current_user: Principal = Depends(get_current_active_user)) -> Principal:
     """Require admin or manager role"""
     if current_user.role not in [UserRole.ADMIN, UserRole.MANAGER]:
         raise HTTPException(
@@ -124,24 +223,20 @@ async def require_admin_or_manager(current_user: User = Depends(get_current_acti
 
 async def log_audit_event(
     action: str,
-    user: User,
-    db: Session,
+    user: Union[User, Principal],
     request: Request,
     resource_type: Optional[str] = None,
     resource_id: Optional[UUID] = None,
     extra_data: Optional[dict] = None
 ):
-    """Log an audit event"""
-    from app.models import AuditLog
-    
+    """Log an audit event (buffered, written in the background)"""
     # Get IP address
     ip_address = request.client.host if request.client else None
     
     # Get user agent
     user_agent = request.headers.get("user-agent", "")
     
-    # Create audit log
-    audit_log = AuditLog(
+    audit_writer.record(
         company_id=user.company_id,
         user_id=user.id,
         action=action,
@@ -151,26 +246,20 @@ async def log_audit_event(
         user_agent=user_agent,
         extra_data=json.dumps(extra_data) if extra_data else None
     )
-    
-    db.add(audit_log)
-    db.commit()
 
 
 async def log_anonymous_audit_event(
     action: str,
     company_id: UUID,
-    db: Session,
     request: Request,
     user_id: Optional[UUID] = None,
     extra_data: Optional[dict] = None
 ):
     """Log an audit event without requiring authenticated user"""
-    from app.models import AuditLog
-    
     ip_address = request.client.host if request.client else None
     user_agent = request.headers.get("user-agent", "")
     
-    audit_log = AuditLog(
+    audit_writer.record(
         company_id=company_id,
         user_id=user_id,
         action=action,
@@ -178,6 +267,3 @@ async def log_anonymous_audit_event(
         user_agent=user_agent,
         extra_data=json.dumps(extra_data) if extra_data else None
     )
-    
-    db.add(audit_log)
-    db.commit()
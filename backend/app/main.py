@@ -1,18 +1,69 @@
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.exceptions import RequestValidationError
 from sqlalchemy.exc import SQLAlchemyError
+from contextlib import asynccontextmanager
 import os
+import logging
 from dotenv import load_dotenv
 
-from app.routers import auth, users
-from app.database import engine, Base
+from app.routers import auth, users, api_keys
+from app.utils.mfa import init_keyring
+from app.utils.mfa_secret_migration import mfa_secret_migrator
+from app.utils.hashing import password_hasher
+from app.utils.qr_codes import mfa_setup_cache
+from app.utils.email import email_dispatcher
+from app.utils.audit import audit_writer
+from app.utils.last_login import last_login_tracker
+from app.utils.invalidation import invalidation_bus
+from app.utils.principal_cache import principal_cache
+from app.utils.token_versions import token_versions
+from app.utils.rate_limit import rate_limit_metrics
+from app.utils.totp import totp_verifier
+from app.utils.refresh_tokens import refresh_token_sweeper, revoked_families, load_revoked_families
+from app.utils.api_key_index import api_key_index
+from app.utils.metrics import METRICS_CONTENT_TYPE, RequestMetricsMiddleware, render_metrics
+from app.auth import token_verifier, signing_keys
 
 load_dotenv()
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+# The schema is managed by migrations (`alembic upgrade head`), not at import time
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup and shutdown"""
+    # Derive MFA encryption keys once, before serving requests
+    init_keyring()
+    signing_key = signing_keys.signing_key()
+    logger.info("JWT signing key: %s (%s)", signing_key.kid or 'SECRET_KEY', signing_key.algorithm)
+    await email_dispatcher.start()
+    await audit_writer.start()
+    await last_login_tracker.start()
+    await invalidation_bus.start()
+    await refresh_token_sweeper.start()
+    try:
+        await load_revoked_families()
+    except Exception as e:
+        logger.warning("Could not preload revoked refresh-token families: %s", e)
+    await api_key_index.start()
+    await mfa_secret_migrator.start()
+    yield
+    await mfa_secret_migrator.stop()
+    await api_key_index.stop()
+    await refresh_token_sweeper.stop()
+    await invalidation_bus.stop()
+    await last_login_tracker.stop()
+    await audit_writer.stop()
+    await email_dispatcher.stop()
+    password_hasher.shutdown()
+    mfa_setup_cache.shutdown()
+
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -20,7 +71,8 @@ app = FastAPI(
     description="Multi-tenant authentication API with MFA support",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # CORS Configuration
@@ -32,8 +84,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Added last so it is outermost and times the whole request
+app.add_middleware(RequestMetricsMiddleware)
+
 
 # Exception Handlers
 @app.exception_handler(RequestValidationError)
@@ -79,10 +135,44 @@ async def health_check():
     return {
         "status": "healthy",
         "service": "voice-agent-auth-api",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "password_hashing": password_hasher.metrics(),
+        "email_queue": email_dispatcher.metrics(),
+        "audit_writer": audit_writer.metrics(),
+        "last_login": last_login_tracker.metrics(),
+        "principal_cache": principal_cache.metrics(),
+        "jwt_verification": token_verifier.metrics(),
+        "refresh_token_sweeper": refresh_token_sweeper.metrics(),
+        "revoked_refresh_families": revoked_families.metrics(),
+        "token_versions": token_versions.metrics(),
+        "rate_limits": rate_limit_metrics(),
+        "totp": totp_verifier.metrics(),
+        "mfa_setup": mfa_setup_cache.metrics(),
+        "mfa_secret_migration": mfa_secret_migrator.metrics(),
+        "api_keys": api_key_index.metrics()
     }
 
 
+@app.get("/metrics", tags=["Health"], include_in_schema=False)
+async def metrics():
+    """Prometheus metrics: request latency per route, per-stage timers, DB pool state"""
+    return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+
+# Public keys for verifying access tokens without calling this API
+JWKS_MAX_AGE = int(os.getenv("JWKS_MAX_AGE", "300"))
+
+
+@app.get("/.well-known/jwks.json", tags=["Authentication"])
+async def jwks():
+    """JSON Web Key Set with the current, scheduled and overlapping signing keys"""
+    return Response(
+        content=signing_keys.jwks(),
+        media_type="application/json",
+        headers={"Cache-Control": f"public, max-age={JWKS_MAX_AGE}"}
+    )
+
+
 @app.get("/", tags=["Root"])
 async def root():
     """Root endpoint"""
@@ -96,6 +186,7 @@ async def root():
 # Include routers
 app.include_router(auth.router)
 app.include_router(users.router)
+app.include_router(api_keys.router)
 
 
 if __name__ == "__main__":
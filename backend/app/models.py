@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, String, DateTime, Enum, ForeignKey, Text, Integer
+from sqlalchemy import Boolean, Column, String, DateTime, Enum, ForeignKey, Text, Integer, Index, LargeBinary, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -22,7 +22,6 @@ class Company(Base):
     address = Column(Text, nullable=True)
     phone_number_1 = Column(String(20), nullable=True)
     phone_number_2 = Column(String(20), nullable=True)
-    api_key = Column(String(255), unique=True, nullable=True)
     is_active = Column(Boolean, default=True, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -34,6 +33,12 @@ class Company(Base):
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Keyset pagination of a company's users
+        Index("idx_users_company_created_id", "company_id", "created_at", "id"),
+        # Email prefix search within a company
+        Index("idx_users_company_email_prefix", "company_id", "email", postgresql_ops={"email": "text_pattern_ops"}),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     company_id = Column(UUID(as_uuid=True), ForeignKey("companies.id", ondelete="CASCADE"), nullable=False)
@@ -46,12 +51,13 @@ class User(Base):
     
     # MFA fields
     mfa_enabled = Column(Boolean, default=False, nullable=False)
-    mfa_secret = Column(String(255), nullable=True)  # Encrypted TOTP secret
-    mfa_backup_codes = Column(Text, nullable=True)  # Encrypted backup codes (JSON)
+    mfa_secret = Column(LargeBinary, nullable=True)  # Encrypted TOTP secret (app.utils.mfa envelope)
+    mfa_backup_codes = Column(Text, nullable=True)  # Legacy encrypted backup codes (JSON), moved to mfa_backup_codes rows on first use
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     last_login = Column(DateTime(timezone=True), nullable=True)
+    token_version = Column(Integer, default=0, server_default="0", nullable=False)  # bumped to revoke every issued token
 
     # Relationships
     company = relationship("Company", back_populates="users")
@@ -61,18 +67,62 @@ class User(Base):
 
 class RefreshToken(Base):
     __tablename__ = "refresh_tokens"
+    __table_args__ = (
+        # Token lookups only ever want live tokens; revoked rows stay out of the index
+        Index("idx_refresh_tokens_active_hash", "token_hash", unique=True, postgresql_where=text("NOT revoked")),
+        # Family revocation touches only the family's live token
+        Index("idx_refresh_tokens_active_family", "family_id", postgresql_where=text("NOT revoked")),
+        # Expiry sweeper
+        Index("idx_refresh_tokens_expires_at", "expires_at"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    token = Column(String(500), unique=True, nullable=False, index=True)
+    token_hash = Column(LargeBinary(32), nullable=False)  # SHA-256 of the token
+    family_id = Column(UUID(as_uuid=True), nullable=False, default=uuid.uuid4)  # shared by every rotation of one login
     expires_at = Column(DateTime(timezone=True), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     revoked = Column(Boolean, default=False, nullable=False)
+    # Device that last used the session (listed under /api/auth/sessions)
+    user_agent = Column(String(255), nullable=True)
+    ip_address = Column(String(45), nullable=True)
 
     # Relationships
     user = relationship("User", back_populates="refresh_tokens")
 
 
+class MFABackupCode(Base):
+    __tablename__ = "mfa_backup_codes"
+    __table_args__ = (
+        # Consuming a code is one indexed UPDATE; also serves the user_id FK
+        Index("idx_mfa_backup_codes_user_hash", "user_id", "code_hash", unique=True),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    code_hash = Column(LargeBinary(32), nullable=False)  # HMAC-SHA256 of the normalized code
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    used_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class ApiKey(Base):
+    __tablename__ = "api_keys"
+    __table_args__ = (
+        # Incremental refresh of the in-memory key index
+        Index("idx_api_keys_updated_at", "updated_at"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    company_id = Column(UUID(as_uuid=True), ForeignKey("companies.id", ondelete="CASCADE"), nullable=False, index=True)
+    name = Column(String(100), nullable=True)
+    key_prefix = Column(String(32), unique=True, nullable=False)  # zlavox_live_ + first 12 hex characters
+    key_hash = Column(LargeBinary(32), nullable=False)  # SHA-256 of the full key
+    created_by = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    revoked_at = Column(DateTime(timezone=True), nullable=True)
+
+
 class AuditLog(Base):
     __tablename__ = "audit_logs"
 
@@ -0,0 +1,129 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Request
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timezone
+from typing import List
+from uuid import UUID
+
+from app.database import get_db
+from app.models import ApiKey
+from app.schemas import ApiKeyCreate, ApiKeyCreated, ApiKeyResponse, ApiKeyIdentity, MessageResponse
+from app.utils.api_keys import generate_api_key, hash_api_key, api_key_prefix
+from app.utils.api_key_index import IndexedKey, api_key_index, revoke_api_key
+from app.utils.principal_cache import Principal
+from app.dependencies import get_api_key, require_admin, log_audit_event
+
+router = APIRouter(prefix="/api/api-keys", tags=["API Keys"])
+
+
+@router.get("/whoami", response_model=ApiKeyIdentity)
+async def whoami(
+    key: IndexedKey = Depends(get_api_key)
+):
+    """Identify the company behind an X-API-Key (resolved without a database round-trip)"""
+
+    return ApiKeyIdentity(
+        key_id=key.id,
+        key_prefix=key.key_prefix,
+        company_id=key.company_id,
+        company_name=key.company_name
+    )
+
+
+@router.post("/", response_model=ApiKeyCreated, status_code=status.HTTP_201_CREATED)
+async def create_api_key(
+    key_data: ApiKeyCreate,
+    request: Request,
+    current_user: Principal = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """Create an API key for the company (Admin only); the key is only ever returned here"""
+
+    plain_key = generate_api_key()
+    api_key = ApiKey(
+        company_id=current_user.company_id,
+        name=key_data.name,
+        key_prefix=api_key_prefix(plain_key),
+        key_hash=hash_api_key(plain_key),
+        created_by=current_user.id,
+        created_at=datetime.now(timezone.utc)
+    )
+    db.add(api_key)
+    await db.commit()
+
+    # Usable on this worker right away, on the others after their next refresh
+    api_key_index.add(api_key, current_user.company_name)
+
+    await log_audit_event(
+        action="api_key_created",
+        user=current_user,
+        request=request,
+        resource_type="api_key",
+        resource_id=api_key.id,
+        extra_data={"key_prefix": api_key.key_prefix}
+    )
+
+    return ApiKeyCreated(
+        id=api_key.id,
+        name=api_key.name,
+        key_prefix=api_key.key_prefix,
+        created_at=api_key.created_at,
+        api_key=plain_key
+    )
+
+
+@router.get("/", response_model=List[ApiKeyResponse])
+async def list_api_keys(
+    current_user: Principal = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """List the company's API keys (Admin only)"""
+
+    keys = await db.scalars(
+        select(ApiKey)
+        .where(ApiKey.company_id == current_user.company_id)
+        .order_by(ApiKey.created_at)
+    )
+    return keys.all()
+
+
+@router.delete("/{key_id}", response_model=MessageResponse)
+async def revoke_key(
+    key_id: UUID,
+    request: Request,
+    current_user: Principal = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """Revoke an API key (Admin only); rejected by every worker within seconds"""
+
+    key_prefix = await db.scalar(
+        update(ApiKey)
+        .where(
+            ApiKey.id == key_id,
+            ApiKey.company_id == current_user.company_id,
+            ApiKey.revoked_at.is_(None)
+        )
+        .values(revoked_at=datetime.now(timezone.utc))
+        .returning(ApiKey.key_prefix)
+        .execution_options(synchronize_session=False)
+    )
+
+    if key_prefix is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="API key not found"
+        )
+
+    await revoke_api_key(db, key_prefix)
+    await db.commit()
+
+    await log_audit_event(
+        action="api_key_revoked",
+        user=current_user,
+        request=request,
+        resource_type="api_key",
+        resource_id=key_id,
+        extra_data={"key_prefix": key_prefix}
+    )
+
+    return MessageResponse(message="API key revoked")
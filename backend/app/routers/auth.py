@@ -1,88 +1,120 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
-from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
-from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from uuid import UUID, uuid4
+import logging
 
 from app.database import get_db
 from app.models import User, Company, RefreshToken, UserRole
 from app.schemas import (
     UserRegister, UserLogin, Token, MFAVerification,
     RefreshTokenRequest, MFASetupResponse, MFAEnableRequest,
-    MFADisableRequest, BackupCodesResponse, MessageResponse, UserResponse
+    MFADisableRequest, BackupCodesResponse, MessageResponse, UserResponse,
+    SessionResponse
 )
 from app.auth import (
-    get_password_hash, verify_password, create_access_token,
+    create_access_token,
     create_refresh_token, verify_token, create_mfa_pending_token,
     generate_backup_codes
 )
 from app.utils.mfa import (
-    generate_mfa_secret, get_totp_uri, generate_qr_code,
-    verify_totp_code, encrypt_data, decrypt_data,
-    encrypt_backup_codes, decrypt_backup_codes, verify_backup_code,
+    generate_mfa_secret, get_totp_uri,
+    verify_user_totp, encrypt_data,
     format_secret_for_manual_entry
 )
+from app.utils.backup_codes import consume_backup_code, store_backup_codes, delete_backup_codes
+from app.utils.hashing import get_password_hash_async, verify_password_async, verify_and_update_password_async
+from app.utils.rate_limit import login_limiter, mfa_limiter
+from app.utils.totp import totp_verifier
+from app.utils.qr_codes import mfa_setup_cache
 from app.utils.email import send_welcome_email, send_mfa_enabled_email, send_login_notification
-from app.dependencies import get_current_active_user, log_anonymous_audit_event, log_audit_event
+from app.dependencies import (
+    get_current_active_user, get_current_active_db_user, get_current_session_id,
+    limit_mfa_disable, log_anonymous_audit_event, log_audit_event
+)
+from app.utils.principal_cache import Principal, principal_cache
+from app.utils.user_responses import user_response
+from app.utils.last_login import last_login_tracker
+from app.utils.refresh_tokens import (
+    hash_refresh_token, rotate_refresh_token, revoke_family,
+    handle_refresh_reuse, revoked_families
+)
+from app.utils.token_versions import token_versions, revoke_all_sessions
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/auth", tags=["Authentication"])
 
 
+def device_details(request: Request) -> dict:
+    """User agent and IP address stored with a refresh token (shown in the session list)"""
+    return {
+        "user_agent": request.headers.get("user-agent", "")[:255] or None,
+        "ip_address": request.client.host if request.client else None,
+    }
+
+
+def violated_constraint(error: IntegrityError) -> str:
+    """Name of the constraint behind an IntegrityError (never the offending values)"""
+    orig = error.orig
+    name = getattr(getattr(orig, "diag", None), "constraint_name", None)  # psycopg2
+    name = name or getattr(orig.__cause__, "constraint_name", None)  # asyncpg
+    return name or str(orig)  # sqlite: "UNIQUE constraint failed: companies.domain"
+
+
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def register(
     user_data: UserRegister,
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Register a new company and admin user"""
     
-    # Check if email already exists
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
-        )
-    
-    # Check if company domain already exists
-    existing_company = db.query(Company).filter(Company.domain == user_data.company_domain).first()
-    if existing_company:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Company domain already registered"
-        )
+    # Hash first: the inserts below are the only round trips, and the unique
+    # constraints on users.email and companies.domain reject duplicates
+    hashed_password = await get_password_hash_async(user_data.password)
+    now = datetime.now(timezone.utc)
     
     # Create company
     company = Company(
+        id=uuid4(),
         name=user_data.company_name,
         domain=user_data.company_domain,
         address=user_data.company_address,
         phone_number_1=user_data.company_phone_1,
         phone_number_2=user_data.company_phone_2,
-        is_active=True
+        is_active=True,
+        created_at=now
     )
-    db.add(company)
-    db.flush()  # Flush to get company.id
     
     # Create admin user
     user = User(
         email=user_data.email,
-        hashed_password=get_password_hash(user_data.password),
+        hashed_password=hashed_password,
         full_name=user_data.full_name,
         company_id=company.id,
         role=UserRole.ADMIN,  # First user is always admin
         is_active=True,
-        email_verified=True  # Auto-verify for now
+        email_verified=True,  # Auto-verify for now
+        created_at=now
     )
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    db.refresh(company)
+    db.add_all([company, user])
+    try:
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Company domain already registered" if "domain" in violated_constraint(e) else "Email already registered"
+        )
     
     # Log audit event
     await log_anonymous_audit_event(
         action="user_registered",
         company_id=company.id,
-        db=db,
         request=request,
         user_id=user.id,
         extra_data={"email": user.email, "role": user.role.value}
@@ -92,34 +124,32 @@ async def register(
     try:
         await send_welcome_email(user.email, user.full_name, company.name)
     except Exception as e:
-        print(f"Failed to send welcome email: {e}")
+        logger.warning("Failed to send welcome email: %s", e)
     
-    return UserResponse(
-        id=user.id,
-        email=user.email,
-        full_name=user.full_name,
-        role=user.role,
-        company_id=user.company_id,
-        company_name=company.name,
-        is_active=user.is_active,
-        mfa_enabled=user.mfa_enabled,
-        created_at=user.created_at,
-        last_login=user.last_login
-    )
+    return user_response(user, company.name)
 
 
 @router.post("/login", response_model=Token)
 async def login(
     credentials: UserLogin,
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Login with email and password"""
     
+    # Throttle before any lookup or hashing
+    await login_limiter.check(request, credentials.email)
+    
     # Find user
-    user = db.query(User).filter(User.email == credentials.email).first()
+    user = await db.scalar(select(User).where(User.email == credentials.email))
     
-    if not user or not verify_password(credentials.password, user.hashed_password):
+    verified, new_hash = False, None
+    if user:
+        await login_limiter.check_company(user.company_id)
+        verified, new_hash = await verify_and_update_password_async(credentials.password, user.hashed_password)
+    
+    if not verified:
+        await login_limiter.record_failure(credentials.email, user.company_id if user else None)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -132,6 +162,13 @@ async def login(
             detail="Account is inactive"
         )
     
+    await login_limiter.record_success(credentials.email)
+    
+    # Outdated hash (bcrypt, or older cost parameters): replace it now that the
+    # password is known; written with this login's commit
+    if new_hash:
+        user.hashed_password = new_hash
+    
     # Check if MFA is enabled
     if user.mfa_enabled:
         # Return a temporary token that requires MFA verification
@@ -141,6 +178,8 @@ async def login(
             str(user.company_id),
             user.role.value
         )
+        if new_hash:
+            await db.commit()
         
         return Token(
             access_token=mfa_token,
@@ -149,40 +188,47 @@ async def login(
         )
     
     # MFA not enabled - proceed with normal login
+    
+    # Each login starts a new refresh-token family, which identifies the session
+    family_id = uuid4()
+    
     # Create tokens
     access_token = create_access_token(
         data={
             "sub": str(user.id),
             "email": user.email,
             "company_id": str(user.company_id),
-            "role": user.role.value
+            "role": user.role.value,
+            "ver": user.token_version,
+            "sid": str(family_id)
         }
     )
-    
     refresh_token_str, refresh_expires = create_refresh_token(
         data={
             "sub": str(user.id),
-            "email": user.email
-        }
+            "email": user.email,
+            "ver": user.token_version
+        },
+        family_id=str(family_id)
     )
     
     # Store refresh token
     refresh_token = RefreshToken(
         user_id=user.id,
-        token=refresh_token_str,
-        expires_at=refresh_expires
+        token_hash=hash_refresh_token(refresh_token_str),
+        family_id=family_id,
+        expires_at=refresh_expires,
+        **device_details(request)
     )
     db.add(refresh_token)
     
-    # Update last login
-    user.last_login = datetime.utcnow()
-    db.commit()
+    await db.commit()
+    last_login_tracker.record(user.id)  # written in batches, not on the users row per login
     
     # Log audit event
     await log_anonymous_audit_event(
         action="user_login",
         company_id=user.company_id,
-        db=db,
         request=request,
         user_id=user.id,
         extra_data={"email": user.email, "mfa_used": False}
@@ -193,7 +239,7 @@ async def login(
         ip_address = request.client.host if request.client else "Unknown"
         await send_login_notification(user.email, user.full_name, ip_address)
     except Exception as e:
-        print(f"Failed to send login notification: {e}")
+        logger.warning("Failed to send login notification: %s", e)
     
     return Token(
         access_token=access_token,
@@ -206,14 +252,18 @@ async def login(
 async def verify_mfa(
     mfa_data: MFAVerification,
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Verify MFA code and complete login"""
     
+    # Throttle before any lookup or secret decryption
+    await mfa_limiter.check(request, mfa_data.email)
+    
     # Find user
-    user = db.query(User).filter(User.email == mfa_data.email).first()
+    user = await db.scalar(select(User).where(User.email == mfa_data.email))
     
     if not user:
+        await mfa_limiter.record_failure(mfa_data.email)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials"
@@ -225,30 +275,23 @@ async def verify_mfa(
             detail="MFA is not enabled for this account"
         )
     
-    # Decrypt MFA secret
-    mfa_secret = decrypt_data(user.mfa_secret)
+    await mfa_limiter.check_company(user.company_id)
     
-    # Verify TOTP code
-    is_valid_totp = verify_totp_code(mfa_secret, mfa_data.code)
+    # Verify TOTP code (secret decrypted once per user and cached; codes are single-use)
+    is_valid_totp = await verify_user_totp(db, user.id, user.mfa_secret, mfa_data.code)
     
-    # If TOTP fails, try backup codes
+    # If TOTP fails, try backup codes (used up atomically; committed with the login below)
     is_valid_backup = False
-    if not is_valid_totp and user.mfa_backup_codes:
-        is_valid_backup, updated_codes = verify_backup_code(
-            user.mfa_backup_codes,
-            mfa_data.code
-        )
-        if is_valid_backup:
-            # Update backup codes (one was used)
-            user.mfa_backup_codes = updated_codes
-            db.commit()
+    if not is_valid_totp:
+        is_valid_backup = await consume_backup_code(db, user, mfa_data.code)
     
     if not is_valid_totp and not is_valid_backup:
+        await mfa_limiter.record_failure(mfa_data.email, user.company_id)
+        
         # Log failed attempt
         await log_anonymous_audit_event(
             action="mfa_verification_failed",
             company_id=user.company_id,
-            db=db,
             request=request,
             user_id=user.id,
             extra_data={"email": user.email}
@@ -259,40 +302,48 @@ async def verify_mfa(
             detail="Invalid MFA code"
         )
     
+    await mfa_limiter.record_success(mfa_data.email)
+    
+    # Each login starts a new refresh-token family, which identifies the session
+    family_id = uuid4()
+    
     # Create tokens
     access_token = create_access_token(
         data={
             "sub": str(user.id),
             "email": user.email,
             "company_id": str(user.company_id),
-            "role": user.role.value
+            "role": user.role.value,
+            "ver": user.token_version,
+            "sid": str(family_id)
         }
     )
-    
     refresh_token_str, refresh_expires = create_refresh_token(
         data={
             "sub": str(user.id),
-            "email": user.email
-        }
+            "email": user.email,
+            "ver": user.token_version
+        },
+        family_id=str(family_id)
     )
     
     # Store refresh token
     refresh_token = RefreshToken(
         user_id=user.id,
-        token=refresh_token_str,
-        expires_at=refresh_expires
+        token_hash=hash_refresh_token(refresh_token_str),
+        family_id=family_id,
+        expires_at=refresh_expires,
+        **device_details(request)
     )
     db.add(refresh_token)
     
-    # Update last login
-    user.last_login = datetime.utcnow()
-    db.commit()
+    await db.commit()
+    last_login_tracker.record(user.id)  # written in batches, not on the users row per login
     
     # Log successful login
     await log_anonymous_audit_event(
         action="user_login",
         company_id=user.company_id,
-        db=db,
         request=request,
         user_id=user.id,
         extra_data={
@@ -312,9 +363,10 @@ async def verify_mfa(
 @router.post("/refresh", response_model=Token)
 async def refresh_token(
     token_data: RefreshTokenRequest,
-    db: Session = Depends(get_db)
+    request: Request,
+    db: AsyncSession = Depends(get_db)
 ):
-    """Refresh access token using refresh token"""
+    """Exchange a refresh token for a new access token and a new refresh token"""
     
     # Verify refresh token
     try:
@@ -325,46 +377,81 @@ async def refresh_token(
             detail="Invalid refresh token"
         )
     
-    # Check if token exists and is not revoked
-    stored_token = db.query(RefreshToken).filter(
-        RefreshToken.token == token_data.refresh_token,
-        RefreshToken.revoked == False
-    ).first()
-    
-    if not stored_token:
+    # Replays of revoked families and tokens of revoked users are rejected
+    # without touching the database
+    family_claim = payload.get("fam")
+    if token_versions.is_stale(payload.get("sub"), payload.get("ver", 0)) or (
+        family_claim and revoked_families.might_contain(family_claim)
+    ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or revoked refresh token"
         )
     
-    # Check if token is expired
-    if stored_token.expires_at < datetime.utcnow():
+    # Use up the presented token; of concurrent refreshes only one gets a row back
+    rotated = await rotate_refresh_token(db, token_data.refresh_token)
+    if rotated is None:
+        if family_claim and await handle_refresh_reuse(db, UUID(family_claim)):
+            await db.commit()
+            logger.warning("Refresh token reuse detected; revoked family %s", family_claim)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Refresh token has expired"
+            detail="Invalid or revoked refresh token"
         )
+    user_id, family_id = rotated
     
     # Get user
-    user = db.query(User).filter(User.id == stored_token.user_id).first()
+    user = principal_cache.get(user_id)
+    if user is None:
+        user = await db.scalar(select(User).where(User.id == user_id))
+        if user is not None:
+            token_versions.note(user.id, user.token_version)
     if not user or not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found or inactive"
         )
     
+    # Tokens minted before the user's sessions were revoked stay revoked
+    if payload.get("ver", 0) < user.token_version:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or revoked refresh token"
+        )
+    
     # Create new access token
     access_token = create_access_token(
         data={
             "sub": str(user.id),
             "email": user.email,
             "company_id": str(user.company_id),
-            "role": user.role.value
+            "role": user.role.value,
+            "ver": user.token_version,
+            "sid": str(family_id)
         }
     )
     
+    # Successor refresh token in the same family
+    refresh_token_str, refresh_expires = create_refresh_token(
+        data={
+            "sub": str(user.id),
+            "email": user.email,
+            "ver": user.token_version
+        },
+        family_id=str(family_id)
+    )
+    db.add(RefreshToken(
+        user_id=user.id,
+        token_hash=hash_refresh_token(refresh_token_str),
+        family_id=family_id,
+        expires_at=refresh_expires,
+        **device_details(request)
+    ))
+    await db.commit()
+    
     return Token(
         access_token=access_token,
-        refresh_token=token_data.refresh_token,  # Return same refresh token
+        refresh_token=refresh_token_str,
         mfa_required=False
     )
 
@@ -372,30 +459,115 @@ async def refresh_token(
 @router.post("/logout", response_model=MessageResponse)
 async def logout(
     token_data: RefreshTokenRequest,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Logout user by revoking refresh token"""
+    """Logout user by revoking the refresh token's whole family"""
     
-    # Revoke the refresh token
-    stored_token = db.query(RefreshToken).filter(
-        RefreshToken.token == token_data.refresh_token,
+    stored_token = await db.scalar(select(RefreshToken).where(
+        RefreshToken.token_hash == hash_refresh_token(token_data.refresh_token),
+        RefreshToken.revoked == False,
         RefreshToken.user_id == current_user.id
-    ).first()
+    ))
     
     if stored_token:
-        stored_token.revoked = True
-        db.commit()
+        await revoke_family(db, stored_token.family_id)
+        await db.commit()
     
     return MessageResponse(message="Successfully logged out")
 
 
+@router.post("/logout-all", response_model=MessageResponse)
+async def logout_all(
+    request: Request,
+    current_user: User = Depends(get_current_active_db_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Log out every session, including this one: all issued tokens stop working at once"""
+    
+    await revoke_all_sessions(db, current_user)
+    await db.commit()
+    
+    await log_audit_event(
+        action="user_logout_all",
+        user=current_user,
+        request=request
+    )
+    
+    return MessageResponse(message="All sessions have been logged out")
+
+
+@router.get("/sessions", response_model=List[SessionResponse])
+async def list_sessions(
+    current_user: Principal = Depends(get_current_active_user),
+    session_id: Optional[str] = Depends(get_current_session_id),
+    db: AsyncSession = Depends(get_db)
+):
+    """List the devices signed in to this account (one live refresh token each)"""
+    
+    tokens = await db.scalars(
+        select(RefreshToken)
+        .where(
+            RefreshToken.user_id == current_user.id,
+            RefreshToken.revoked == False,
+            RefreshToken.expires_at > datetime.now(timezone.utc)
+        )
+        .order_by(RefreshToken.created_at.desc())
+    )
+    return [
+        SessionResponse(
+            id=token.family_id,
+            user_agent=token.user_agent,
+            ip_address=token.ip_address,
+            last_active_at=token.created_at,
+            expires_at=token.expires_at,
+            current=str(token.family_id) == session_id
+        )
+        for token in tokens
+    ]
+
+
+@router.delete("/sessions/{session_id}", response_model=MessageResponse)
+async def revoke_session(
+    session_id: UUID,
+    request: Request,
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Log out one device: its refresh token and access tokens stop working"""
+    
+    stored_token = await db.scalar(select(RefreshToken).where(
+        RefreshToken.family_id == session_id,
+        RefreshToken.revoked == False,
+        RefreshToken.user_id == current_user.id
+    ))
+    
+    if not stored_token:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Session not found"
+        )
+    
+    await revoke_family(db, session_id)
+    await db.commit()
+    
+    await log_audit_event(
+        action="session_revoked",
+        user=current_user,
+        request=request,
+        extra_data={"session_id": str(session_id)}
+    )
+    
+    return MessageResponse(message="Session has been revoked")
+
+
 # ========== MFA Management Endpoints ==========
 
 @router.post("/mfa/setup", response_model=MFASetupResponse)
 async def setup_mfa(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    qr_format: str = Query("png", alias="format", pattern="^(png|svg|matrix)$", description="QR code as a PNG or SVG data URI, or the raw module matrix"),
+    current_user: User = Depends(get_current_active_db_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Generate MFA secret and QR code for setup"""
     
@@ -405,23 +577,29 @@ async def setup_mfa(
             detail="MFA is already enabled"
         )
     
-    # Generate new secret
-    secret = generate_mfa_secret()
-    
-    # Generate provisioning URI
-    uri = get_totp_uri(secret, current_user.email)
-    
-    # Generate QR code
-    qr_code = generate_qr_code(uri)
+    # A retry or reload shortly after the last setup gets the same pending secret
+    pending = mfa_setup_cache.get(current_user.id, current_user.mfa_secret)
+    if pending is None:
+        # Generate new secret
+        secret = generate_mfa_secret()
+        
+        # Store encrypted secret temporarily (will be confirmed on enable)
+        encrypted_secret = encrypt_data(secret)
+        current_user.mfa_secret = encrypted_secret
+        await db.commit()
+        
+        pending = mfa_setup_cache.put(
+            current_user.id, encrypted_secret, secret, get_totp_uri(secret, current_user.email)
+        )
     
-    # Store encrypted secret temporarily (will be confirmed on enable)
-    current_user.mfa_secret = encrypt_data(secret)
-    db.commit()
+    # Rendered off the event loop, once per pending secret and format
+    qr_code = await mfa_setup_cache.render(pending, qr_format)
     
     return MFASetupResponse(
-        secret=secret,
-        qr_code=qr_code,
-        manual_entry_key=format_secret_for_manual_entry(secret)
+        secret=pending.secret,
+        qr_code=qr_code if qr_format != "matrix" else None,
+        qr_matrix=qr_code if qr_format == "matrix" else None,
+        manual_entry_key=format_secret_for_manual_entry(pending.secret)
     )
 
 
@@ -429,8 +607,8 @@ async def setup_mfa(
 async def enable_mfa(
     mfa_request: MFAEnableRequest,
     request: Request,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_active_db_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Enable MFA after verifying the code"""
     
@@ -446,11 +624,8 @@ async def enable_mfa(
             detail="MFA setup not initiated. Call /mfa/setup first"
         )
     
-    # Decrypt secret
-    secret = decrypt_data(current_user.mfa_secret)
-    
     # Verify code
-    if not verify_totp_code(secret, mfa_request.code):
+    if not await verify_user_totp(db, current_user.id, current_user.mfa_secret, mfa_request.code):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid MFA code"
@@ -460,15 +635,16 @@ async def enable_mfa(
     backup_codes = generate_backup_codes()
     
     # Enable MFA
+    mfa_setup_cache.forget(current_user.id)
     current_user.mfa_enabled = True
-    current_user.mfa_backup_codes = encrypt_backup_codes(backup_codes)
-    db.commit()
+    await store_backup_codes(db, current_user, backup_codes)
+    await revoke_all_sessions(db, current_user)  # sessions signed in without MFA
+    await db.commit()
     
     # Log audit event
     await log_audit_event(
         action="mfa_enabled",
         user=current_user,
-        db=db,
         request=request
     )
     
@@ -476,7 +652,7 @@ async def enable_mfa(
     try:
         await send_mfa_enabled_email(current_user.email, current_user.full_name)
     except Exception as e:
-        print(f"Failed to send MFA enabled email: {e}")
+        logger.warning("Failed to send MFA enabled email: %s", e)
     
     return BackupCodesResponse(backup_codes=backup_codes)
 
@@ -485,8 +661,9 @@ async def enable_mfa(
 async def disable_mfa(
     mfa_request: MFADisableRequest,
     request: Request,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    _throttle: None = Depends(limit_mfa_disable),
+    current_user: User = Depends(get_current_active_db_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Disable MFA"""
     
@@ -497,7 +674,8 @@ async def disable_mfa(
         )
     
     # Verify password
-    if not verify_password(mfa_request.password, current_user.hashed_password):
+    if not await verify_password_async(mfa_request.password, current_user.hashed_password):
+        await mfa_limiter.record_failure(current_user.email, current_user.company_id)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid password"
@@ -505,36 +683,33 @@ async def disable_mfa(
     
     # If code provided, verify it
     if mfa_request.code:
-        secret = decrypt_data(current_user.mfa_secret)
-        
         # Try TOTP
-        is_valid_totp = verify_totp_code(secret, mfa_request.code)
+        is_valid_totp = await verify_user_totp(db, current_user.id, current_user.mfa_secret, mfa_request.code)
         
         # Try backup code
         is_valid_backup = False
         if not is_valid_totp:
-            is_valid_backup, _ = verify_backup_code(
-                current_user.mfa_backup_codes,
-                mfa_request.code
-            )
+            is_valid_backup = await consume_backup_code(db, current_user, mfa_request.code)
         
         if not is_valid_totp and not is_valid_backup:
+            await mfa_limiter.record_failure(current_user.email, current_user.company_id)
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid MFA code"
             )
     
     # Disable MFA
+    totp_verifier.forget(str(current_user.id))
     current_user.mfa_enabled = False
     current_user.mfa_secret = None
-    current_user.mfa_backup_codes = None
-    db.commit()
+    await delete_backup_codes(db, current_user)
+    await revoke_all_sessions(db, current_user)
+    await db.commit()
     
     # Log audit event
     await log_audit_event(
         action="mfa_disabled",
         user=current_user,
-        db=db,
         request=request
     )
     
@@ -543,8 +718,8 @@ async def disable_mfa(
 
 @router.get("/mfa/backup-codes", response_model=BackupCodesResponse)
 async def regenerate_backup_codes(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_active_db_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Regenerate backup codes"""
     
@@ -557,31 +732,17 @@ async def regenerate_backup_codes(
     # Generate new backup codes
     backup_codes = generate_backup_codes()
     
-    # Update user
-    current_user.mfa_backup_codes = encrypt_backup_codes(backup_codes)
-    db.commit()
+    # Replace the old set (used or not)
+    await store_backup_codes(db, current_user, backup_codes)
+    await db.commit()
     
     return BackupCodesResponse(backup_codes=backup_codes)
 
 
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_info(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Get current user information"""
     
-    company = db.query(Company).filter(Company.id == current_user.company_id).first()
-    
-    return UserResponse(
-        id=current_user.id,
-        email=current_user.email,
-        full_name=current_user.full_name,
-        role=current_user.role,
-        company_id=current_user.company_id,
-        company_name=company.name if company else "",
-        is_active=current_user.is_active,
-        mfa_enabled=current_user.mfa_enabled,
-        created_at=current_user.created_at,
-        last_login=current_user.last_login
-    )
+    return user_response(current_user, current_user.company_name)
@@ -1,13 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 from uuid import UUID
 
-from app.database import get_db
-from app.models import User, Company, UserRole
+from app.database import get_db, new_session, set_company_context
+from app.models import User, UserRole
 from app.schemas import UserResponse, UserUpdate, MessageResponse
+from app.utils.principal_cache import Principal, invalidate_principal
+from app.utils.token_versions import revoke_all_sessions
+from app.utils.user_responses import user_response, user_responses
+from app.utils.pagination import encode_cursor, decode_cursor
 from app.dependencies import (
     get_current_active_user,
+    get_current_active_db_user,
     require_admin,
     require_admin_or_manager,
     log_audit_event
@@ -15,36 +22,25 @@ from app.dependencies import (
 
 router = APIRouter(prefix="/api/users", tags=["Users"])
 
+EXPORT_BATCH_SIZE = 500  # rows fetched per server-side cursor round-trip
+
 
 @router.get("/me", response_model=UserResponse)
 async def get_my_profile(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Get current user's profile"""
     
-    company = db.query(Company).filter(Company.id == current_user.company_id).first()
-    
-    return UserResponse(
-        id=current_user.id,
-        email=current_user.email,
-        full_name=current_user.full_name,
-        role=current_user.role,
-        company_id=current_user.company_id,
-        company_name=company.name if company else "",
-        is_active=current_user.is_active,
-        mfa_enabled=current_user.mfa_enabled,
-        created_at=current_user.created_at,
-        last_login=current_user.last_login
-    )
+    return user_response(current_user, current_user.company_name)
 
 
 @router.put("/me", response_model=UserResponse)
 async def update_my_profile(
     user_update: UserUpdate,
     request: Request,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    principal: Principal = Depends(get_current_active_user),
+    current_user: User = Depends(get_current_active_db_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Update current user's profile"""
     
@@ -54,10 +50,10 @@ async def update_my_profile(
     
     if user_update.email is not None:
         # Check if email is already taken
-        existing = db.query(User).filter(
+        existing = await db.scalar(select(User).where(
             User.email == user_update.email,
             User.id != current_user.id
-        ).first()
+        ))
         
         if existing:
             raise HTTPException(
@@ -68,77 +64,122 @@ async def update_my_profile(
         current_user.email = user_update.email
         current_user.email_verified = False  # Require re-verification
     
-    db.commit()
-    db.refresh(current_user)
+    await invalidate_principal(db, current_user.id)
+    await db.commit()
+    await db.refresh(current_user)
     
     # Log audit event
     await log_audit_event(
         action="user_updated",
         user=current_user,
-        db=db,
         request=request,
         resource_type="user",
         resource_id=current_user.id
     )
     
-    company = db.query(Company).filter(Company.id == current_user.company_id).first()
-    
-    return UserResponse(
-        id=current_user.id,
-        email=current_user.email,
-        full_name=current_user.full_name,
-        role=current_user.role,
-        company_id=current_user.company_id,
-        company_name=company.name if company else "",
-        is_active=current_user.is_active,
-        mfa_enabled=current_user.mfa_enabled,
-        created_at=current_user.created_at,
-        last_login=current_user.last_login
-    )
+    return user_response(current_user, principal.company_name)
+
+
+def filtered_users_query(
+    company_id: UUID,
+    role: Optional[UserRole],
+    is_active: Optional[bool],
+    mfa_enabled: Optional[bool],
+    email_prefix: Optional[str]
+):
+    """Company users matching the filters, in keyset order (created_at, id)"""
+    query = select(User).where(User.company_id == company_id)
+    
+    if role is not None:
+        query = query.where(User.role == role)
+    if is_active is not None:
+        query = query.where(User.is_active == is_active)
+    if mfa_enabled is not None:
+        query = query.where(User.mfa_enabled == mfa_enabled)
+    if email_prefix:
+        query = query.where(User.email.startswith(email_prefix, autoescape=True))
+    
+    return query.order_by(User.created_at, User.id)
 
 
 @router.get("/", response_model=List[UserResponse])
 async def list_company_users(
-    current_user: User = Depends(require_admin_or_manager),
-    db: Session = Depends(get_db)
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    role: Optional[UserRole] = None,
+    is_active: Optional[bool] = None,
+    mfa_enabled: Optional[bool] = None,
+    email_prefix: Optional[str] = Query(None, max_length=255),
+    current_user: Principal = Depends(require_admin_or_manager),
+    db: AsyncSession = Depends(get_db)
 ):
-    """List all users in the company (Admin/Manager only)"""
+    """
+    List users in the company (Admin/Manager only)
+    Keyset-paginated: when more users exist, the X-Next-Cursor response
+    header holds the cursor for the next page.
+    """
     
-    users = db.query(User).filter(
-        User.company_id == current_user.company_id
-    ).all()
-    
-    company = db.query(Company).filter(Company.id == current_user.company_id).first()
-    
-    return [
-        UserResponse(
-            id=user.id,
-            email=user.email,
-            full_name=user.full_name,
-            role=user.role,
-            company_id=user.company_id,
-            company_name=company.name if company else "",
-            is_active=user.is_active,
-            mfa_enabled=user.mfa_enabled,
-            created_at=user.created_at,
-            last_login=user.last_login
-        )
-        for user in users
-    ]
+    query = filtered_users_query(current_user.company_id, role, is_active, mfa_enabled, email_prefix)
+    
+    after = decode_cursor(cursor)
+    if after is not None:
+        query = query.where(tuple_(User.created_at, User.id) > tuple_(*after))
+    
+    # Fetch one extra row to know whether another page exists
+    users = (await db.scalars(query.limit(limit + 1))).all()
+    
+    if len(users) > limit:
+        users = users[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(users[-1].created_at, users[-1].id)
+    
+    return await user_responses(db, users)
+
+
+@router.get("/export")
+async def export_company_users(
+    role: Optional[UserRole] = None,
+    is_active: Optional[bool] = None,
+    mfa_enabled: Optional[bool] = None,
+    email_prefix: Optional[str] = Query(None, max_length=255),
+    current_user: Principal = Depends(require_admin_or_manager)
+):
+    """
+    Stream all matching company users as NDJSON (Admin/Manager only)
+    Rows are read through a server-side cursor, so memory stays flat
+    regardless of company size.
+    """
+    
+    query = filtered_users_query(current_user.company_id, role, is_active, mfa_enabled, email_prefix)
+    company_name = current_user.company_name
+    company_id = str(current_user.company_id)
+    
+    async def generate():
+        # The request's session is closed before the body streams, so use our own
+        db = new_session()
+        try:
+            await set_company_context(db, company_id)
+            result = await db.stream_scalars(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+            async for user in result:
+                yield user_response(user, company_name).model_dump_json() + "\n"
+        finally:
+            await db.close()
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
 
 
 @router.get("/{user_id}", response_model=UserResponse)
 async def get_user(
     user_id: UUID,
-    current_user: User = Depends(require_admin_or_manager),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(require_admin_or_manager),
+    db: AsyncSession = Depends(get_db)
 ):
     """Get user details (Admin/Manager only)"""
     
-    user = db.query(User).filter(
+    user = await db.scalar(select(User).where(
         User.id == user_id,
         User.company_id == current_user.company_id  # Same company only
-    ).first()
+    ))
     
     if not user:
         raise HTTPException(
@@ -146,28 +187,15 @@ async def get_user(
             detail="User not found"
         )
     
-    company = db.query(Company).filter(Company.id == user.company_id).first()
-    
-    return UserResponse(
-        id=user.id,
-        email=user.email,
-        full_name=user.full_name,
-        role=user.role,
-        company_id=user.company_id,
-        company_name=company.name if company else "",
-        is_active=user.is_active,
-        mfa_enabled=user.mfa_enabled,
-        created_at=user.created_at,
-        last_login=user.last_login
-    )
+    return (await user_responses(db, [user]))[0]
 
 
 @router.delete("/{user_id}", response_model=MessageResponse)
 async def delete_user(
     user_id: UUID,
     request: Request,
-    current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete a user (Admin only)"""
     
@@ -177,10 +205,10 @@ async def delete_user(
             detail="Cannot delete your own account"
         )
     
-    user = db.query(User).filter(
+    user = await db.scalar(select(User).where(
         User.id == user_id,
         User.company_id == current_user.company_id
-    ).first()
+    ))
     
     if not user:
         raise HTTPException(
@@ -192,15 +220,15 @@ async def delete_user(
     await log_audit_event(
         action="user_deleted",
         user=current_user,
-        db=db,
         request=request,
         resource_type="user",
         resource_id=user.id,
         extra_data={"deleted_user_email": user.email}
     )
     
-    db.delete(user)
-    db.commit()
+    await db.delete(user)
+    await invalidate_principal(db, user.id)
+    await db.commit()
     
     return MessageResponse(message=f"User {user.email} deleted successfully")
 
@@ -209,8 +237,8 @@ async def delete_user(
 async def deactivate_user(
     user_id: UUID,
     request: Request,
-    current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
 ):
     """Deactivate a user (Admin only)"""
     
@@ -220,10 +248,10 @@ async def deactivate_user(
             detail="Cannot deactivate your own account"
         )
     
-    user = db.query(User).filter(
+    user = await db.scalar(select(User).where(
         User.id == user_id,
         User.company_id == current_user.company_id
-    ).first()
+    ))
     
     if not user:
         raise HTTPException(
@@ -232,13 +260,13 @@ async def deactivate_user(
         )
     
     user.is_active = False
-    db.commit()
+    await revoke_all_sessions(db, user)  # issued tokens stop working now, not at expiry
+    await db.commit()
     
     # Log audit event
     await log_audit_event(
         action="user_deactivated",
         user=current_user,
-        db=db,
         request=request,
         resource_type="user",
         resource_id=user.id
@@ -251,15 +279,15 @@ async def deactivate_user(
 async def activate_user(
     user_id: UUID,
     request: Request,
-    current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
 ):
     """Activate a user (Admin only)"""
     
-    user = db.query(User).filter(
+    user = await db.scalar(select(User).where(
         User.id == user_id,
         User.company_id == current_user.company_id
-    ).first()
+    ))
     
     if not user:
         raise HTTPException(
@@ -268,13 +296,13 @@ async def activate_user(
         )
     
     user.is_active = True
-    db.commit()
+    await invalidate_principal(db, user.id)
+    await db.commit()
     
     # Log audit event
     await log_audit_event(
         action="user_activated",
         user=current_user,
-        db=db,
         request=request,
         resource_type="user",
         resource_id=user.id
@@ -35,7 +35,7 @@ class UserLogin(BaseModel):
 
 class MFAVerification(BaseModel):
     email: EmailStr
-    code: str = Field(..., min_length=6, max_length=6)
+    code: str = Field(..., min_length=6, max_length=9)  # TOTP code or XXXX-XXXX backup code
 
 
 class Token(BaseModel):
@@ -56,11 +56,21 @@ class RefreshTokenRequest(BaseModel):
     refresh_token: str
 
 
+class SessionResponse(BaseModel):
+    id: UUID  # refresh-token family
+    user_agent: Optional[str]
+    ip_address: Optional[str]
+    last_active_at: Optional[datetime]  # login or latest refresh
+    expires_at: datetime
+    current: bool  # the session of the token making the request
+
+
 # ============ MFA Schemas ============
 
 class MFASetupResponse(BaseModel):
     secret: str
-    qr_code: str  # Base64 encoded QR code image
+    qr_code: Optional[str] = None  # PNG or SVG data URI (unset for format=matrix)
+    qr_matrix: Optional[List[str]] = None  # Module rows, '1' = dark, border included (format=matrix)
     manual_entry_key: str
 
 
@@ -149,7 +159,6 @@ class CompanyUpdate(BaseModel):
 
 class CompanyResponse(CompanyBase):
     id: UUID
-    api_key: Optional[str] = None
     is_active: bool
     created_at: datetime
     updated_at: Optional[datetime] = None
@@ -158,6 +167,34 @@ class CompanyResponse(CompanyBase):
         from_attributes = True
 
 
+# ============ API Key Schemas ============
+
+class ApiKeyCreate(BaseModel):
+    name: Optional[str] = Field(None, max_length=100)
+
+
+class ApiKeyResponse(BaseModel):
+    id: UUID
+    name: Optional[str]
+    key_prefix: str
+    created_at: datetime
+    revoked_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class ApiKeyCreated(ApiKeyResponse):
+    api_key: str  # Shown once; only its SHA-256 digest is stored
+
+
+class ApiKeyIdentity(BaseModel):
+    key_id: UUID
+    key_prefix: str
+    company_id: UUID
+    company_name: str
+
+
 # ============ Audit Log Schemas ============
 
 class AuditLogResponse(BaseModel):
@@ -0,0 +1,181 @@
+"""
+API-key resolution
+Only SHA-256 digests of API keys are stored. Every worker keeps all live
+keys in memory, indexed by their public prefix, so resolving a valid key is
+one hash and a dict lookup with no database round trip. The index is loaded
+at startup and refreshed incrementally (rows whose updated_at moved since the
+last refresh); revocations are also pushed through the invalidation bus, so
+they take effect on every worker within seconds.
+"""
+import asyncio
+import hmac
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+from uuid import UUID
+
+from dotenv import load_dotenv
+from sqlalchemy import or_, select
+
+from app.database import new_session
+from app.models import ApiKey, Company
+from app.utils.api_keys import api_key_prefix, hash_api_key, verify_api_key_format
+from app.utils.invalidation import invalidation_bus
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+API_KEY_REFRESH_INTERVAL = float(os.getenv("API_KEY_REFRESH_INTERVAL", "5"))  # seconds
+# Rows are re-read this far behind the newest updated_at seen, so a change
+# committed late with an earlier timestamp is still picked up
+API_KEY_REFRESH_OVERLAP = float(os.getenv("API_KEY_REFRESH_OVERLAP", "60"))
+# Full reloads also drop rows that were deleted rather than revoked
+API_KEY_FULL_RELOAD_INTERVAL = float(os.getenv("API_KEY_FULL_RELOAD_INTERVAL", "600"))
+
+API_KEY_TOPIC = "api_key"
+
+
+class IndexedKey:
+    """A live API key as resolved from the index"""
+
+    __slots__ = ("id", "key_prefix", "key_hash", "company_id", "company_name")
+
+    def __init__(self, id: UUID, key_prefix: str, key_hash: bytes, company_id: UUID, company_name: str):
+        self.id = id
+        self.key_prefix = key_prefix
+        self.key_hash = key_hash
+        self.company_id = company_id
+        self.company_name = company_name
+
+
+class ApiKeyIndex:
+    """
+    key prefix -> live key, for every active company
+    `resolve()` never touches the database. A background task applies
+    changed rows every `refresh_interval` seconds, or right away when woken
+    (e.g. after the invalidation listener reconnects).
+    """
+
+    def __init__(self, refresh_interval: float, overlap: float, full_reload_interval: float):
+        self.refresh_interval = refresh_interval
+        self.overlap = timedelta(seconds=overlap)
+        self.full_reload_interval = full_reload_interval
+        self._keys: dict[str, IndexedKey] = {}
+        self._watermark: Optional[datetime] = None  # newest updated_at applied
+        self._last_full_reload = 0.0
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self.resolved_total = 0
+        self.rejected_total = 0
+        self.refreshes_total = 0
+        self.failed_refreshes_total = 0
+
+    def resolve(self, api_key: str) -> Optional[IndexedKey]:
+        """The live key matching `api_key`, or None"""
+        valid, _ = verify_api_key_format(api_key)
+        entry = self._keys.get(api_key_prefix(api_key)) if valid else None
+        if entry is None or not hmac.compare_digest(entry.key_hash, hash_api_key(api_key)):
+            self.rejected_total += 1
+            return None
+        self.resolved_total += 1
+        return entry
+
+    def add(self, key: ApiKey, company_name: str):
+        """Index a key created by this worker (others pick it up on their next refresh)"""
+        self._keys[key.key_prefix] = IndexedKey(key.id, key.key_prefix, key.key_hash, key.company_id, company_name)
+
+    def discard(self, key_prefix: str):
+        """Drop a revoked key (invalidation bus handler)"""
+        self._keys.pop(key_prefix, None)
+
+    def request_refresh(self, _: str = ""):
+        self._wake.set()
+
+    async def refresh(self, full: bool = False):
+        """Apply keys and companies changed since the last refresh (everything if `full`)"""
+        loop = asyncio.get_running_loop()
+        full = full or self._watermark is None or loop.time() - self._last_full_reload >= self.full_reload_interval
+        query = (
+            select(ApiKey, Company.name, Company.is_active, Company.updated_at)
+            .join(Company, Company.id == ApiKey.company_id)
+        )
+        if full:
+            query = query.where(ApiKey.revoked_at.is_(None), Company.is_active == True)
+        else:
+            since = self._watermark - self.overlap
+            query = query.where(or_(ApiKey.updated_at > since, Company.updated_at > since))
+
+        db = new_session()
+        try:
+            rows = (await db.execute(query)).all()
+        finally:
+            await db.close()
+
+        keys = {} if full else self._keys
+        watermark = None if full else self._watermark
+        for key, company_name, company_active, company_updated_at in rows:
+            if key.revoked_at is None and company_active:
+                keys[key.key_prefix] = IndexedKey(key.id, key.key_prefix, key.key_hash, key.company_id, company_name)
+            else:
+                keys.pop(key.key_prefix, None)
+            for changed_at in (key.updated_at, company_updated_at):
+                if changed_at is not None and (watermark is None or changed_at > watermark):
+                    watermark = changed_at
+        if full:
+            self._keys = keys
+            self._last_full_reload = loop.time()
+        self._watermark = watermark
+        self.refreshes_total += 1
+
+    async def start(self):
+        if self._task is not None:
+            return
+        try:
+            await self.refresh(full=True)
+        except Exception as e:
+            self.failed_refreshes_total += 1
+            logger.warning("Could not load API keys: %s", e)
+        if self.refresh_interval > 0:
+            self._task = asyncio.create_task(self._run(), name="api-key-index-refresh")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.refresh_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.refresh()
+            except Exception as e:
+                self.failed_refreshes_total += 1
+                logger.error("API key index refresh failed: %s", e)
+
+    def metrics(self) -> dict:
+        return {
+            "live_keys": len(self._keys),
+            "resolved_total": self.resolved_total,
+            "rejected_total": self.rejected_total,
+            "refreshes_total": self.refreshes_total,
+            "failed_refreshes_total": self.failed_refreshes_total,
+        }
+
+
+api_key_index = ApiKeyIndex(API_KEY_REFRESH_INTERVAL, API_KEY_REFRESH_OVERLAP, API_KEY_FULL_RELOAD_INTERVAL)
+invalidation_bus.subscribe(API_KEY_TOPIC, api_key_index.discard)
+# Revocations published while the listener was down were missed
+invalidation_bus.subscribe(invalidation_bus.RESET, api_key_index.request_refresh)
+
+
+async def revoke_api_key(db, key_prefix: str):
+    """Drop a revoked key on every worker, this one included, once `db` commits"""
+    await invalidation_bus.publish(db, API_KEY_TOPIC, key_prefix)
@@ -5,6 +5,8 @@ import secrets
 import hashlib
 from typing import Tuple
 
+API_KEY_PREFIX_LENGTH = len("zlavox_live_") + 12
+
 
 def generate_api_key() -> str:
     """
@@ -27,11 +29,19 @@ def generate_test_api_key() -> str:
     return f"zlavox_test_{hex_string}"
 
 
-def hash_api_key(api_key: str) -> str:
+def hash_api_key(api_key: str) -> bytes:
+    """
+    Create a SHA-256 digest of an API key for storage (only the digest is kept)
+    """
+    return hashlib.sha256(api_key.encode()).digest()
+
+
+def api_key_prefix(api_key: str) -> str:
     """
-    Create a SHA-256 hash of an API key for secure storage comparison
+    Public lookup prefix of an API key: environment plus the first 12 hex characters
+    Example: zlavox_live_a1b2c3d4e5f6
     """
-    return hashlib.sha256(api_key.encode()).hexdigest()
+    return api_key[:API_KEY_PREFIX_LENGTH]
 
 
 def verify_api_key_format(api_key: str) -> Tuple[bool, str]:
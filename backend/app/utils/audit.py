@@ -0,0 +1,233 @@
+"""
+Batched audit-log writer
+Request handlers append rows to an in-memory buffer; a background task
+writes them with one multi-row INSERT per batch.
+"""
+import asyncio
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+from dotenv import load_dotenv
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+
+from app.database import engine, new_session
+from app.models import AuditLog
+from app.utils.spool import SpoolFile
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "200"))  # flush when this many rows are buffered
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1.0"))  # ...or after this many seconds
+AUDIT_MAX_BUFFER = int(os.getenv("AUDIT_MAX_BUFFER", "50000"))  # oldest rows dropped beyond this
+AUDIT_SPILL_PATH = os.getenv("AUDIT_SPILL_PATH", "")  # optional write-ahead file for crash safety (one per process)
+
+UUID_FIELDS = ("id", "company_id", "user_id", "resource_id")
+
+
+def _row_to_json(row: dict) -> str:
+    data = {key: str(value) if value is not None and key in UUID_FIELDS else value for key, value in row.items()}
+    data["created_at"] = row["created_at"].isoformat()
+    return json.dumps(data)
+
+
+def _row_from_json(line: str) -> dict:
+    data = json.loads(line)
+    for key in UUID_FIELDS:
+        if data.get(key) is not None:
+            data[key] = uuid.UUID(data[key])
+    data["created_at"] = datetime.fromisoformat(data["created_at"])
+    return data
+
+
+def _insert_rows():
+    """INSERT ... ON CONFLICT (id) DO NOTHING: a row that was already written (replayed from the spill file) is a no-op"""
+    dialect_insert = sqlite_insert if engine.dialect.name == "sqlite" else pg_insert
+    return dialect_insert(AuditLog).on_conflict_do_nothing(index_elements=["id"])
+
+
+class AuditWriter:
+    """
+    Buffers AuditLog rows and flushes them in bulk on a size or time trigger
+    With a spill path set, every row is appended to this process's spill file
+    (app.utils.spool) before it is buffered, and the file is compacted to the
+    still-buffered rows as batches commit, so rows that were never flushed
+    are replayed on the next start.
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float, max_buffer: int, spill_path: str = ""):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.spill_path = spill_path
+        self.buffer: list[dict] = []
+        self._spill: Optional[SpoolFile] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+        self.written_total = 0
+        self.dropped_total = 0
+        self.rejected_total = 0
+        self.failed_flushes_total = 0
+
+    def record(self, **values):
+        """Buffer one audit row; never touches the database"""
+        row = {
+            "id": uuid.uuid4(),
+            "company_id": values["company_id"],
+            "user_id": values.get("user_id"),
+            "action": values["action"],
+            "resource_type": values.get("resource_type"),
+            "resource_id": values.get("resource_id"),
+            "ip_address": values.get("ip_address"),
+            "user_agent": values.get("user_agent"),
+            "extra_data": values.get("extra_data"),
+            "created_at": datetime.now(timezone.utc),
+        }
+
+        if self._spill is not None:
+            try:
+                self._spill.append(_row_to_json(row))
+            except OSError as e:
+                logger.error("Failed to spill audit row: %s", e)
+
+        self.buffer.append(row)
+        if len(self.buffer) > self.max_buffer:
+            overflow = len(self.buffer) - self.max_buffer
+            del self.buffer[:overflow]
+            self.dropped_total += overflow
+
+        if len(self.buffer) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self):
+        """Replay any spilled rows and start the background flusher"""
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+
+        if self.spill_path:
+            self._spill = SpoolFile(self.spill_path)
+            replayed = {}
+            for line in self._spill.open():
+                try:
+                    row = _row_from_json(line)
+                except (ValueError, KeyError):
+                    continue  # torn last line from a crash mid-write
+                replayed[row["id"]] = row
+            self.buffer = list(replayed.values()) + self.buffer
+            for row in self.buffer:
+                self._spill.append(_row_to_json(row))
+            self._spill.release_adopted()
+            if replayed:
+                logger.info("Replaying %s spilled audit rows", len(replayed))
+            if self.buffer:
+                await self.flush()
+
+        self._task = asyncio.create_task(self._run(), name="audit-writer")
+
+    async def stop(self):
+        """Stop the flusher and write out everything still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write all buffered rows; rows stay buffered if the database is unavailable"""
+        if not self.buffer:
+            return
+        lock = self._flush_lock or asyncio.Lock()
+        async with lock:
+            while self.buffer:
+                batch = self.buffer[:self.batch_size]
+                try:
+                    rejected = await self._write(batch)
+                except Exception as e:
+                    self.failed_flushes_total += 1
+                    logger.error("Failed to flush %s audit rows: %s", len(batch), e)
+                    return
+                del self.buffer[:len(batch)]
+                self.written_total += len(batch) - rejected
+                self.rejected_total += rejected
+                self._compact_spill()
+
+    def _compact_spill(self):
+        """Drop committed rows from the spill file once they make up half of it"""
+        if self._spill is None or not self._spill.needs_compaction(len(self.buffer)):
+            return
+        try:
+            self._spill.rewrite([_row_to_json(row) for row in self.buffer])
+        except OSError as e:
+            logger.error("Failed to compact audit spill file: %s", e)
+
+    async def _write(self, rows: list[dict]) -> int:
+        """Insert a batch; returns how many rows were rejected (logged and dropped)"""
+        db = new_session()
+        rejected = 0
+        try:
+            try:
+                await db.execute(_insert_rows(), rows)
+                await db.commit()
+            except IntegrityError:
+                # A referenced user was deleted while the row was buffered;
+                # write rows one by one, nulling user_id like ON DELETE SET NULL
+                await db.rollback()
+                for row in rows:
+                    try:
+                        await db.execute(_insert_rows(), [row])
+                        await db.commit()
+                        continue
+                    except IntegrityError:
+                        await db.rollback()
+                    try:
+                        await db.execute(_insert_rows(), [dict(row, user_id=None)])
+                        await db.commit()
+                    except IntegrityError as e:
+                        # e.g. the company is gone: retrying can't help, and
+                        # keeping the row would hold back every row after it
+                        await db.rollback()
+                        rejected += 1
+                        logger.error("Dropping audit row %s: %s", _row_to_json(row), e.orig)
+        finally:
+            await db.close()
+        return rejected
+
+    def metrics(self) -> dict:
+        return {
+            "buffered": len(self.buffer),
+            "written_total": self.written_total,
+            "dropped_total": self.dropped_total,
+            "rejected_total": self.rejected_total,
+            "failed_flushes_total": self.failed_flushes_total,
+        }
+
+
+audit_writer = AuditWriter(
+    batch_size=AUDIT_BATCH_SIZE,
+    flush_interval=AUDIT_FLUSH_INTERVAL,
+    max_buffer=AUDIT_MAX_BUFFER,
+    spill_path=AUDIT_SPILL_PATH,
+)
@@ -0,0 +1,163 @@
+"""
+MFA backup-code storage
+Each code is its own mfa_backup_codes row holding an HMAC-SHA256 of the
+normalized code (keyed with a server secret and bound to the user), so a
+code is checked and used up by one indexed conditional UPDATE: of two
+concurrent uses exactly one succeeds, and nothing is decrypted.
+
+Codes still stored in the legacy encrypted users.mfa_backup_codes column are
+moved into rows the first time they are needed; `python -m
+app.utils.backup_codes` migrates the remaining users in batches.
+"""
+import asyncio
+import hashlib
+import hmac
+import logging
+import os
+import sys
+import unicodedata
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.database import new_session
+from app.models import MFABackupCode, User
+from app.utils.mfa import decrypt_backup_codes
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this")
+# Changing this key invalidates every stored backup code
+BACKUP_CODE_HASH_KEY = os.getenv("BACKUP_CODE_HASH_KEY", "")
+BACKUP_CODE_MIGRATION_BATCH = int(os.getenv("BACKUP_CODE_MIGRATION_BATCH", "500"))  # users per transaction
+
+_hash_key = (
+    BACKUP_CODE_HASH_KEY.encode() if BACKUP_CODE_HASH_KEY
+    else hmac.new(SECRET_KEY.encode(), b"mfa-backup-codes", hashlib.sha256).digest()
+)
+
+
+def normalize_backup_code(code: str) -> str:
+    """'abcd-1234' -> 'ABCD1234' (same rules as the old blob comparison)"""
+    return unicodedata.normalize("NFKC", code).replace("-", "").replace(" ", "").upper()
+
+
+def hash_backup_code(user_id, code: str) -> bytes:
+    """Keyed lookup hash for one user's code"""
+    message = str(user_id).encode() + b":" + normalize_backup_code(code).encode()
+    return hmac.new(_hash_key, message, hashlib.sha256).digest()
+
+
+async def store_backup_codes(db, user: User, codes: list[str]):
+    """Replace a user's backup codes (caller commits)"""
+    await delete_backup_codes(db, user)
+    await db.execute(
+        insert(MFABackupCode),
+        [{"user_id": user.id, "code_hash": hash_backup_code(user.id, code)} for code in codes]
+    )
+
+
+async def delete_backup_codes(db, user: User):
+    """Drop all of a user's backup codes, including any left in the legacy column (caller commits)"""
+    await db.execute(
+        delete(MFABackupCode)
+        .where(MFABackupCode.user_id == user.id)
+        .execution_options(synchronize_session=False)
+    )
+    if user.mfa_backup_codes is not None:
+        user.mfa_backup_codes = None
+
+
+async def migrate_legacy_backup_codes(db, user: User) -> int:
+    """
+    Move a user's codes out of the encrypted users.mfa_backup_codes column
+    The column is cleared with a conditional UPDATE first, so when several
+    requests (or the batch migrator) race, only one of them inserts rows.
+    Returns the number of codes moved (caller commits).
+    """
+    blob = user.mfa_backup_codes
+    if not blob:
+        return 0
+    try:
+        codes = decrypt_backup_codes(blob)
+    except Exception as e:
+        logger.error("Could not decrypt legacy backup codes for user %s: %s", user.id, e)
+        return 0
+
+    claimed = await db.execute(
+        update(User)
+        .where(User.id == user.id, User.mfa_backup_codes == blob)
+        .values(mfa_backup_codes=None)
+        .execution_options(synchronize_session=False)
+    )
+    set_committed_value(user, "mfa_backup_codes", None)
+    if claimed.rowcount != 1:
+        return 0  # someone else migrated (or replaced) them
+    if codes:
+        await db.execute(
+            insert(MFABackupCode),
+            [{"user_id": user.id, "code_hash": hash_backup_code(user.id, code)} for code in codes]
+        )
+    return len(codes)
+
+
+async def consume_backup_code(db, user: User, code: str) -> bool:
+    """Use up one of the user's backup codes; False if unknown or already used (caller commits)"""
+    if user.mfa_backup_codes:
+        await migrate_legacy_backup_codes(db, user)
+    result = await db.execute(
+        update(MFABackupCode)
+        .where(
+            MFABackupCode.user_id == user.id,
+            MFABackupCode.code_hash == hash_backup_code(user.id, code),
+            MFABackupCode.used_at.is_(None)
+        )
+        .values(used_at=datetime.now(timezone.utc))
+        .returning(MFABackupCode.id)
+        .execution_options(synchronize_session=False)
+    )
+    return result.first() is not None
+
+
+async def migrate_all_legacy_backup_codes(batch_size: int = BACKUP_CODE_MIGRATION_BATCH) -> int:
+    """
+    Migrate every user still on the legacy column, one batch per transaction
+    Walks users in id order; users locked by a concurrent request are
+    skipped (that request migrates them itself). Needs a role that bypasses
+    row-level security on users (e.g. the table owner), since no company
+    context is set.
+    """
+    migrated = 0
+    after = None
+    while True:
+        query = (
+            select(User)
+            .where(User.mfa_backup_codes.is_not(None))
+            .order_by(User.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        if after is not None:
+            query = query.where(User.id > after)  # rows that failed to decrypt aren't retried
+        db = new_session()
+        try:
+            users = (await db.scalars(query)).all()
+            for user in users:
+                migrated += await migrate_legacy_backup_codes(db, user)
+            await db.commit()
+        finally:
+            await db.close()
+        if len(users) < batch_size:
+            return migrated
+        after = users[-1].id
+        await asyncio.sleep(0)
+
+
+if __name__ == "__main__":
+    batch = int(sys.argv[1]) if len(sys.argv) > 1 else BACKUP_CODE_MIGRATION_BATCH
+    moved = asyncio.run(migrate_all_legacy_backup_codes(batch))
+    print(f"✅ Migrated {moved} legacy backup codes")
@@ -1,33 +1,59 @@
-import aiosmtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import os
+import logging
 from dotenv import load_dotenv
 from typing import List
 
+from app.utils.email_dispatcher import EmailDispatcher
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
 SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
 SMTP_USER = os.getenv("SMTP_USER", "")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
 SMTP_SECURE = os.getenv("SMTP_SECURE", "false").lower() == "true"  # true for SSL (465), false for STARTTLS (587)
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() == "true"  # false only for local/plain relays
+SMTP_AUTH = os.getenv("SMTP_AUTH", "true").lower() == "true"  # false for relays that don't require login
 FROM_EMAIL = os.getenv("FROM_EMAIL", "noreply@voiceagent.com")
 FROM_NAME = os.getenv("FROM_NAME", "Voice Age")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
 
+# Outbound queue
+EMAIL_POOL_SIZE = int(os.getenv("EMAIL_POOL_SIZE", "2"))  # persistent SMTP connections
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "20"))
+EMAIL_QUEUE_MAX = int(os.getenv("EMAIL_QUEUE_MAX", "1000"))
+EMAIL_MAX_RETRIES = int(os.getenv("EMAIL_MAX_RETRIES", "5"))
+EMAIL_RETRY_BACKOFF_SECONDS = float(os.getenv("EMAIL_RETRY_BACKOFF_SECONDS", "1"))
+EMAIL_DEAD_LETTER_PATH = os.getenv("EMAIL_DEAD_LETTER_PATH", "")
+EMAIL_SPOOL_PATH = os.getenv("EMAIL_SPOOL_PATH", "")  # queued mail survives restarts and crashes
 
-async def send_email(
-    to_email: str,
-    subject: str,
-    html_content: str,
-    text_content: str = None
-):
-    """Send an email"""
-    if not SMTP_USER or not SMTP_PASSWORD:
-        print(f"⚠️  Email not configured. Would send to {to_email}: {subject}")
-        return
-    
+email_dispatcher = EmailDispatcher(
+    hostname=SMTP_HOST,
+    port=SMTP_PORT,
+    username=SMTP_USER if SMTP_AUTH else "",
+    password=SMTP_PASSWORD if SMTP_AUTH else "",
+    use_tls=SMTP_SECURE,
+    start_tls=SMTP_STARTTLS,
+    pool_size=EMAIL_POOL_SIZE,
+    batch_size=EMAIL_BATCH_SIZE,
+    max_queue=EMAIL_QUEUE_MAX,
+    max_retries=EMAIL_MAX_RETRIES,
+    backoff_base=EMAIL_RETRY_BACKOFF_SECONDS,
+    dead_letter_path=EMAIL_DEAD_LETTER_PATH,
+    spool_path=EMAIL_SPOOL_PATH,
+)
+
+
+def is_email_configured() -> bool:
+    return bool(SMTP_HOST) and (not SMTP_AUTH or bool(SMTP_USER and SMTP_PASSWORD))
+
+
+def build_message(to_email: str, subject: str, html_content: str, text_content: str = None) -> MIMEMultipart:
+    """Build a multipart email message"""
     message = MIMEMultipart("alternative")
     message["From"] = f"{FROM_NAME} <{FROM_EMAIL}>"
     message["To"] = to_email
@@ -42,30 +68,24 @@ async def send_email(
     html_part = MIMEText(html_content, "html")
     message.attach(html_part)
     
-    try:
-        if SMTP_SECURE:
-            # SSL/TLS connection (port 465)
-            await aiosmtplib.send(
-                message,
-                hostname=SMTP_HOST,
-                port=SMTP_PORT,
-                username=SMTP_USER,
-                password=SMTP_PASSWORD,
-                use_tls=True
-            )
-        else:
-            # STARTTLS connection (port 587)
-            await aiosmtplib.send(
-                message,
-                hostname=SMTP_HOST,
-                port=SMTP_PORT,
-                username=SMTP_USER,
-                password=SMTP_PASSWORD,
-                start_tls=True
-            )
-        print(f"✅ Email sent to {to_email}: {subject}")
-    except Exception as e:
-        print(f"❌ Failed to send email to {to_email}: {str(e)}")
+    return message
+
+
+async def send_email(
+    to_email: str,
+    subject: str,
+    html_content: str,
+    text_content: str = None
+):
+    """Queue an email for background delivery (returns without waiting on SMTP)"""
+    if not is_email_configured():
+        logger.warning("Email not configured. Would send to %s: %s", to_email, subject)
+        return
+    
+    message = build_message(to_email, subject, html_content, text_content)
+    
+    if not email_dispatcher.enqueue(message):
+        logger.error("Email queue full, dead-lettered email to %s: %s", to_email, subject)
 
 
 async def send_welcome_email(to_email: str, full_name: str, company_name: str):
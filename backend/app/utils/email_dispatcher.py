@@ -0,0 +1,358 @@
+"""
+Background outbound email dispatcher
+Request handlers enqueue messages and return immediately; a small pool of
+workers delivers them over persistent, authenticated SMTP connections.
+With a spool path set, queued mail survives a crash or restart: every
+message is appended to this process's spool file (app.utils.spool) before
+it is queued and marked done once delivered (or dead-lettered), and the
+next start queues again whatever crashed processes left unfinished.
+Delivery is at-least-once: a message sent right before a crash may be sent
+twice.
+"""
+import asyncio
+import email
+import json
+import logging
+import random
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from email.message import Message
+from typing import Optional
+
+import aiosmtplib
+
+from app.utils.metrics import stage_timer
+from app.utils.spool import SpoolFile
+
+logger = logging.getLogger(__name__)
+
+
+class QueuedEmail:
+    """A message waiting for delivery"""
+
+    def __init__(self, message: Message, id: Optional[str] = None, attempts: int = 0):
+        self.id = id or uuid.uuid4().hex
+        self.message = message
+        self.attempts = attempts
+        self.last_error: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "to": self.message["To"],
+            "subject": self.message["Subject"],
+            "attempts": self.attempts,
+            "last_error": self.last_error,
+            "failed_at": datetime.utcnow().isoformat(),
+            "message": self.message.as_string(),
+        }
+
+
+class SMTPConnection:
+    """One reusable SMTP session (connect + TLS + AUTH once, then send many)"""
+
+    def __init__(self, hostname: str, port: int, username: str, password: str,
+                 use_tls: bool, start_tls: bool, idle_timeout: float):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.start_tls = start_tls
+        self.idle_timeout = idle_timeout
+        self.client: Optional[aiosmtplib.SMTP] = None
+        self.last_used = 0.0
+
+    async def _connect(self):
+        self.client = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            use_tls=self.use_tls,
+            start_tls=self.start_tls if not self.use_tls else False,
+        )
+        await self.client.connect()
+        if self.username:
+            await self.client.login(self.username, self.password)
+
+    async def send(self, message: Message):
+        # Servers drop idle sessions; reconnect rather than fail the first send
+        idle = time.monotonic() - self.last_used
+        if self.client is None or not self.client.is_connected or idle > self.idle_timeout:
+            await self.close()
+            with stage_timer("smtp_connect"):
+                await self._connect()
+        try:
+            with stage_timer("smtp_send"):
+                await self.client.send_message(message)
+        except Exception:
+            await self.close()
+            raise
+        self.last_used = time.monotonic()
+
+    async def close(self):
+        client, self.client = self.client, None
+        if client is not None and client.is_connected:
+            try:
+                await client.quit()
+            except Exception:
+                client.close()
+
+
+class EmailDispatcher:
+    """
+    In-process email queue with connection pooling, batching and retries
+    Messages that exhaust their retries go to the dead-letter store. Without
+    a spool path the queue lives in memory only, and stop() dead-letters
+    whatever is still undelivered.
+    """
+
+    def __init__(
+        self,
+        hostname: str,
+        port: int,
+        username: str = "",
+        password: str = "",
+        use_tls: bool = False,
+        start_tls: bool = True,
+        pool_size: int = 2,
+        batch_size: int = 20,
+        max_queue: int = 1000,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        idle_timeout: float = 60.0,
+        dead_letter_path: str = "",
+        dead_letter_limit: int = 1000,
+        spool_path: str = "",
+    ):
+        self.connection_args = dict(
+            hostname=hostname, port=port, username=username, password=password,
+            use_tls=use_tls, start_tls=start_tls, idle_timeout=idle_timeout,
+        )
+        self.pool_size = max(1, pool_size)
+        self.batch_size = max(1, batch_size)
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.dead_letter_path = dead_letter_path
+        self.dead_letters: deque = deque(maxlen=dead_letter_limit)
+        self.spool_path = spool_path
+        self._spool: Optional[SpoolFile] = None
+        self._spooled: dict[str, QueuedEmail] = {}  # in the spool and not yet done
+
+        self.queue: Optional[asyncio.Queue] = None
+        self._workers: list[asyncio.Task] = []
+        self._retry_tasks: dict[asyncio.Task, QueuedEmail] = {}
+        self._connections: list[SMTPConnection] = []
+        self._interrupted: list[QueuedEmail] = []
+
+        self.sent_total = 0
+        self.retried_total = 0
+        self.dead_lettered_total = 0
+        self.replayed_total = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self):
+        """Queue spooled messages again and start delivery workers (one persistent SMTP connection each)"""
+        if self.running:
+            return
+        if self.queue is None:
+            self.queue = asyncio.Queue(maxsize=self.max_queue)
+        if self.spool_path and self._spool is None:
+            self._replay_spool()
+        for i in range(self.pool_size):
+            connection = SMTPConnection(**self.connection_args)
+            self._connections.append(connection)
+            self._workers.append(asyncio.create_task(self._worker(connection), name=f"email-worker-{i}"))
+
+    async def stop(self, timeout: float = 10.0):
+        """Flush the queue (up to timeout), then dead-letter whatever is left"""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+        pending_retries = list(self._retry_tasks.values())
+        for task in list(self._retry_tasks) + self._workers:
+            task.cancel()
+        await asyncio.gather(*self._retry_tasks, *self._workers, return_exceptions=True)
+        self._retry_tasks.clear()
+        self._workers.clear()
+
+        leftovers = pending_retries + self._interrupted
+        self._interrupted = []
+        while not self.queue.empty():
+            leftovers.append(self.queue.get_nowait())
+        if self._spool is not None:
+            # Still in the spool: delivered after the next start
+            if leftovers:
+                logger.info("Keeping %s undelivered emails in the spool", len(leftovers))
+            self._compact_spool()
+            self._spool.close()
+            self._spool = None
+        else:
+            for item in leftovers:
+                item.last_error = item.last_error or "dispatcher shut down before delivery"
+                self._dead_letter(item)
+
+        for connection in self._connections:
+            await connection.close()
+        self._connections.clear()
+
+    def enqueue(self, message: Message) -> bool:
+        """Queue a message for delivery without waiting; returns False if it was dead-lettered"""
+        if self.queue is None:
+            self.queue = asyncio.Queue(maxsize=self.max_queue)
+        item = QueuedEmail(message)
+        if self.queue.full():
+            item.last_error = "email queue full"
+            self._dead_letter(item)
+            return False
+        self._write_spool("add", item, message=message.as_string())
+        self.queue.put_nowait(item)
+        return True
+
+    async def _worker(self, connection: SMTPConnection):
+        while True:
+            batch = [await self.queue.get()]
+            # Drain whatever else is ready so it goes out over the same session
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            for i, item in enumerate(batch):
+                try:
+                    item.attempts += 1
+                    await connection.send(item.message)
+                    self.sent_total += 1
+                    self._write_spool("done", item)
+                except asyncio.CancelledError:
+                    # Hand the unsent part of the batch back to stop() (spooled, or dead-lettered)
+                    for unsent in batch[i:]:
+                        self.queue.task_done()
+                        self._interrupted.append(unsent)
+                    raise
+                except Exception as e:
+                    item.last_error = str(e)
+                    self._schedule_retry(item)
+                    self.queue.task_done()
+                else:
+                    self.queue.task_done()
+            self._compact_spool()
+
+    def _schedule_retry(self, item: QueuedEmail):
+        if item.attempts > self.max_retries:
+            logger.error("Giving up on email to %s after %s attempts: %s", item.message['To'], item.attempts, item.last_error)
+            self._dead_letter(item)
+            return
+
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (item.attempts - 1)))
+        delay *= random.uniform(0.5, 1.0)  # Jitter so retries don't stampede the server
+        self.retried_total += 1
+        self._write_spool("retry", item, attempts=item.attempts)  # retries don't start over after a restart
+
+        async def requeue():
+            await asyncio.sleep(delay)
+            try:
+                self.queue.put_nowait(item)
+            except asyncio.QueueFull:
+                item.last_error = "email queue full"
+                self._dead_letter(item)
+
+        task = asyncio.create_task(requeue())
+        self._retry_tasks[task] = item
+        task.add_done_callback(lambda t: self._retry_tasks.pop(t, None))
+
+    def _write_spool(self, op: str, item: QueuedEmail, **fields):
+        """Append an add/retry/done record for `item` to this process's spool"""
+        if self._spool is None:
+            return
+        if op == "done":
+            self._spooled.pop(item.id, None)
+        elif op == "add":
+            self._spooled[item.id] = item
+        try:
+            self._spool.append(json.dumps({"op": op, "id": item.id, **fields}))
+        except OSError as e:
+            logger.error("Failed to write email spool: %s", e)
+
+    def _compact_spool(self):
+        """Rewrite the spool with just the pending messages once finished ones make up half of it"""
+        if self._spool is None or not self._spool.needs_compaction(len(self._spooled)):
+            return
+        try:
+            self._spool.rewrite([
+                json.dumps({"op": "add", "id": item.id, "message": item.message.as_string(), "attempts": item.attempts})
+                for item in self._spooled.values()
+            ])
+        except OSError as e:
+            logger.error("Failed to compact email spool: %s", e)
+
+    def _replay_spool(self):
+        """Queue the messages that crashed processes left undelivered"""
+        self._spool = SpoolFile(self.spool_path)
+        messages: dict[str, str] = {}
+        attempts: dict[str, int] = {}
+        done: set[str] = set()
+        for line in self._spool.open():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # torn last line from a crash mid-write
+            email_id = record["id"]
+            if record["op"] == "done":
+                done.add(email_id)
+                continue
+            if record["op"] == "add":
+                messages.setdefault(email_id, record["message"])
+            attempts[email_id] = max(attempts.get(email_id, 0), record.get("attempts", 0))
+
+        # Each message is queued once, whichever file(s) it appears in, and never after a done record
+        items = []
+        for email_id, message in messages.items():
+            if email_id in done:
+                continue
+            item = QueuedEmail(email.message_from_string(message), email_id, attempts[email_id])
+            self._write_spool("add", item, message=message, attempts=item.attempts)
+            items.append(item)
+        self._spool.release_adopted()
+
+        for item in items:
+            try:
+                self.queue.put_nowait(item)
+            except asyncio.QueueFull:
+                item.last_error = "email queue full"
+                self._dead_letter(item)
+                continue
+            self.replayed_total += 1
+        if items:
+            logger.info("Replaying %s spooled emails", len(items))
+
+    def _dead_letter(self, item: QueuedEmail):
+        self._write_spool("done", item)
+        self.dead_lettered_total += 1
+        record = item.to_dict()
+        self.dead_letters.append(record)
+        if self.dead_letter_path:
+            try:
+                with open(self.dead_letter_path, "a") as f:
+                    f.write(json.dumps(record) + "\n")
+            except OSError as e:
+                logger.error("Failed to write email dead letter: %s", e)
+
+    def metrics(self) -> dict:
+        return {
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "workers": len(self._workers),
+            "pending_retries": len(self._retry_tasks),
+            "sent_total": self.sent_total,
+            "retried_total": self.retried_total,
+            "dead_lettered_total": self.dead_lettered_total,
+            "replayed_total": self.replayed_total,
+        }
@@ -0,0 +1,154 @@
+"""
+Async password hashing service
+Runs Argon2id/bcrypt on a bounded worker pool so it never blocks the event loop.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+
+from app.auth import get_password_hash, verify_and_update_password, verify_password
+from app.utils.metrics import observe_stage
+
+load_dotenv()
+
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread").lower()  # thread or process
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "32"))
+PASSWORD_HASH_RETRY_AFTER = os.getenv("PASSWORD_HASH_RETRY_AFTER", "1")
+
+
+def _timed(fn, *args):
+    """Run `fn` in the worker and report how long it took there (works across processes)"""
+    start = time.perf_counter()
+    return fn(*args), time.perf_counter() - start
+
+
+class PasswordHasher:
+    """
+    Bounded pool for password hashing work
+    At most `workers` hashes run at once and at most `max_queue` wait behind
+    them; anything beyond that is rejected with a fast 503.
+    """
+
+    def __init__(self, workers: int, max_queue: int, executor_kind: str = "thread"):
+        if executor_kind not in ("thread", "process"):
+            raise ValueError("PASSWORD_HASH_EXECUTOR must be 'thread' or 'process'")
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.executor_kind = executor_kind
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed_total = 0
+        self.rejected_total = 0
+        self.peak_in_flight = 0
+        self.rehashed_total = 0
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.executor_kind == "process":
+                        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    else:
+                        self._executor = ThreadPoolExecutor(
+                            max_workers=self.workers,
+                            thread_name_prefix="password-hash"
+                        )
+        return self._executor
+
+    def _acquire(self):
+        with self._lock:
+            if self.in_flight >= self.workers + self.max_queue:
+                self.rejected_total += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Server is busy, please retry shortly",
+                    headers={"Retry-After": PASSWORD_HASH_RETRY_AFTER},
+                )
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+            self.completed_total += 1
+
+    async def _run(self, stage: str, fn, *args):
+        self._acquire()
+        try:
+            loop = asyncio.get_running_loop()
+            submitted = time.perf_counter()
+            result, elapsed = await loop.run_in_executor(self.executor, _timed, fn, *args)
+            observe_stage(stage, elapsed)
+            observe_stage("password_queue", max(0.0, time.perf_counter() - submitted - elapsed))
+            return result
+        finally:
+            self._release()
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """Verify a password against its hash off the event loop"""
+        return await self._run("password_verify", verify_password, plain_password, hashed_password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+        """Verify off the event loop; a new hash comes back when the stored one is outdated"""
+        verified, new_hash = await self._run("password_verify", verify_and_update_password, plain_password, hashed_password)
+        if new_hash is not None:
+            self.rehashed_total += 1
+        return verified, new_hash
+
+    async def hash(self, password: str) -> str:
+        """Hash a password off the event loop"""
+        return await self._run("password_hash", get_password_hash, password)
+
+    def metrics(self) -> dict:
+        """Pool saturation snapshot"""
+        with self._lock:
+            in_flight = self.in_flight
+            return {
+                "executor": self.executor_kind,
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": in_flight,
+                "queued": max(0, in_flight - self.workers),
+                "saturation": round(in_flight / (self.workers + self.max_queue), 3),
+                "peak_in_flight": self.peak_in_flight,
+                "completed_total": self.completed_total,
+                "rejected_total": self.rejected_total,
+                "rehashed_total": self.rehashed_total,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+password_hasher = PasswordHasher(
+    workers=PASSWORD_HASH_WORKERS,
+    max_queue=PASSWORD_HASH_MAX_QUEUE,
+    executor_kind=PASSWORD_HASH_EXECUTOR,
+)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password on the hashing pool"""
+    return await password_hasher.verify(plain_password, hashed_password)
+
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    """Verify a password on the hashing pool, rehashing it if its hash is outdated"""
+    return await password_hasher.verify_and_update(plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password on the hashing pool"""
+    return await password_hasher.hash(password)
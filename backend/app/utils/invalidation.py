@@ -0,0 +1,112 @@
+"""
+Cross-worker cache invalidation
+Each worker keeps its own in-memory caches. Invalidations are applied locally
+when the request's transaction commits and, with
+CACHE_INVALIDATION_BACKEND=postgres, broadcast to every other worker through
+PostgreSQL LISTEN/NOTIFY. NOTIFY is sent on the request's session, so other
+workers also only hear about a change once it is committed.
+"""
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from typing import Callable, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import func, select
+
+from app.database import DATABASE_URL, after_commit
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CACHE_INVALIDATION_BACKEND = os.getenv("CACHE_INVALIDATION_BACKEND", "local").lower()  # local or postgres
+INVALIDATION_CHANNEL = os.getenv("INVALIDATION_CHANNEL", "app_cache_invalidation")
+INVALIDATION_RECONNECT_SECONDS = float(os.getenv("INVALIDATION_RECONNECT_SECONDS", "2"))
+
+
+def _asyncpg_dsn(url: str) -> str:
+    """asyncpg.connect expects a plain postgresql:// DSN"""
+    scheme, sep, rest = url.partition("://")
+    return f"postgresql://{rest}" if sep and scheme.startswith("postgres") else url
+
+
+class InvalidationBus:
+    """
+    Topic-based invalidation fan-out
+    Handlers receive the invalidated key. Subscribers to RESET are called
+    when the listener reconnects, since notifications may have been missed.
+    """
+
+    RESET = "*"
+
+    def __init__(self, backend: str, channel: str):
+        if backend not in ("local", "postgres"):
+            raise ValueError("CACHE_INVALIDATION_BACKEND must be 'local' or 'postgres'")
+        self.backend = backend
+        self.channel = channel
+        self.handlers: dict[str, list[Callable[[str], None]]] = defaultdict(list)
+        self._task: Optional[asyncio.Task] = None
+        self.received_total = 0
+        self.published_total = 0
+
+    def subscribe(self, topic: str, handler: Callable[[str], None]):
+        self.handlers[topic].append(handler)
+
+    def dispatch(self, topic: str, key: str):
+        for handler in self.handlers.get(topic, []):
+            handler(key)
+
+    async def publish(self, db, topic: str, key: str):
+        """
+        Invalidate on this worker and every other one once `db` commits
+        (nothing happens if it rolls back); without a session, locally now.
+        """
+        self.published_total += 1
+        if db is None:
+            self.dispatch(topic, key)
+            return
+        after_commit(db, lambda: self.dispatch(topic, key))
+        if self.backend == "postgres":
+            await db.execute(select(func.pg_notify(self.channel, f"{topic}:{key}")))
+
+    def _on_notify(self, connection, pid, channel, payload: str):
+        topic, _, key = payload.partition(":")
+        self.received_total += 1
+        self.dispatch(topic, key)
+
+    async def _listen(self):
+        import asyncpg
+
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(_asyncpg_dsn(DATABASE_URL))
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda conn: closed.set())
+                await connection.add_listener(self.channel, self._on_notify)
+                # Anything published while we were disconnected is lost
+                self.dispatch(self.RESET, "")
+                await closed.wait()
+                logger.warning("Cache invalidation listener disconnected, reconnecting")
+            except asyncio.CancelledError:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+                raise
+            except Exception as e:
+                logger.error("Cache invalidation listener error: %s", e)
+            await asyncio.sleep(INVALIDATION_RECONNECT_SECONDS)
+
+    async def start(self):
+        if self.backend == "postgres" and self._task is None:
+            self._task = asyncio.create_task(self._listen(), name="cache-invalidation-listener")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+invalidation_bus = InvalidationBus(CACHE_INVALIDATION_BACKEND, INVALIDATION_CHANNEL)
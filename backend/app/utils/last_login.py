@@ -0,0 +1,146 @@
+"""
+Coalesced last_login writes
+Logins are recorded in memory (one entry per user, the latest wins) and a
+background task writes them with one UPDATE per batch, instead of every
+login updating its users row. A login reaches the database within
+LAST_LOGIN_FLUSH_INTERVAL seconds (sooner once a batch fills up); until
+then responses built on this worker show the pending value. Logins still
+pending when the process dies without shutting down are lost.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Optional
+from uuid import UUID
+
+from dotenv import load_dotenv
+from sqlalchemy import DateTime, Uuid, bindparam, column, or_, update, values
+
+from app.database import engine, new_session
+from app.models import User
+from app.utils.principal_cache import principal_cache
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+LAST_LOGIN_FLUSH_INTERVAL = float(os.getenv("LAST_LOGIN_FLUSH_INTERVAL", "30"))  # seconds; 0 writes after every login
+LAST_LOGIN_BATCH_SIZE = int(os.getenv("LAST_LOGIN_BATCH_SIZE", "1000"))  # users per UPDATE; a full batch flushes early
+
+
+def _newer(target):
+    # Never move last_login backwards (another worker may have written a later login)
+    return or_(User.last_login.is_(None), User.last_login < target)
+
+
+class LastLoginTracker:
+    """Pending last_login timestamps per user, flushed in batches"""
+
+    def __init__(self, flush_interval: float, batch_size: int):
+        self.flush_interval = flush_interval
+        self.batch_size = max(1, batch_size)
+        self.pending: dict[str, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+        self.recorded_total = 0
+        self.written_total = 0
+        self.flushes_total = 0
+        self.failed_flushes_total = 0
+
+    def record(self, user_id, at: Optional[datetime] = None):
+        """Note a successful login; never touches the database"""
+        self.pending[str(user_id)] = at or datetime.now(timezone.utc)
+        self.recorded_total += 1
+        if self._wakeup is not None and (len(self.pending) >= self.batch_size or self.flush_interval <= 0):
+            self._wakeup.set()
+
+    def latest(self, user_id, stored: Optional[datetime]) -> Optional[datetime]:
+        """The user's last login: a pending one is always newer than what is stored"""
+        return self.pending.get(str(user_id), stored)
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run(), name="last-login-writer")
+
+    async def stop(self):
+        """Stop the flusher and write out everything still pending"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval or None)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write all pending logins; they stay pending if the database is unavailable"""
+        if not self.pending:
+            return
+        lock = self._flush_lock or asyncio.Lock()
+        async with lock:
+            while self.pending:
+                batch = list(self.pending.items())[:self.batch_size]
+                try:
+                    await self._write(batch)
+                except Exception as e:
+                    self.failed_flushes_total += 1
+                    logger.error("Failed to write last_login for %s users: %s", len(batch), e)
+                    return
+                for key, at in batch:
+                    if self.pending.get(key) is at:  # a newer login arrived meanwhile: keep it
+                        del self.pending[key]
+                    # the cached principal still holds the previous value
+                    principal_cache.invalidate(key)
+                self.flushes_total += 1
+                self.written_total += len(batch)
+
+    async def _write(self, batch: list[tuple[str, datetime]]):
+        db = new_session()
+        try:
+            rows = [(UUID(key), at) for key, at in batch]
+            if engine.dialect.name == "postgresql":
+                # UPDATE users ... FROM (VALUES (id, ts), ...): one statement per batch
+                seen = values(
+                    column("id", Uuid), column("last_login", DateTime(timezone=True)), name="seen"
+                ).data(rows)
+                await db.execute(
+                    update(User)
+                    .where(User.id == seen.c.id, _newer(seen.c.last_login))
+                    .values(last_login=seen.c.last_login, updated_at=User.updated_at)
+                    .execution_options(synchronize_session=False)
+                )
+            else:
+                await db.execute(
+                    update(User.__table__)
+                    .where(User.id == bindparam("seen_id"), _newer(bindparam("seen_at")))
+                    .values(last_login=bindparam("seen_at"), updated_at=User.updated_at),
+                    [{"seen_id": user_id, "seen_at": at} for user_id, at in rows]
+                )
+            await db.commit()
+        finally:
+            await db.close()
+
+    def metrics(self) -> dict:
+        return {
+            "pending": len(self.pending),
+            "recorded_total": self.recorded_total,
+            "written_total": self.written_total,
+            "flushes_total": self.flushes_total,
+            "failed_flushes_total": self.failed_flushes_total,
+        }
+
+
+last_login_tracker = LastLoginTracker(LAST_LOGIN_FLUSH_INTERVAL, LAST_LOGIN_BATCH_SIZE)
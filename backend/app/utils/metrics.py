@@ -0,0 +1,166 @@
+"""
+Prometheus metrics, served at /metrics
+- http_request_duration_seconds: per method, route template and status
+- auth_stage_duration_seconds: the expensive steps behind a request
+  (password hashing, PBKDF2/Fernet, TOTP, JWT, SQL statements, SMTP), so a
+  slow login can be broken down stage by stage
+- db_pool_checkout_seconds and db_pool_*: time spent waiting for a pooled
+  connection, and how far each pool has grown into its overflow
+With several worker processes set PROMETHEUS_MULTIPROC_DIR; the histograms
+are then aggregated across workers (pool gauges are per process only).
+"""
+import os
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+METRICS_CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+# Password hashing sits around 0.1-0.5 s, cached JWT checks in the microseconds
+STAGE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency, until the response body is sent",
+    ("method", "route", "status"),
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+STAGE_SECONDS = Histogram(
+    "auth_stage_duration_seconds",
+    "Time spent in one stage of request handling",
+    ("stage",),
+    buckets=STAGE_BUCKETS,
+)
+POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds",
+    "Time to obtain a database connection from the pool (waiting, connecting, pre-ping)",
+    ("pool",),
+    buckets=STAGE_BUCKETS,
+)
+
+
+def stage_timer(stage: str):
+    """Time a block or function: `with stage_timer("jwt_encode"): ...`"""
+    return STAGE_SECONDS.labels(stage).time()
+
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_SECONDS.labels(stage).observe(seconds)
+
+
+# ============================================
+# HTTP requests
+# ============================================
+
+class RequestMetricsMiddleware:
+    """ASGI middleware observing every HTTP request under its route template (not the raw path)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            REQUEST_SECONDS.labels(
+                scope["method"],
+                getattr(route, "path", "unmatched"),  # unknown paths share one series
+                str(status_code),
+            ).observe(time.perf_counter() - start)
+
+
+# ============================================
+# Database
+# ============================================
+
+class _TimedCheckout:
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            POOL_CHECKOUT_SECONDS.labels(self.logging_name or "default").observe(time.perf_counter() - start)
+
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    """QueuePool that records checkout wait (named by create_engine's pool_logging_name)"""
+
+
+class InstrumentedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that records checkout wait"""
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    STAGE_SECONDS.labels("db_query").observe(time.perf_counter() - conn.info["metrics_query_start"].pop())
+
+
+def _handle_error(exception_context):
+    starts = exception_context.connection.info.get("metrics_query_start") if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+
+class _PoolCollector:
+    def __init__(self):
+        self.engines = {}
+
+    def collect(self):
+        gauges = {
+            "size": GaugeMetricFamily("db_pool_size", "Configured pool_size", labels=["pool"]),
+            "checked_out": GaugeMetricFamily("db_pool_checked_out", "Connections in use", labels=["pool"]),
+            "checked_in": GaugeMetricFamily("db_pool_checked_in", "Idle connections in the pool", labels=["pool"]),
+            "overflow": GaugeMetricFamily("db_pool_overflow", "Connections open beyond pool_size (max_overflow)", labels=["pool"]),
+        }
+        for name, engine in self.engines.items():
+            pool = engine.pool  # read each time: dispose() replaces it
+            if not isinstance(pool, QueuePool):
+                continue
+            gauges["size"].add_metric([name], pool.size())
+            gauges["checked_out"].add_metric([name], pool.checkedout())
+            gauges["checked_in"].add_metric([name], pool.checkedin())
+            gauges["overflow"].add_metric([name], max(0, pool.overflow()))
+        yield from gauges.values()
+
+
+_pool_collector = _PoolCollector()
+REGISTRY.register(_pool_collector)
+
+
+def instrument_engine(engine, name: str):
+    """Time every SQL statement on `engine` and report its pool state"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+    _pool_collector.engines[name] = engine
+
+
+def render_metrics() -> bytes:
+    """Prometheus text exposition for this process (or all workers in multiprocess mode)"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
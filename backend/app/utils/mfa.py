@@ -1,48 +1,239 @@
 import pyotp
-import qrcode
-from io import BytesIO
 import base64
-from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+import hashlib
+import hmac
 import os
 from dotenv import load_dotenv
 import json
+import threading
+from typing import Optional, Union
+
+from sqlalchemy import update
+
+from app.models import User
+from app.utils.invalidation import invalidation_bus
+from app.utils.metrics import stage_timer
+from app.utils.totp import decode_secret, totp_verifier
 
 load_dotenv()
 
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this")
 MFA_ISSUER_NAME = os.getenv("MFA_ISSUER_NAME", "VoiceAgent Platform")
 
+# Versioned encryption secrets for key rotation, newest first.
+# Format: "2:new-secret,1:old-secret". Defaults to SECRET_KEY as version 1.
+MFA_ENCRYPTION_KEYS = os.getenv("MFA_ENCRYPTION_KEYS", "")
+MFA_ENCRYPTION_CIPHER = os.getenv("MFA_ENCRYPTION_CIPHER", "aes-gcm").lower()  # aes-gcm or chacha20 (new writes)
+
+# Encrypted values are stored as raw bytes:
+#   format (1 byte) | key version (1 byte) | nonce (12 bytes) | ciphertext | tag (16 bytes)
+# The header is authenticated as associated data. A 32-character TOTP secret
+# takes 62 bytes, against 140 characters as a base64 Fernet token. Values
+# written before this format are Fernet tokens, which always start with "g"
+# (base64 of the 0x80 version byte); they still decrypt, and are rewritten
+# when read (see rewrite_mfa_secret) or by app.utils.mfa_secret_migration.
+ENVELOPE_AES_GCM = 0x01
+ENVELOPE_CHACHA20 = 0x02
+ENVELOPE_CIPHERS = {"aes-gcm": ENVELOPE_AES_GCM, "chacha20": ENVELOPE_CHACHA20}
+ENVELOPE_HEADER_SIZE = 2
+ENVELOPE_NONCE_SIZE = 12
+
+KDF_SALT = b'voice_agent_mfa_salt'  # In production, use a proper salt from env
+KDF_ITERATIONS = 100000
+
+TOTP_STEP_TOPIC = "totp_step"
+
+
+def derive_key(secret: str) -> bytes:
+    """Derive a Fernet key from a secret (expensive - 100k PBKDF2 rounds)"""
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 
-def get_encryption_key() -> bytes:
-    """Derive encryption key from SECRET_KEY"""
     kdf = PBKDF2HMAC(
         algorithm=hashes.SHA256(),
         length=32,
-        salt=b'voice_agent_mfa_salt',  # In production, use a proper salt from env
-        iterations=100000,
+        salt=KDF_SALT,
+        iterations=KDF_ITERATIONS,
     )
-    key = base64.urlsafe_b64encode(kdf.derive(SECRET_KEY.encode()))
-    return key
+    with stage_timer("pbkdf2_derive"):
+        return base64.urlsafe_b64encode(kdf.derive(secret.encode()))
+
+
+def parse_encryption_secrets(spec: str) -> list[tuple[int, str]]:
+    """
+    Parse MFA_ENCRYPTION_KEYS into (version, secret) pairs, newest first
+    Falls back to SECRET_KEY as version 1 when unset
+    """
+    if not spec.strip():
+        return [(1, SECRET_KEY)]
+
+    secrets_by_version = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        version, sep, secret = entry.partition(":")
+        if not sep or not version.strip().isdigit() or not secret:
+            raise ValueError("Invalid MFA_ENCRYPTION_KEYS entry: expected '<version>:<secret>'")
+        secrets_by_version.append((int(version), secret))
+
+    versions = [version for version, _ in secrets_by_version]
+    if len(set(versions)) != len(versions):
+        raise ValueError("Duplicate version in MFA_ENCRYPTION_KEYS")
+
+    return sorted(secrets_by_version, key=lambda item: item[0], reverse=True)
+
+
+class KeyRing:
+    """
+    Process-wide set of derived encryption keys
+    Keys are derived once; the newest version encrypts, every version decrypts.
+    """
+
+    def __init__(self, secrets_by_version: list[tuple[int, str]], cipher: str = MFA_ENCRYPTION_CIPHER):
+        if not secrets_by_version:
+            raise ValueError("KeyRing requires at least one key")
+        if cipher not in ENVELOPE_CIPHERS:
+            raise ValueError("MFA_ENCRYPTION_CIPHER must be 'aes-gcm' or 'chacha20'")
+        if any(not 0 < version < 256 for version, _ in secrets_by_version):
+            raise ValueError("MFA_ENCRYPTION_KEYS versions must be between 1 and 255")
+        from cryptography.fernet import Fernet, MultiFernet
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+
+        self.keys = {version: derive_key(secret) for version, secret in secrets_by_version}
+        self.primary_version = secrets_by_version[0][0]
+        self.cipher = cipher
+        self.primary_format = ENVELOPE_CIPHERS[cipher]
+        self.fernets = {version: Fernet(key) for version, key in self.keys.items()}
+        # MultiFernet tries every key on decrypt (legacy values)
+        self.multi_fernet = MultiFernet([self.fernets[version] for version, _ in secrets_by_version])
+        # AEAD keys are separate 32-byte subkeys of the same PBKDF2 output
+        self.aeads = {}
+        for version, key in self.keys.items():
+            subkey = hmac.new(base64.urlsafe_b64decode(key), b"mfa-envelope", hashlib.sha256).digest()
+            self.aeads[(ENVELOPE_AES_GCM, version)] = AESGCM(subkey)
+            self.aeads[(ENVELOPE_CHACHA20, version)] = ChaCha20Poly1305(subkey)
+
+    @property
+    def primary_key(self) -> bytes:
+        return self.keys[self.primary_version]
+
+    @property
+    def header(self) -> bytes:
+        """Envelope header of values encrypted now (cipher, key version); anything else is outdated"""
+        return bytes((self.primary_format, self.primary_version))
+
+    def encrypt(self, data: bytes) -> bytes:
+        header = self.header
+        nonce = os.urandom(ENVELOPE_NONCE_SIZE)
+        return header + nonce + self.aeads[(self.primary_format, self.primary_version)].encrypt(nonce, data, header)
+
+    def decrypt(self, token: bytes) -> bytes:
+        if is_legacy_token(token):
+            return self.multi_fernet.decrypt(token)
+        header = token[:ENVELOPE_HEADER_SIZE]
+        aead = self.aeads.get(tuple(header))
+        if aead is None:
+            raise ValueError(f"Unknown encryption format or key version: {header.hex()}")
+        nonce = token[ENVELOPE_HEADER_SIZE:ENVELOPE_HEADER_SIZE + ENVELOPE_NONCE_SIZE]
+        return aead.decrypt(nonce, token[ENVELOPE_HEADER_SIZE + ENVELOPE_NONCE_SIZE:], header)
+
+    def is_current(self, token: bytes) -> bool:
+        """True if `token` is already in the current format, cipher and key version"""
+        return token[:ENVELOPE_HEADER_SIZE] == self.header
+
+    def rotate(self, token: bytes) -> bytes:
+        """Re-encrypt a value (either format) under the primary key and cipher"""
+        return self.encrypt(self.decrypt(token))
 
 
-def encrypt_data(data: str) -> str:
-    """Encrypt sensitive data like MFA secrets"""
-    f = Fernet(get_encryption_key())
-    encrypted = f.encrypt(data.encode())
-    return encrypted.decode()
+def is_legacy_token(token: bytes) -> bool:
+    """Fernet tokens (the format before the byte envelope) are base64 text starting with 'g'"""
+    return token[:1] == b"g"
 
 
-def decrypt_data(encrypted_data: str) -> str:
-    """Decrypt sensitive data"""
+def _as_bytes(value: Union[bytes, str]) -> bytes:
+    return value.encode() if isinstance(value, str) else bytes(value)
+
+
+_keyring: Optional[KeyRing] = None
+_keyring_lock = threading.Lock()
+
+
+def get_keyring() -> KeyRing:
+    """Return the process-wide keyring, deriving it on first use"""
+    global _keyring
+    if _keyring is None:
+        with _keyring_lock:
+            if _keyring is None:
+                _keyring = KeyRing(parse_encryption_secrets(MFA_ENCRYPTION_KEYS))
+    return _keyring
+
+
+def init_keyring(secrets_by_version: Optional[list[tuple[int, str]]] = None) -> KeyRing:
+    """Derive (or re-derive) the keyring up front, e.g. at startup or after rotation"""
+    global _keyring
+    if secrets_by_version is None:
+        secrets_by_version = parse_encryption_secrets(MFA_ENCRYPTION_KEYS)
+    keyring = KeyRing(secrets_by_version)
+    with _keyring_lock:
+        _keyring = keyring
+    return keyring
+
+
+def get_encryption_key() -> bytes:
+    """Return the primary derived encryption key (cached)"""
+    return get_keyring().primary_key
+
+
+def encrypt_data(data: str) -> bytes:
+    """Encrypt sensitive data like MFA secrets (byte envelope, stored as-is)"""
+    keyring = get_keyring()
+    with stage_timer("aead_encrypt"):
+        return keyring.encrypt(data.encode())
+
+
+def decrypt_data(encrypted_data: Union[bytes, str]) -> str:
+    """Decrypt sensitive data in either format (byte envelope or legacy Fernet token)"""
     if not encrypted_data:
         return ""
-    f = Fernet(get_encryption_key())
-    decrypted = f.decrypt(encrypted_data.encode())
+    token = _as_bytes(encrypted_data)
+    keyring = get_keyring()
+    with stage_timer("fernet_decrypt" if is_legacy_token(token) else "aead_decrypt"):
+        decrypted = keyring.decrypt(token)
     return decrypted.decode()
 
 
+def needs_reencryption(encrypted_data: Union[bytes, str, None]) -> bool:
+    """True for legacy Fernet values and values under an older key or cipher"""
+    return bool(encrypted_data) and not get_keyring().is_current(_as_bytes(encrypted_data))
+
+
+def reencrypt_data(encrypted_data: Union[bytes, str]) -> bytes:
+    """Re-encrypt data under the current primary key and format (key rotation, migration)"""
+    if not encrypted_data:
+        return encrypted_data
+    return get_keyring().rotate(_as_bytes(encrypted_data))
+
+
+async def rewrite_mfa_secret(db, user_id, stored_secret: Union[bytes, str]) -> bool:
+    """
+    Replace a user's stored secret with its re-encryption, unless the row
+    changed meanwhile (conditional UPDATE). Caller commits.
+    """
+    try:
+        rewritten = reencrypt_data(stored_secret)
+    except Exception:
+        return False
+    result = await db.execute(
+        update(User)
+        .where(User.id == user_id, User.mfa_secret == stored_secret)
+        .values(mfa_secret=rewritten)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
 def generate_mfa_secret() -> str:
     """Generate a random base32 secret for TOTP"""
     return pyotp.random_base32()
@@ -67,6 +258,9 @@ def get_totp_uri(secret: str, email: str) -> str:
 
 def generate_qr_code(uri: str) -> str:
     """Generate QR code image and return as base64 string - optimized for all authenticators"""
+    import qrcode  # pulls in PIL; only workers that enroll MFA pay for it
+    from io import BytesIO
+
     qr = qrcode.QRCode(
         version=None,  # Auto-size based on data
         error_correction=qrcode.constants.ERROR_CORRECT_M,  # Medium error correction
@@ -88,50 +282,52 @@ def generate_qr_code(uri: str) -> str:
 
 
 def verify_totp_code(secret: str, code: str) -> bool:
-    """Verify a TOTP code against the secret"""
+    """Verify a TOTP code against the secret (±1 period of drift, no replay tracking)"""
     try:
-        totp = pyotp.TOTP(secret)
-        # Allow 1 period (30 seconds) time drift in either direction
-        return totp.verify(code, valid_window=1)
+        with stage_timer("totp_verify"):
+            return totp_verifier.match(decode_secret(secret), code) is not None
     except Exception:
         return False
 
 
-def encrypt_backup_codes(codes: list[str]) -> str:
-    """Encrypt backup codes for storage"""
-    codes_json = json.dumps(codes)
-    return encrypt_data(codes_json)
+def _apply_used_totp_step(value: str):
+    user_key, _, step = value.rpartition(":")
+    totp_verifier.record(user_key, int(step))
+
+
+invalidation_bus.subscribe(TOTP_STEP_TOPIC, _apply_used_totp_step)
+
+
+async def verify_user_totp(db, user_id, encrypted_secret: bytes, code: str) -> bool:
+    """
+    Verify a user's TOTP code, rejecting a code that was already accepted
+    The secret is decrypted once and cached; the accepted time step is
+    broadcast to other workers when `db` commits. A secret stored in an old
+    format or under an old key is rewritten in the same transaction.
+    """
+    user_key = str(user_id)
+    try:
+        key = totp_verifier.secret_for(user_key, encrypted_secret, decrypt_data)
+    except Exception:
+        return False
+    with stage_timer("totp_verify"):
+        step = totp_verifier.verify(key, code, user_key)
+    if step is None:
+        return False
+    if needs_reencryption(encrypted_secret):
+        await rewrite_mfa_secret(db, user_id, encrypted_secret)
+    await invalidation_bus.publish(db, TOTP_STEP_TOPIC, f"{user_key}:{step}")
+    return True
 
 
 def decrypt_backup_codes(encrypted_codes: str) -> list[str]:
-    """Decrypt backup codes from storage"""
+    """Decrypt legacy backup codes (users.mfa_backup_codes; see app.utils.backup_codes)"""
     if not encrypted_codes:
         return []
     codes_json = decrypt_data(encrypted_codes)
     return json.loads(codes_json)
 
 
-def verify_backup_code(encrypted_codes: str, code: str) -> tuple[bool, str]:
-    """
-    Verify a backup code and remove it from the list
-    Returns: (is_valid, updated_encrypted_codes)
-    """
-    codes = decrypt_backup_codes(encrypted_codes)
-    
-    # Normalize the code (remove hyphens and convert to uppercase)
-    normalized_code = code.replace("-", "").upper()
-    
-    for stored_code in codes:
-        normalized_stored = stored_code.replace("-", "").upper()
-        if normalized_stored == normalized_code:
-            # Remove the used code
-            codes.remove(stored_code)
-            # Return updated encrypted codes
-            return True, encrypt_backup_codes(codes)
-    
-    return False, encrypted_codes
-
-
 def format_secret_for_manual_entry(secret: str) -> str:
     """Format secret in groups of 4 for easier manual entry"""
     return ' '.join([secret[i:i+4] for i in range(0, len(secret), 4)])
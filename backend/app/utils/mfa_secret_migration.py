@@ -0,0 +1,186 @@
+"""
+Background re-encryption of stored MFA secrets
+Secrets still stored as legacy Fernet tokens, or under an older key or
+cipher, are rewritten in the current envelope (see app.utils.mfa). A secret
+is rewritten when it is next used for a TOTP check; this migrator rewrites
+the remaining ones in batches shortly after startup, so rows of users who
+don't log in don't keep the old format (or an old key) forever.
+Outdated rows are selected in SQL by their envelope header, and on
+PostgreSQL only the process holding an advisory lock runs the pass, so
+other workers and instances starting at the same time skip it.
+`python -m app.utils.mfa_secret_migration` runs the same pass once.
+"""
+import asyncio
+import logging
+import os
+import sys
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import LargeBinary, func, select
+
+from app.database import async_engine, new_session
+from app.models import User
+from app.utils.mfa import (
+    ENVELOPE_HEADER_SIZE, decrypt_data, get_keyring, needs_reencryption, rewrite_mfa_secret
+)
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+MFA_SECRET_MIGRATION_DELAY = float(os.getenv("MFA_SECRET_MIGRATION_DELAY", "30"))  # seconds after startup; <0 disables
+MFA_SECRET_MIGRATION_BATCH = int(os.getenv("MFA_SECRET_MIGRATION_BATCH", "200"))  # users per transaction
+MFA_SECRET_MIGRATION_PAUSE = float(os.getenv("MFA_SECRET_MIGRATION_PAUSE", "0.1"))  # seconds between batches
+
+MFA_SECRET_MIGRATION_LOCK = 0x6D666173  # pg advisory lock key ("mfas")
+
+
+@asynccontextmanager
+async def _migration_lock():
+    """
+    Session-level advisory lock on a dedicated connection, held for the pass
+    Yields False if another process holds it. Other databases have a single
+    process per file in practice, so there it is always granted.
+    """
+    if async_engine.dialect.name != "postgresql":
+        yield True
+        return
+    async with async_engine.connect() as conn:
+        acquired = await conn.scalar(select(func.pg_try_advisory_lock(MFA_SECRET_MIGRATION_LOCK)))
+        await conn.commit()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                # Session-level locks outlive the checkout; release before the pool reuses it
+                await conn.scalar(select(func.pg_advisory_unlock(MFA_SECRET_MIGRATION_LOCK)))
+                await conn.commit()
+
+
+def _decryptable(stored) -> bool:
+    try:
+        decrypt_data(stored)
+    except Exception:
+        return False
+    return True
+
+
+class MFASecretMigrator:
+    """
+    One pass over users whose MFA secret is outdated, re-encrypting them
+    Each batch is its own short transaction and only reads id and
+    mfa_secret of outdated rows. Needs a role that bypasses row-level security on users,
+    since no company context is set.
+    """
+
+    def __init__(self, delay: float, batch_size: int, pause: float):
+        self.delay = delay
+        self.batch_size = max(1, batch_size)
+        self.pause = pause
+        self._task: Optional[asyncio.Task] = None
+
+        self.scanned_total = 0
+        self.rewritten_total = 0
+        self.failed_total = 0
+        self.finished = False
+        self.skipped = False
+
+    async def start(self):
+        if self._task is not None or self.delay < 0:
+            return
+        self._task = asyncio.create_task(self._run(), name="mfa-secret-migration")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        await asyncio.sleep(self.delay)
+        try:
+            async with _migration_lock() as acquired:
+                if not acquired:
+                    self.skipped = True  # another process is migrating
+                    return
+                rewritten = await self.migrate_all()
+        except Exception as e:
+            logger.error("MFA secret migration failed: %s", e)
+            return
+        if rewritten:
+            logger.info("Re-encrypted %s MFA secrets", rewritten)
+
+    async def migrate_all(self) -> int:
+        """Rewrite every outdated secret, one batch per transaction; returns how many"""
+        rewritten = 0
+        after = None
+        # Values not written under the current cipher and key: legacy Fernet
+        # tokens start with "g", envelopes with their (cipher, key version) header
+        header = func.substr(User.mfa_secret, 1, ENVELOPE_HEADER_SIZE, type_=LargeBinary)
+        while True:
+            query = (
+                select(User.id, User.mfa_secret)
+                .where(User.mfa_secret.is_not(None), header != get_keyring().header)
+                .order_by(User.id)
+                .limit(self.batch_size)
+            )
+            if after is not None:
+                query = query.where(User.id > after)
+            db = new_session()
+            try:
+                rows = (await db.execute(query)).all()
+                batch = 0
+                for user_id, stored in rows:
+                    if not needs_reencryption(stored):
+                        continue
+                    # Conditional UPDATE: a concurrent change (re-enrollment,
+                    # a lazy rewrite on login) wins over this pass
+                    if await rewrite_mfa_secret(db, user_id, stored):
+                        batch += 1
+                    elif not _decryptable(stored):  # unknown key version or corrupt value
+                        self.failed_total += 1
+                        logger.error("Could not re-encrypt the MFA secret of user %s", user_id)
+                await db.commit()
+            finally:
+                await db.close()
+            self.scanned_total += len(rows)
+            self.rewritten_total += batch
+            rewritten += batch
+            if len(rows) < self.batch_size:
+                break
+            after = rows[-1].id
+            await asyncio.sleep(self.pause)
+        self.finished = True
+        return rewritten
+
+    def metrics(self) -> dict:
+        return {
+            "scanned_total": self.scanned_total,
+            "rewritten_total": self.rewritten_total,
+            "failed_total": self.failed_total,
+            "finished": self.finished,
+            "skipped": self.skipped,
+        }
+
+
+mfa_secret_migrator = MFASecretMigrator(
+    MFA_SECRET_MIGRATION_DELAY, MFA_SECRET_MIGRATION_BATCH, MFA_SECRET_MIGRATION_PAUSE
+)
+
+
+if __name__ == "__main__":
+    batch = int(sys.argv[1]) if len(sys.argv) > 1 else MFA_SECRET_MIGRATION_BATCH
+    migrator = MFASecretMigrator(0, batch, 0)
+
+    async def main() -> int:
+        async with _migration_lock() as acquired:
+            if not acquired:
+                print("⚠️  Another process is migrating MFA secrets; nothing done")
+                return 1
+            count = await migrator.migrate_all()
+        print(f"✅ Re-encrypted {count} MFA secrets ({migrator.failed_total} failed)")
+        return 0
+
+    sys.exit(asyncio.run(main()))
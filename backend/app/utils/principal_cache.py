@@ -0,0 +1,138 @@
+"""
+Authenticated-principal cache
+Keeps the user fields that authorization and profile responses need, so
+authenticated requests don't have to load the users row every time.
+"""
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+
+from dotenv import load_dotenv
+
+from app.models import UserRole
+from app.utils.invalidation import invalidation_bus
+
+load_dotenv()
+
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "30"))  # seconds; 0 disables the cache
+
+PRINCIPAL_TOPIC = "principal"
+
+
+class Principal:
+    """Read-only snapshot of an authenticated user"""
+
+    __slots__ = (
+        "id", "email", "full_name", "role", "company_id", "company_name",
+        "is_active", "mfa_enabled", "created_at", "last_login", "token_version",
+    )
+
+    def __init__(
+        self,
+        id: UUID,
+        email: str,
+        full_name: str,
+        role: UserRole,
+        company_id: UUID,
+        company_name: str,
+        is_active: bool,
+        mfa_enabled: bool,
+        created_at: datetime,
+        last_login: Optional[datetime],
+        token_version: int = 0,
+    ):
+        self.id = id
+        self.email = email
+        self.full_name = full_name
+        self.role = role
+        self.company_id = company_id
+        self.company_name = company_name
+        self.is_active = is_active
+        self.mfa_enabled = mfa_enabled
+        self.created_at = created_at
+        self.last_login = last_login
+        self.token_version = token_version
+
+    @classmethod
+    def from_user(cls, user, company_name: Optional[str]) -> "Principal":
+        return cls(
+            id=user.id,
+            email=user.email,
+            full_name=user.full_name,
+            role=user.role,
+            company_id=user.company_id,
+            company_name=company_name or "",
+            is_active=user.is_active,
+            mfa_enabled=user.mfa_enabled,
+            created_at=user.created_at,
+            last_login=user.last_login,
+            token_version=user.token_version or 0,
+        )
+
+
+class PrincipalCache:
+    """
+    TTL + LRU cache of principals keyed by user id
+    `generation` increases on every invalidation; a loader that started before
+    an invalidation must not store its (possibly stale) result.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, Principal]] = OrderedDict()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_size > 0
+
+    def get(self, user_id) -> Optional[Principal]:
+        if not self.enabled:
+            return None
+        key = str(user_id)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, principal: Principal, generation: int):
+        if not self.enabled or generation != self.generation:
+            return
+        key = str(principal.id)
+        self._entries[key] = (time.monotonic() + self.ttl, principal)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        self.generation += 1
+        self._entries.pop(str(user_id), None)
+
+    def clear(self, _key: str = ""):
+        self.generation += 1
+        self._entries.clear()
+
+    def metrics(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+invalidation_bus.subscribe(PRINCIPAL_TOPIC, principal_cache.invalidate)
+invalidation_bus.subscribe(invalidation_bus.RESET, principal_cache.clear)
+
+
+async def invalidate_principal(db, user_id):
+    """Drop a cached principal on every worker, this one included, once `db` commits"""
+    await invalidation_bus.publish(db, PRINCIPAL_TOPIC, str(user_id))
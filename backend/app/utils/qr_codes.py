@@ -0,0 +1,176 @@
+"""
+QR codes for MFA enrolment
+Rendering runs on a small worker pool (threads, or processes when the
+GIL-bound matrix building matters) so it never blocks the event loop.
+Besides the PNG data URI, a code can be returned as an SVG data URI (one
+path, no imaging library involved) or as the raw module matrix for the
+client to draw. Renders are cached per pending secret: calling /mfa/setup
+again within MFA_SETUP_CACHE_TTL (retry, page reload) returns the same
+secret without re-encrypting, re-rendering or writing to the database.
+"""
+import asyncio
+import base64
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Union
+
+from dotenv import load_dotenv
+
+from app.utils.mfa import generate_qr_code
+
+load_dotenv()
+
+QR_RENDER_EXECUTOR = os.getenv("QR_RENDER_EXECUTOR", "thread").lower()  # thread or process
+QR_RENDER_WORKERS = int(os.getenv("QR_RENDER_WORKERS", "2"))
+MFA_SETUP_CACHE_SIZE = int(os.getenv("MFA_SETUP_CACHE_SIZE", "2000"))  # pending enrolments kept
+MFA_SETUP_CACHE_TTL = float(os.getenv("MFA_SETUP_CACHE_TTL", "600"))  # seconds
+
+SVG_BOX_SIZE = 8  # pixels per module, same as the PNG
+
+
+def qr_matrix(uri: str) -> list[str]:
+    """Module rows ('1' = dark), including the quiet-zone border"""
+    import qrcode
+
+    qr = qrcode.QRCode(
+        version=None,
+        error_correction=qrcode.constants.ERROR_CORRECT_M,
+        border=2,
+    )
+    qr.add_data(uri)
+    qr.make(fit=True)
+    return ["".join("1" if dark else "0" for dark in row) for row in qr.get_matrix()]
+
+
+def matrix_to_svg(rows: list[str], box_size: int = SVG_BOX_SIZE) -> str:
+    """SVG with a single stroked path; each horizontal run of dark modules is one segment"""
+    size = len(rows)
+    path = []
+    for y, row in enumerate(rows):
+        x = row.find("1")
+        pen = None  # where the previous segment on this row ended
+        while x != -1:
+            end = row.find("0", x)
+            if end == -1:
+                end = size
+            path.append(f"M{x} {y}.5h{end - x}" if pen is None else f"m{x - pen} 0h{end - x}")
+            pen = end
+            x = row.find("1", end)
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" '
+        f'width="{size * box_size}" height="{size * box_size}" shape-rendering="crispEdges">'
+        f'<rect width="{size}" height="{size}" fill="#fff"/>'
+        f'<path d="{"".join(path)}" stroke="#000"/></svg>'
+    )
+
+
+def render_qr(uri: str, fmt: str) -> Union[str, list[str]]:
+    """Data URI for 'png'/'svg', row strings for 'matrix' (CPU-bound; call off the event loop)"""
+    if fmt == "png":
+        return generate_qr_code(uri)
+    rows = qr_matrix(uri)
+    if fmt == "matrix":
+        return rows
+    svg = matrix_to_svg(rows).encode()
+    return f"data:image/svg+xml;base64,{base64.b64encode(svg).decode()}"
+
+
+class PendingSetup:
+    __slots__ = ("encrypted_secret", "secret", "uri", "expires_at", "renders")
+
+    def __init__(self, encrypted_secret: bytes, secret: str, uri: str, expires_at: float):
+        self.encrypted_secret = encrypted_secret  # users.mfa_secret this entry belongs to
+        self.secret = secret
+        self.uri = uri
+        self.expires_at = expires_at
+        self.renders: dict[str, Union[str, list[str]]] = {}
+
+
+class MFASetupCache:
+    """
+    Pending MFA enrolments per user, with their rendered QR codes
+    An entry is only used while the user's stored secret is still the one it
+    was created for, so enabling MFA, disabling it or starting a setup on
+    another worker all make it miss.
+    """
+
+    def __init__(self, max_size: int, ttl: float, workers: int, executor_kind: str = "thread"):
+        if executor_kind not in ("thread", "process"):
+            raise ValueError("QR_RENDER_EXECUTOR must be 'thread' or 'process'")
+        self.max_size = max_size
+        self.ttl = ttl
+        self.workers = max(1, workers)
+        self.executor_kind = executor_kind
+        self._entries: OrderedDict[str, PendingSetup] = OrderedDict()
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.renders_total = 0
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.executor_kind == "process":
+                        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    else:
+                        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="qr-render")
+        return self._executor
+
+    def get(self, user_id, stored_secret: Optional[bytes]) -> Optional[PendingSetup]:
+        """The user's pending enrolment, if it is still current"""
+        key = str(user_id)
+        entry = self._entries.get(key)
+        if entry is None or not stored_secret or entry.encrypted_secret != stored_secret or entry.expires_at <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, user_id, encrypted_secret: bytes, secret: str, uri: str) -> PendingSetup:
+        key = str(user_id)
+        entry = PendingSetup(encrypted_secret, secret, uri, time.monotonic() + self.ttl)
+        self._entries.pop(key, None)
+        self._entries[key] = entry
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return entry
+
+    def forget(self, user_id):
+        self._entries.pop(str(user_id), None)
+
+    async def render(self, entry: PendingSetup, fmt: str) -> Union[str, list[str]]:
+        """Entry's QR code in `fmt`, rendered on the worker pool the first time"""
+        rendered = entry.renders.get(fmt)
+        if rendered is None:
+            loop = asyncio.get_running_loop()
+            rendered = await loop.run_in_executor(self.executor, render_qr, entry.uri, fmt)
+            entry.renders[fmt] = rendered
+            self.renders_total += 1
+        return rendered
+
+    def metrics(self) -> dict:
+        return {
+            "executor": self.executor_kind,
+            "pending_setups": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "renders_total": self.renders_total,
+        }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+mfa_setup_cache = MFASetupCache(MFA_SETUP_CACHE_SIZE, MFA_SETUP_CACHE_TTL, QR_RENDER_WORKERS, QR_RENDER_EXECUTOR)
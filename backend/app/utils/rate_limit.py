@@ -0,0 +1,321 @@
+"""
+Login rate limiting and account lockout
+Sliding-window counters keyed by client IP and email are checked before any
+password hashing, MFA decryption or database query. Repeated failures for
+one email lock it out for a while, and failures across a company (the
+tenant the account belongs to, known once the user is loaded) throttle
+that company before any hashing or decryption. On the MFA endpoints the
+email limit also counts failures only, so a successful verify doesn't use
+up the budget of a following MFA disable. Counters live in process memory
+by default; with RATE_LIMIT_BACKEND=redis they are shared by every worker
+and instance.
+"""
+import logging
+import math
+import os
+import time
+from collections import defaultdict
+from typing import Optional
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, Request, status
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()  # memory or redis
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))  # memory backend bound
+
+# "<requests>/<seconds>"; an empty value disables that rule
+LOGIN_RATE_LIMIT_IP = os.getenv("LOGIN_RATE_LIMIT_IP", "20/60")
+LOGIN_RATE_LIMIT_EMAIL = os.getenv("LOGIN_RATE_LIMIT_EMAIL", "5/60")
+LOGIN_RATE_LIMIT_COMPANY = os.getenv("LOGIN_RATE_LIMIT_COMPANY", "100/60")  # failed attempts per company
+MFA_RATE_LIMIT_IP = os.getenv("MFA_RATE_LIMIT_IP", "20/60")
+MFA_RATE_LIMIT_EMAIL = os.getenv("MFA_RATE_LIMIT_EMAIL", "3/60")  # failed attempts per email
+MFA_RATE_LIMIT_COMPANY = os.getenv("MFA_RATE_LIMIT_COMPANY", "100/60")  # failed attempts per company
+# "<failures>/<seconds>": this many failures within the window locks the email
+LOGIN_LOCKOUT = os.getenv("LOGIN_LOCKOUT", "10/900")
+MFA_LOCKOUT = os.getenv("MFA_LOCKOUT", "5/900")
+
+
+def parse_rate(spec: str) -> Optional[tuple[int, float]]:
+    """'5/60' -> (5, 60.0); '' -> None"""
+    if not spec:
+        return None
+    count, _, seconds = spec.partition("/")
+    limit, window = int(count), float(seconds)
+    if limit <= 0 or window <= 0:
+        raise ValueError(f"Invalid rate limit '{spec}': expected '<requests>/<seconds>'")
+    return limit, window
+
+
+class MemoryBackend:
+    """
+    Per-process sliding-window counters
+    Each key keeps the current and previous fixed-window counts; the rate is
+    estimated as previous * (unelapsed fraction) + current.
+    """
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._windows: dict[str, tuple[int, int, int]] = {}  # key -> (window index, current, previous)
+
+    def _counts(self, key: str, window: float, now: float) -> tuple[int, int, int]:
+        index = int(now // window)
+        entry = self._windows.get(key)
+        if entry is None or entry[0] < index - 1:
+            return index, 0, 0
+        if entry[0] == index - 1:
+            return index, 0, entry[1]
+        return entry
+
+    async def increment(self, key: str, window: float, now: float) -> tuple[int, int]:
+        index, current, previous = self._counts(key, window, now)
+        self._windows.pop(key, None)  # re-insert at the end: dict order is recency
+        self._windows[key] = (index, current + 1, previous)
+        if len(self._windows) > self.max_keys:
+            self._evict()
+        return current + 1, previous
+
+    async def peek(self, key: str, window: float, now: float) -> tuple[int, int]:
+        _, current, previous = self._counts(key, window, now)
+        return current, previous
+
+    async def reset(self, key: str, window: float, now: float):
+        self._windows.pop(key, None)
+
+    def _evict(self):
+        # Least recently touched keys first
+        for key in list(self._windows)[:len(self._windows) - self.max_keys + self.max_keys // 10]:
+            del self._windows[key]
+
+    def size(self) -> int:
+        return len(self._windows)
+
+
+class RedisBackend:
+    """Sliding-window counters shared through Redis (INCR on per-window keys)"""
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url)
+
+    @staticmethod
+    def _keys(key: str, window: float, now: float) -> tuple[str, str]:
+        index = int(now // window)
+        return f"{key}:{index}", f"{key}:{index - 1}"
+
+    async def increment(self, key: str, window: float, now: float) -> tuple[int, int]:
+        current_key, previous_key = self._keys(key, window, now)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.incr(current_key)
+            pipe.expire(current_key, math.ceil(window * 2))
+            pipe.get(previous_key)
+            current, _, previous = await pipe.execute()
+        return int(current), int(previous or 0)
+
+    async def peek(self, key: str, window: float, now: float) -> tuple[int, int]:
+        current, previous = await self.redis.mget(self._keys(key, window, now))
+        return int(current or 0), int(previous or 0)
+
+    async def reset(self, key: str, window: float, now: float):
+        await self.redis.delete(*self._keys(key, window, now))
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+def _estimate(current: int, previous: int, window: float, now: float) -> float:
+    elapsed = (now % window) / window
+    return previous * (1 - elapsed) + current
+
+
+def _retry_after(window: float, now: float) -> int:
+    return max(1, math.ceil(window - now % window))
+
+
+class RateLimiter:
+    """
+    Limits for one endpoint
+    `rules` maps a scope ("ip", "email", "company") to (limit, window).
+    "ip" counts every attempt; "email" does too unless `email_failures_only`
+    is set, in which case only failures (record_failure) count and
+    successful attempts never use it up.
+    "company" is always failure-only and keyed by company id, so unknown or
+    made-up emails on a shared domain can't reach it; check_company()
+    enforces it once the account is known.
+    `lockout` is (failures, window) counted per email via record_failure().
+    """
+
+    def __init__(
+        self,
+        name: str,
+        backend,
+        rules: dict[str, Optional[tuple[int, float]]],
+        lockout: Optional[tuple[int, float]] = None,
+        email_failures_only: bool = False,
+    ):
+        self.name = name
+        self.backend = backend
+        self.rules = {scope: rule for scope, rule in rules.items() if rule is not None}
+        self.company_rule = self.rules.pop("company", None)
+        self.email_failure_rule = self.rules.pop("email", None) if email_failures_only else None
+        self.lockout = lockout
+        self.allowed_total = 0
+        self.rejected_total: dict[str, int] = defaultdict(int)
+        self.lockouts_total = 0
+        self.backend_errors_total = 0
+
+    @staticmethod
+    def _subjects(request: Request, email: Optional[str]) -> dict[str, str]:
+        subjects = {"ip": request.client.host if request.client else "unknown"}
+        if email:
+            email = email.strip().lower()
+            subjects["email"] = email
+        return subjects
+
+    def _reject(self, scope: str, retry_after: int, detail: str):
+        self.rejected_total[scope] += 1
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=detail,
+            headers={"Retry-After": str(retry_after)}
+        )
+
+    async def check(self, request: Request, email: Optional[str] = None):
+        """Count this attempt; raise 429 if any limit is exceeded or the email is locked out"""
+        if not RATE_LIMIT_ENABLED:
+            return
+        now = time.time()
+        subjects = self._subjects(request, email)
+        try:
+            if self.lockout and "email" in subjects:
+                failures, window = self.lockout
+                current, previous = await self.backend.peek(f"lock:{self.name}:{subjects['email']}", window, now)
+                if _estimate(current, previous, window, now) >= failures:
+                    self._reject("lockout", _retry_after(window, now), "Too many failed attempts. Try again later.")
+
+            if self.email_failure_rule and "email" in subjects:
+                limit, window = self.email_failure_rule
+                current, previous = await self.backend.peek(f"fail:{self.name}:email:{subjects['email']}", window, now)
+                if _estimate(current, previous, window, now) >= limit:
+                    self._reject("email", _retry_after(window, now), "Too many requests. Try again later.")
+
+            for scope, (limit, window) in self.rules.items():
+                if scope not in subjects:
+                    continue
+                current, previous = await self.backend.increment(f"rl:{self.name}:{scope}:{subjects[scope]}", window, now)
+                if _estimate(current, previous, window, now) > limit:
+                    self._reject(scope, _retry_after(window, now), "Too many requests. Try again later.")
+        except HTTPException:
+            raise
+        except Exception as e:
+            # A shared backend outage must not take logins down with it
+            self.backend_errors_total += 1
+            logger.warning("Rate limit backend error (%s): %s", self.name, e)
+            return
+        self.allowed_total += 1
+
+    async def check_company(self, company_id):
+        """Raise 429 if the account's company has too many recent failures (counts nothing)"""
+        if not RATE_LIMIT_ENABLED or not self.company_rule or company_id is None:
+            return
+        limit, window = self.company_rule
+        now = time.time()
+        try:
+            current, previous = await self.backend.peek(f"fail:{self.name}:company:{company_id}", window, now)
+        except Exception as e:
+            self.backend_errors_total += 1
+            logger.warning("Rate limit backend error (%s): %s", self.name, e)
+            return
+        if _estimate(current, previous, window, now) >= limit:
+            self._reject("company", _retry_after(window, now), "Too many requests. Try again later.")
+
+    async def record_failure(self, email: Optional[str], company_id=None):
+        """Count a failed attempt towards the email's lockout and the failure-only limits (email, company)"""
+        if not RATE_LIMIT_ENABLED:
+            return
+        now = time.time()
+        try:
+            if self.company_rule and company_id is not None:
+                await self.backend.increment(f"fail:{self.name}:company:{company_id}", self.company_rule[1], now)
+            if self.email_failure_rule and email:
+                await self.backend.increment(f"fail:{self.name}:email:{email.strip().lower()}", self.email_failure_rule[1], now)
+            if not self.lockout or not email:
+                return
+            failures, window = self.lockout
+            current, previous = await self.backend.increment(f"lock:{self.name}:{email.strip().lower()}", window, now)
+        except Exception as e:
+            self.backend_errors_total += 1
+            logger.warning("Rate limit backend error (%s): %s", self.name, e)
+            return
+        if _estimate(current, previous, window, now) >= failures and _estimate(current - 1, previous, window, now) < failures:
+            self.lockouts_total += 1
+            logger.warning("%s: locked out %s after repeated failures", self.name, email)
+
+    async def record_success(self, email: Optional[str]):
+        """Clear the email's failure count"""
+        if not RATE_LIMIT_ENABLED or not self.lockout or not email:
+            return
+        try:
+            await self.backend.reset(f"lock:{self.name}:{email.strip().lower()}", self.lockout[1], time.time())
+        except Exception as e:
+            self.backend_errors_total += 1
+            logger.warning("Rate limit backend error (%s): %s", self.name, e)
+
+    def metrics(self) -> dict:
+        return {
+            "allowed_total": self.allowed_total,
+            "rejected_total": dict(self.rejected_total),
+            "lockouts_total": self.lockouts_total,
+            "backend_errors_total": self.backend_errors_total,
+        }
+
+
+def create_backend(kind: str):
+    if kind == "memory":
+        return MemoryBackend(RATE_LIMIT_MAX_KEYS)
+    if kind == "redis":
+        return RedisBackend(RATE_LIMIT_REDIS_URL)
+    raise ValueError("RATE_LIMIT_BACKEND must be 'memory' or 'redis'")
+
+
+rate_limit_backend = create_backend(RATE_LIMIT_BACKEND)
+
+login_limiter = RateLimiter(
+    "login",
+    rate_limit_backend,
+    {
+        "ip": parse_rate(LOGIN_RATE_LIMIT_IP),
+        "email": parse_rate(LOGIN_RATE_LIMIT_EMAIL),
+        "company": parse_rate(LOGIN_RATE_LIMIT_COMPANY),
+    },
+    lockout=parse_rate(LOGIN_LOCKOUT),
+)
+
+# verify-mfa and mfa/disable share MFA-code failures, so neither can be used
+# to brute-force codes the other one throttles; successes don't count
+mfa_limiter = RateLimiter(
+    "mfa",
+    rate_limit_backend,
+    {
+        "ip": parse_rate(MFA_RATE_LIMIT_IP),
+        "email": parse_rate(MFA_RATE_LIMIT_EMAIL),
+        "company": parse_rate(MFA_RATE_LIMIT_COMPANY),
+    },
+    lockout=parse_rate(MFA_LOCKOUT),
+    email_failures_only=True,
+)
+
+
+def rate_limit_metrics() -> dict:
+    return {
+        "backend": RATE_LIMIT_BACKEND,
+        "tracked_keys": rate_limit_backend.size(),
+        "login": login_limiter.metrics(),
+        "mfa": mfa_limiter.metrics(),
+    }
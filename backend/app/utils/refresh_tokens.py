@@ -0,0 +1,272 @@
+"""
+Refresh-token storage
+Only a SHA-256 digest of each refresh token is stored (32 bytes, looked up
+through a partial unique index on non-revoked rows). A background sweeper
+deletes expired rows in small batches so the table and its indexes don't
+grow without bound.
+
+Refresh tokens rotate on every use. All tokens descending from one login
+share a family; presenting an already-rotated token revokes the family, and
+revoked families are remembered in a per-worker bloom filter so replays are
+rejected without a database round trip.
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from uuid import UUID
+
+from dotenv import load_dotenv
+from sqlalchemy import case, delete, func, select, update
+
+from app.auth import REFRESH_TOKEN_EXPIRE_DAYS
+from app.database import new_session
+from app.models import RefreshToken
+from app.utils.invalidation import invalidation_bus
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+REFRESH_TOKEN_SWEEP_INTERVAL = float(os.getenv("REFRESH_TOKEN_SWEEP_INTERVAL", "300"))  # seconds; 0 disables
+REFRESH_TOKEN_SWEEP_BATCH = int(os.getenv("REFRESH_TOKEN_SWEEP_BATCH", "1000"))  # rows per DELETE
+# A rotated token presented again within this many seconds of its rotation is
+# treated as a concurrent refresh (rejected) rather than theft (family revoked)
+REFRESH_REUSE_GRACE_SECONDS = float(os.getenv("REFRESH_REUSE_GRACE_SECONDS", "10"))
+REVOKED_FAMILY_FILTER_CAPACITY = int(os.getenv("REVOKED_FAMILY_FILTER_CAPACITY", "100000"))
+REVOKED_FAMILY_FILTER_ERROR_RATE = float(os.getenv("REVOKED_FAMILY_FILTER_ERROR_RATE", "0.000001"))
+# A revoked family's tokens have all expired one refresh-token lifetime later
+REVOKED_FAMILY_FILTER_TTL = REFRESH_TOKEN_EXPIRE_DAYS * 86400
+
+FAMILY_TOPIC = "refresh_family"
+
+
+def hash_refresh_token(token: str) -> bytes:
+    """Fixed-width lookup key for a refresh token (same as sha256() in Postgres)"""
+    return hashlib.sha256(token.encode()).digest()
+
+
+class RefreshTokenSweeper:
+    """
+    Periodically deletes expired refresh tokens
+    Each batch is its own short transaction; rows locked by another worker's
+    sweep are skipped rather than waited on.
+    """
+
+    def __init__(self, interval: float, batch_size: int):
+        self.interval = interval
+        self.batch_size = max(1, batch_size)
+        self._task: Optional[asyncio.Task] = None
+
+        self.deleted_total = 0
+        self.failed_sweeps_total = 0
+        self.last_sweep_at: Optional[datetime] = None
+
+    async def start(self):
+        if self._task is not None or self.interval <= 0:
+            return
+        self._task = asyncio.create_task(self._run(), name="refresh-token-sweeper")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                self.failed_sweeps_total += 1
+                logger.error("Refresh token sweep failed: %s", e)
+
+    async def sweep(self) -> int:
+        """Delete every row that expired before now, one batch per transaction"""
+        now = datetime.now(timezone.utc)
+        deleted = 0
+        while True:
+            batch = await self._delete_batch(now)
+            deleted += batch
+            self.deleted_total += batch
+            if batch < self.batch_size:
+                break
+            await asyncio.sleep(0)  # let request handlers run between batches
+        self.last_sweep_at = now
+        return deleted
+
+    async def _delete_batch(self, now: datetime) -> int:
+        expired_ids = (
+            select(RefreshToken.id)
+            .where(RefreshToken.expires_at < now)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        db = new_session()
+        try:
+            result = await db.execute(
+                delete(RefreshToken)
+                .where(RefreshToken.id.in_(expired_ids))
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            return result.rowcount
+        finally:
+            await db.close()
+
+    def metrics(self) -> dict:
+        return {
+            "deleted_total": self.deleted_total,
+            "failed_sweeps_total": self.failed_sweeps_total,
+            "last_sweep_at": self.last_sweep_at.isoformat() if self.last_sweep_at else None,
+        }
+
+
+refresh_token_sweeper = RefreshTokenSweeper(REFRESH_TOKEN_SWEEP_INTERVAL, REFRESH_TOKEN_SWEEP_BATCH)
+
+
+class BloomFilter:
+    """Fixed-size bloom filter over strings (double hashing on one BLAKE2b digest)"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevokedFamilyFilter:
+    """
+    Revoked refresh-token families, remembered for one token lifetime
+    Two generations of bloom filters: new entries go into the current one,
+    which becomes the previous one once it is `ttl` old or full, so every
+    entry is kept for at least `ttl` seconds. A hit can be a false positive
+    (at `error_rate`); the affected session simply has to log in again.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, ttl: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.ttl = ttl
+        self.current = BloomFilter(capacity, error_rate)
+        self.previous: Optional[BloomFilter] = None
+        self.started_at = time.monotonic()
+        self.rejected_total = 0
+
+    def _maybe_rotate(self):
+        if self.current.count >= self.capacity or time.monotonic() - self.started_at >= self.ttl:
+            self.previous = self.current
+            self.current = BloomFilter(self.capacity, self.error_rate)
+            self.started_at = time.monotonic()
+
+    def add(self, family_id: str):
+        self._maybe_rotate()
+        self.current.add(str(family_id))
+
+    def might_contain(self, family_id: str) -> bool:
+        key = str(family_id)
+        hit = key in self.current or (self.previous is not None and key in self.previous)
+        self.rejected_total += hit
+        return hit
+
+    def metrics(self) -> dict:
+        return {
+            "entries": self.current.count + (self.previous.count if self.previous else 0),
+            "rejected_total": self.rejected_total,
+        }
+
+
+revoked_families = RevokedFamilyFilter(
+    REVOKED_FAMILY_FILTER_CAPACITY, REVOKED_FAMILY_FILTER_ERROR_RATE, REVOKED_FAMILY_FILTER_TTL
+)
+invalidation_bus.subscribe(FAMILY_TOPIC, revoked_families.add)
+
+
+async def load_revoked_families():
+    """Seed the filter with families whose unexpired tokens are all revoked"""
+    db = new_session()
+    try:
+        rows = await db.scalars(
+            select(RefreshToken.family_id)
+            .where(RefreshToken.expires_at > datetime.now(timezone.utc))
+            .group_by(RefreshToken.family_id)
+            .having(func.max(case((RefreshToken.revoked == False, 1), else_=0)) == 0)
+        )
+        for family_id in rows:
+            revoked_families.add(str(family_id))
+    finally:
+        await db.close()
+
+
+async def rotate_refresh_token(db, token: str) -> Optional[tuple[UUID, UUID]]:
+    """
+    Mark a live refresh token as used; returns (user_id, family_id), or None
+    if it was already rotated, revoked or expired. The conditional UPDATE
+    locks the row, so of several concurrent callers exactly one succeeds.
+    """
+    result = await db.execute(
+        update(RefreshToken)
+        .where(
+            RefreshToken.token_hash == hash_refresh_token(token),
+            RefreshToken.revoked == False,
+            RefreshToken.expires_at > datetime.now(timezone.utc)
+        )
+        .values(revoked=True)
+        .returning(RefreshToken.user_id, RefreshToken.family_id)
+        .execution_options(synchronize_session=False)
+    )
+    row = result.first()
+    return (row[0], row[1]) if row else None
+
+
+async def revoke_family(db, family_id):
+    """Revoke every live token of a family (one indexed UPDATE); effective on every worker after commit"""
+    await db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.family_id == family_id, RefreshToken.revoked == False)
+        .values(revoked=True)
+        .execution_options(synchronize_session=False)
+    )
+    await invalidation_bus.publish(db, FAMILY_TOPIC, str(family_id))
+
+
+async def handle_refresh_reuse(db, family_id) -> bool:
+    """
+    A rotated token was presented again. If its family rotated within the
+    grace window this is a concurrent refresh and nothing is revoked;
+    otherwise the token was replayed and the whole family is revoked.
+    Returns True if the family was revoked (caller commits).
+    """
+    latest = await db.scalar(
+        select(RefreshToken.created_at)
+        .where(RefreshToken.family_id == family_id, RefreshToken.revoked == False)
+    )
+    if latest is None:
+        return False  # family already revoked (logout or earlier reuse)
+    if latest.tzinfo is None:
+        latest = latest.replace(tzinfo=timezone.utc)
+    if datetime.now(timezone.utc) - latest < timedelta(seconds=REFRESH_REUSE_GRACE_SECONDS):
+        return False
+    await revoke_family(db, family_id)
+    return True
@@ -0,0 +1,302 @@
+"""
+JWT signing keys
+Keys are loaded once at startup. Asymmetric keys (EdDSA / RS256) come from
+PEM files, carry a `kid`, and are published at /.well-known/jwks.json so other
+services can verify access tokens without calling this API. A key can be
+scheduled to start signing at a future time (it is published before then so
+verifiers already know it), and a replaced key keeps verifying and stays in
+the JWKS for an overlap window so tokens it signed remain valid.
+
+Generate a key:
+    python -m app.utils.signing_keys EdDSA keys/2026-11.pem
+"""
+import base64
+import calendar
+import hashlib
+import hmac
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+# cryptography's asymmetric modules are imported where needed: a deployment
+# signing with the shared secret never loads them
+
+HMAC_DIGESTS = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+ASYMMETRIC_ALGORITHMS = ("EdDSA", "RS256")
+MIN_RSA_KEY_SIZE = 2048
+
+
+def b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def _int_to_b64(value: int) -> str:
+    return b64encode(value.to_bytes((value.bit_length() + 7) // 8, "big"))
+
+
+def _parse_activation(value: str) -> float:
+    """Unix timestamp or ISO date (YYYY-MM-DD, UTC)"""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp()
+
+
+class SigningKey:
+    """One signing key; `kid` is None only for the shared-secret HMAC key"""
+
+    def __init__(
+        self,
+        kid: Optional[str],
+        algorithm: str,
+        private_key=None,
+        public_key=None,
+        secret: Optional[bytes] = None,
+        activates_at: float = 0.0
+    ):
+        self.kid = kid
+        self.algorithm = algorithm
+        self.private_key = private_key
+        self.public_key = public_key
+        self.secret = secret
+        self.activates_at = activates_at
+        self.retires_at: Optional[float] = None  # set by the keyring
+        self._digest = HMAC_DIGESTS.get(algorithm)
+        self.jwk = self._public_jwk()
+
+    @classmethod
+    def from_secret(cls, secret: str, algorithm: str) -> "SigningKey":
+        if algorithm not in HMAC_DIGESTS:
+            raise ValueError(f"Unsupported HMAC algorithm: {algorithm}")
+        return cls(None, algorithm, secret=secret.encode())
+
+    @classmethod
+    def from_pem(cls, kid: str, pem: bytes, activates_at: float = 0.0) -> "SigningKey":
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+
+        private_key = serialization.load_pem_private_key(pem, password=None)
+        if isinstance(private_key, ed25519.Ed25519PrivateKey):
+            algorithm = "EdDSA"
+        elif isinstance(private_key, rsa.RSAPrivateKey):
+            if private_key.key_size < MIN_RSA_KEY_SIZE:
+                raise ValueError(f"RSA signing key {kid} must be at least {MIN_RSA_KEY_SIZE} bits")
+            algorithm = "RS256"
+        else:
+            raise ValueError(f"Signing key {kid} must be an Ed25519 or RSA private key")
+        return cls(kid, algorithm, private_key, private_key.public_key(), activates_at=activates_at)
+
+    @property
+    def is_hmac(self) -> bool:
+        return self.secret is not None
+
+    def sign(self, signing_input: bytes) -> bytes:
+        if self.is_hmac:
+            return hmac.new(self.secret, signing_input, self._digest).digest()
+        if self.algorithm == "EdDSA":
+            return self.private_key.sign(signing_input)
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import padding
+
+        return self.private_key.sign(signing_input, padding.PKCS1v15(), hashes.SHA256())
+
+    def verify(self, signing_input: bytes, signature: bytes) -> bool:
+        if self.is_hmac:
+            return hmac.compare_digest(self.sign(signing_input), signature)
+        from cryptography.exceptions import InvalidSignature
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import padding
+
+        try:
+            if self.algorithm == "EdDSA":
+                self.public_key.verify(signature, signing_input)
+            else:
+                self.public_key.verify(signature, signing_input, padding.PKCS1v15(), hashes.SHA256())
+        except InvalidSignature:
+            return False
+        return True
+
+    def jose_key(self):
+        """Key material python-jose accepts for this algorithm, or None (EdDSA)"""
+        if self.is_hmac:
+            return self.secret.decode()
+        if self.algorithm == "RS256":
+            from cryptography.hazmat.primitives import serialization
+
+            return self.public_key.public_bytes(
+                serialization.Encoding.PEM,
+                serialization.PublicFormat.SubjectPublicKeyInfo
+            ).decode()
+        return None
+
+    def _public_jwk(self) -> Optional[dict]:
+        if self.is_hmac:
+            return None  # shared secrets are never published
+        if self.algorithm == "EdDSA":
+            from cryptography.hazmat.primitives import serialization
+
+            raw = self.public_key.public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+            return {"kty": "OKP", "crv": "Ed25519", "x": b64encode(raw),
+                    "kid": self.kid, "alg": "EdDSA", "use": "sig"}
+        numbers = self.public_key.public_numbers()
+        return {"kty": "RSA", "n": _int_to_b64(numbers.n), "e": _int_to_b64(numbers.e),
+                "kid": self.kid, "alg": "RS256", "use": "sig"}
+
+
+class SigningKeyRing:
+    """
+    Signing key schedule
+    The signing key is the most recently activated key. Each key retires
+    `overlap` seconds after its successor activates; retired keys are no longer
+    published or accepted. `legacy` is the shared-secret HMAC key, which signs
+    only when no asymmetric key is configured or none has activated yet, and
+    otherwise just verifies tokens issued before the switch (those carry no
+    kid). Without it, at least one key must already be active.
+    """
+
+    def __init__(self, keys: list[SigningKey], overlap: float, legacy: Optional[SigningKey] = None):
+        if not keys and legacy is None:
+            raise ValueError("At least one signing key is required")
+        kids = [key.kid for key in keys]
+        if len(set(kids)) != len(kids):
+            raise ValueError("Signing key ids must be unique")
+
+        self.keys = sorted(keys, key=lambda key: key.activates_at)
+        for key, successor in zip(self.keys, self.keys[1:]):
+            key.retires_at = successor.activates_at + overlap
+        self.by_kid = {key.kid: key for key in self.keys}
+        self.legacy = legacy
+        self.overlap = overlap
+        self._jwks: tuple[tuple, bytes] = ((), b"")
+        if legacy is None and self.keys and self.keys[0].activates_at > time.time():
+            raise ValueError(
+                "No JWT signing key is active yet: give one key an activation time in the past, "
+                "or keep JWT_ACCEPT_LEGACY_HMAC=true to sign with SECRET_KEY until the first one activates"
+            )
+
+    def signing_key(self, now: Optional[float] = None) -> SigningKey:
+        now = time.time() if now is None else now
+        current = self.legacy  # until the first scheduled key activates
+        for key in self.keys:
+            if key.activates_at > now:
+                break
+            current = key
+        if current is None:
+            raise ValueError("No JWT signing key is active yet")
+        return current
+
+    def verification_key(self, kid: Optional[str], algorithm: str, now: Optional[float] = None) -> Optional[SigningKey]:
+        """Key for a token header, or None if the token can't be ours"""
+        if kid is None:
+            key = self.legacy
+        else:
+            key = self.by_kid.get(kid)
+            if key is not None and key.retires_at is not None:
+                now = time.time() if now is None else now
+                if key.retires_at <= now:
+                    return None
+        if key is None or key.algorithm != algorithm:
+            return None
+        return key
+
+    def published_keys(self, now: Optional[float] = None) -> list[SigningKey]:
+        """Keys in the JWKS: current, scheduled and still-overlapping ones"""
+        now = time.time() if now is None else now
+        return [key for key in self.keys if key.retires_at is None or key.retires_at > now]
+
+    def jwks(self, now: Optional[float] = None) -> bytes:
+        """Serialized JWKS document; rebuilt only when the published set changes"""
+        published = self.published_keys(now)
+        kids = tuple(key.kid for key in published)
+        if self._jwks[0] != kids or not self._jwks[1]:
+            body = json.dumps({"keys": [key.jwk for key in published]}, separators=(",", ":")).encode()
+            self._jwks = (kids, body)
+        return self._jwks[1]
+
+    def encode(self, claims: dict) -> str:
+        """Sign claims with the current key (datetime claims become NumericDate)"""
+        key = self.signing_key()
+        header = {"alg": key.algorithm, "typ": "JWT"}
+        if key.kid is not None:
+            header["kid"] = key.kid
+
+        payload = dict(claims)
+        for claim in ("exp", "iat", "nbf"):
+            if isinstance(payload.get(claim), datetime):
+                payload[claim] = calendar.timegm(payload[claim].utctimetuple())
+
+        signing_input = (
+            b64encode(json.dumps(header, separators=(",", ":"), sort_keys=True).encode())
+            + "."
+            + b64encode(json.dumps(payload, separators=(",", ":")).encode())
+        )
+        return f"{signing_input}.{b64encode(key.sign(signing_input.encode()))}"
+
+    def metrics(self) -> dict:
+        key = self.signing_key()
+        return {
+            "signing_kid": key.kid,
+            "signing_algorithm": key.algorithm,
+            "published_kids": [key.kid for key in self.published_keys()],
+        }
+
+
+def parse_signing_keys(spec: str) -> list[SigningKey]:
+    """
+    Parse "kid:path[:activates_at],..." into keys; activates_at is a unix
+    timestamp or a YYYY-MM-DD date (UTC). Keys without one are active at once.
+    """
+    keys = []
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        parts = entry.split(":")
+        if len(parts) not in (2, 3) or not parts[0] or not parts[1]:
+            raise ValueError("JWT_SIGNING_KEYS entries must look like 'kid:path' or 'kid:path:activates_at'")
+        kid, path = parts[0], parts[1]
+        activates_at = _parse_activation(parts[2]) if len(parts) == 3 else 0.0
+        with open(path, "rb") as pem_file:
+            keys.append(SigningKey.from_pem(kid, pem_file.read(), activates_at))
+    return keys
+
+
+def load_signing_keyring(spec: str, secret_key: str, algorithm: str, overlap: float, accept_legacy: bool) -> SigningKeyRing:
+    """Build the keyring from JWT_SIGNING_KEYS, falling back to the shared secret"""
+    keys = parse_signing_keys(spec)
+    if not keys:
+        return SigningKeyRing([], overlap, legacy=SigningKey.from_secret(secret_key, algorithm))
+    legacy = SigningKey.from_secret(secret_key, algorithm) if accept_legacy and algorithm in HMAC_DIGESTS else None
+    return SigningKeyRing(keys, overlap, legacy=legacy)
+
+
+def generate_private_key_pem(algorithm: str) -> bytes:
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+
+    if algorithm == "EdDSA":
+        private_key = ed25519.Ed25519PrivateKey.generate()
+    elif algorithm == "RS256":
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=3072)
+    else:
+        raise ValueError(f"Algorithm must be one of {', '.join(ASYMMETRIC_ALGORITHMS)}")
+    return private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python -m app.utils.signing_keys <EdDSA|RS256> <output.pem>")
+        sys.exit(2)
+    # Private key: create exclusively, readable by the owner only
+    descriptor = os.open(sys.argv[2], os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(descriptor, "wb") as output:
+        output.write(generate_private_key_pem(sys.argv[1]))
+    print(f"✅ Wrote {sys.argv[1]} signing key to {sys.argv[2]}")
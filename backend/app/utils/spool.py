@@ -0,0 +1,104 @@
+"""
+Per-process spool files
+Crash-safety files for in-memory queues (audit spill, email spool). Each
+process writes its own `<path>.<pid>.<token>` file and holds an exclusive
+flock on it while running, so uvicorn workers sharing one configured path
+never touch each other's entries. On start a process adopts every file
+whose lock is free: left by a process that crashed or, under the plain
+`<path>` name, by a version that used a single shared file.
+
+The owner rewrites its file with just the pending entries once at least
+half of it is stale, so it stays within about twice the pending size.
+Rewrites happen in place, and a crash mid-rewrite can leave some entries
+twice, so readers must treat duplicates as no-ops.
+"""
+import fcntl
+import glob
+import logging
+import os
+import uuid
+from typing import Optional, TextIO
+
+logger = logging.getLogger(__name__)
+
+
+class SpoolFile:
+    """This process's spool file under `path` (see module docstring)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records = 0  # lines in the file, pending or not
+        self._file: Optional[TextIO] = None
+        self._adopted: list[TextIO] = []
+
+    @property
+    def is_open(self) -> bool:
+        return self._file is not None
+
+    def open(self) -> list[str]:
+        """
+        Create and lock this process's file and return the lines of abandoned spools
+        The abandoned files stay locked until release_adopted(); call it once
+        their pending entries have been appended here.
+        """
+        own_path = f"{self.path}.{os.getpid()}.{uuid.uuid4().hex[:8]}"
+        self._file = open(own_path, "w")
+        fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self.records = 0
+
+        lines = []
+        pattern = glob.escape(self.path)
+        for candidate in sorted(glob.glob(pattern) + glob.glob(pattern + ".*")):
+            if candidate == own_path:
+                continue
+            try:
+                f = open(candidate)
+            except OSError:
+                continue
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)  # fails while its owner runs
+                if os.stat(candidate).st_ino != os.fstat(f.fileno()).st_ino:
+                    raise FileNotFoundError(candidate)  # adopted and removed by another process meanwhile
+            except OSError:
+                f.close()
+                continue
+            lines.extend(line for line in f if line.strip())
+            self._adopted.append(f)
+        return lines
+
+    def release_adopted(self):
+        """Delete the abandoned files returned by open()"""
+        for f in self._adopted:
+            try:
+                os.unlink(f.name)
+            except OSError as e:
+                logger.error("Failed to remove spool file %s: %s", f.name, e)
+            f.close()
+        self._adopted = []
+
+    def append(self, line: str):
+        self._file.write(line + "\n")
+        self._file.flush()
+        self.records += 1
+
+    def needs_compaction(self, pending: int) -> bool:
+        """True once at least half the file is entries that are no longer pending"""
+        return self.records > 0 and self.records >= 2 * pending
+
+    def rewrite(self, lines: list[str]):
+        """Replace the file's contents with `lines` (the pending entries)"""
+        self._file.seek(0)
+        for line in lines:
+            self._file.write(line + "\n")
+        self._file.truncate()
+        self._file.flush()
+        self.records = len(lines)
+
+    def close(self):
+        """Close the file, deleting it if nothing in it is pending"""
+        if self._file is None:
+            return
+        if self.records == 0:
+            os.unlink(self._file.name)
+        self._file.close()
+        self._file = None
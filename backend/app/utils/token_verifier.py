@@ -0,0 +1,177 @@
+"""
+JWT verification engine
+Caches successfully verified tokens (keyed by a digest of the token, valid
+until the token's own expiry) and verifies signatures with keys parsed once
+at startup. Any token the fast path can't fully vouch for is handed to
+python-jose, so failures raise exactly the errors they always have.
+python-jose has no EdDSA support; those tokens are checked here and fail
+with the same error types and messages.
+"""
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from jose.exceptions import ExpiredSignatureError, JWTError
+
+from app.utils.signing_keys import SigningKey, SigningKeyRing, b64decode
+
+# Claims python-jose validates beyond exp/iat; tokens carrying them take the full path
+_DEFERRED_CLAIMS = ("aud", "nbf", "iss", "at_hash")
+
+
+class VerifiedTokenCache:
+    """LRU of token digest -> (exp, payload); entries are never served past exp"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[bytes, tuple[float, dict]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest: bytes, now: float) -> Optional[dict]:
+        entry = self._entries.get(digest)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry[0] <= now:
+            del self._entries[digest]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(digest)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, digest: bytes, exp: float, payload: dict):
+        if self.max_size <= 0:
+            return
+        self._entries[digest] = (exp, payload)
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class TokenVerifier:
+    """
+    Decodes and verifies JWTs against a SigningKeyRing
+    backend="native" checks signatures with the stdlib / cryptography
+    primitives and falls back to python-jose on any failure; backend="jose"
+    always verifies with python-jose (except EdDSA, which it can't).
+    """
+
+    def __init__(self, keyring: SigningKeyRing, backend: str = "native", cache_size: int = 10000):
+        if backend not in ("jose", "native"):
+            raise ValueError("JWT_VERIFY_BACKEND must be 'jose' or 'native'")
+        self.keyring = keyring
+        self.backend = backend
+        self.cache = VerifiedTokenCache(cache_size)
+
+    def decode(self, token: str) -> dict:
+        """Return the verified payload or raise JWTError (same errors as jwt.decode)"""
+        now = time.time()
+        digest = hashlib.sha256(token.encode()).digest()
+
+        payload = self.cache.get(digest, now)
+        if payload is None:
+            verified = self._decode_native(token, now) if self.backend == "native" else None
+            if verified is None:
+                verified = self._decode_fallback(token, now)
+            payload, key = verified
+
+            exp = payload.get("exp")
+            if isinstance(exp, (int, float)):
+                # Never serve a token from cache after its key has retired
+                if key.retires_at is not None:
+                    exp = min(exp, key.retires_at)
+                self.cache.put(digest, exp, payload)
+
+        return dict(payload)
+
+    def _decode_native(self, token: str, now: float) -> Optional[tuple[dict, SigningKey]]:
+        """Fast verification; None means 'let the full path decide'"""
+        try:
+            header_segment, payload_segment, signature_segment = token.split(".")
+            header = json.loads(b64decode(header_segment))
+            key = self.keyring.verification_key(header.get("kid"), header.get("alg"), now)
+            if key is None:
+                return None
+            if not key.verify(f"{header_segment}.{payload_segment}".encode(), b64decode(signature_segment)):
+                return None
+            payload = json.loads(b64decode(payload_segment))
+        except (ValueError, TypeError, AttributeError):
+            return None
+
+        if not isinstance(payload, dict) or any(claim in payload for claim in _DEFERRED_CLAIMS):
+            return None
+        exp = payload.get("exp")
+        if not isinstance(exp, int) or exp <= now:
+            return None
+        if "iat" in payload and not isinstance(payload["iat"], int):
+            return None
+        if "sub" in payload and not isinstance(payload["sub"], str):
+            return None
+        if "jti" in payload and not isinstance(payload["jti"], str):
+            return None
+        return payload, key
+
+    def _decode_fallback(self, token: str, now: float) -> tuple[dict, SigningKey]:
+        """Full verification with python-jose's checks and error messages"""
+        from jose import jwt  # only needed for tokens the native path rejects
+
+        if not self.keyring.keys:
+            # Shared-secret only: exactly the original jwt.decode call
+            key = self.keyring.legacy
+            return jwt.decode(token, key.jose_key(), algorithms=[key.algorithm]), key
+
+        header = jwt.get_unverified_header(token)
+        kid = header.get("kid")
+        key = self.keyring.verification_key(kid, header.get("alg"), now) if kid is None or isinstance(kid, str) else None
+        if key is None:
+            raise JWTError("Unknown or retired signing key")
+
+        jose_key = key.jose_key()
+        if jose_key is not None:
+            return jwt.decode(token, jose_key, algorithms=[key.algorithm]), key
+        return self._decode_eddsa(token, key, now), key
+
+    @staticmethod
+    def _decode_eddsa(token: str, key: SigningKey, now: float) -> dict:
+        """EdDSA verification raising python-jose's exceptions"""
+        try:
+            header_segment, payload_segment, signature_segment = token.split(".")
+            signature = b64decode(signature_segment)
+        except ValueError:
+            raise JWTError("Not enough segments")
+        if not key.verify(f"{header_segment}.{payload_segment}".encode(), signature):
+            raise JWTError("Signature verification failed.")
+
+        try:
+            payload = json.loads(b64decode(payload_segment))
+        except ValueError:
+            raise JWTError("Invalid payload string")
+        if not isinstance(payload, dict):
+            raise JWTError("Invalid payload string: must be a json object")
+
+        exp = payload.get("exp")
+        if exp is not None:
+            if not isinstance(exp, (int, float)):
+                raise JWTError("Expiration Time claim (exp) must be an integer.")
+            if exp <= now:
+                raise ExpiredSignatureError("Signature has expired.")
+        nbf = payload.get("nbf")
+        if isinstance(nbf, (int, float)) and nbf > now:
+            raise JWTError("The token is not yet valid (nbf)")
+        return payload
+
+    def metrics(self) -> dict:
+        return {
+            "backend": self.backend,
+            "cache_size": len(self.cache._entries),
+            "cache_hits": self.cache.hits,
+            "cache_misses": self.cache.misses,
+            **self.keyring.metrics(),
+        }
@@ -0,0 +1,98 @@
+"""
+Per-user token versions
+Every access and refresh token carries the user's token_version ("ver").
+Bumping it (log out everywhere, deactivation, MFA changes) invalidates all
+of the user's tokens at once. Workers keep the versions they have seen in
+memory, updated through the invalidation bus, so stale tokens are rejected
+without a per-request lookup; the principal (cached or loaded) is the
+fallback for users not in the map.
+"""
+import os
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+from sqlalchemy import update
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.models import RefreshToken, User
+from app.utils.invalidation import invalidation_bus
+from app.utils.principal_cache import invalidate_principal
+
+load_dotenv()
+
+TOKEN_VERSION_MAP_SIZE = int(os.getenv("TOKEN_VERSION_MAP_SIZE", "100000"))  # users with a bumped version kept
+
+TOKEN_VERSION_TOPIC = "token_version"
+
+
+class TokenVersionMap:
+    """
+    Latest known token_version per user
+    Only versions above 0 are stored (users who never revoked their
+    sessions need no entry), so the map stays small.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._versions: OrderedDict[str, int] = OrderedDict()
+        self.rejected_total = 0
+
+    def note(self, user_id, version: int):
+        """Remember a version read from the database or announced by another worker"""
+        if not version:
+            return
+        key = str(user_id)
+        if version > self._versions.get(key, 0):
+            self._versions[key] = version
+            self._versions.move_to_end(key)
+            while len(self._versions) > self.max_size:
+                self._versions.popitem(last=False)
+
+    def is_stale(self, user_id, version: int) -> bool:
+        """True if a token minted with `version` has been revoked"""
+        stale = version < self._versions.get(str(user_id), 0)
+        self.rejected_total += stale
+        return stale
+
+    def on_bump(self, payload: str):
+        user_id, _, version = payload.partition(":")
+        self.note(user_id, int(version))
+
+    def clear(self, _key: str = ""):
+        # Announcements may have been missed; principals (also cleared) reload the truth
+        self._versions.clear()
+
+    def metrics(self) -> dict:
+        return {"entries": len(self._versions), "rejected_total": self.rejected_total}
+
+
+token_versions = TokenVersionMap(TOKEN_VERSION_MAP_SIZE)
+invalidation_bus.subscribe(TOKEN_VERSION_TOPIC, token_versions.on_bump)
+invalidation_bus.subscribe(invalidation_bus.RESET, token_versions.clear)
+
+
+async def revoke_all_sessions(db, user):
+    """
+    Invalidate every token of `user` (a loaded User row): bump its
+    token_version and revoke its refresh tokens. Takes effect on every
+    worker, this one included, once `db` commits (caller commits); a
+    rollback leaves the user's tokens valid. The bump is done in SQL, so
+    concurrent revocations each add one instead of both writing the same
+    value.
+    """
+    version = await db.scalar(
+        update(User)
+        .where(User.id == user.id)
+        .values(token_version=User.token_version + 1)
+        .returning(User.token_version)
+        .execution_options(synchronize_session=False)
+    )
+    set_committed_value(user, "token_version", version)  # in step with the row, nothing left to flush
+    await db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.user_id == user.id, RefreshToken.revoked == False)
+        .values(revoked=True)
+        .execution_options(synchronize_session=False)
+    )
+    await invalidate_principal(db, user.id)
+    await invalidation_bus.publish(db, TOKEN_VERSION_TOPIC, f"{user.id}:{version}")
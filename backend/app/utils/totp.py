@@ -0,0 +1,158 @@
+"""
+TOTP verification engine (RFC 6238, compatible with pyotp defaults)
+Decoded secret bytes and the codes for the current drift window are cached
+per user, all candidate codes are compared in constant time in a single pass,
+and the last accepted time step per user is remembered so a code can't be
+used twice, even inside the drift window.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import struct
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TOTP_DIGITS = 6
+TOTP_INTERVAL = 30  # seconds
+TOTP_VALID_WINDOW = 1  # steps of clock drift accepted either side
+TOTP_SECRET_CACHE_SIZE = int(os.getenv("TOTP_SECRET_CACHE_SIZE", "10000"))
+TOTP_REPLAY_CACHE_SIZE = int(os.getenv("TOTP_REPLAY_CACHE_SIZE", "100000"))
+
+
+def decode_secret(secret: str) -> bytes:
+    """Base32 secret -> key bytes (same padding rules as pyotp)"""
+    secret = secret + "=" * (-len(secret) % 8)
+    return base64.b32decode(secret, casefold=True)
+
+
+class _SecretEntry:
+    __slots__ = ("source", "key", "codes")
+
+    def __init__(self, source: str, key: bytes):
+        self.source = source  # stored (encrypted) secret the key was decoded from
+        self.key = key
+        self.codes: dict[int, bytes] = {}  # time step -> code, for the current window
+
+
+class TOTPVerifier:
+    """
+    Verifies TOTP codes
+    `secret_for()` returns cached key bytes for a user, re-decrypting only
+    when the stored secret changes; `verify()` checks a code against the
+    ±valid_window steps and rejects steps at or before the user's last
+    accepted one.
+    """
+
+    def __init__(self, digits: int, interval: int, valid_window: int, secret_cache_size: int, replay_cache_size: int):
+        self.digits = digits
+        self.interval = interval
+        self.valid_window = valid_window
+        self.secret_cache_size = secret_cache_size
+        self.replay_cache_size = replay_cache_size
+        self._secrets: OrderedDict[str, _SecretEntry] = OrderedDict()
+        self._last_steps: OrderedDict[str, int] = OrderedDict()  # user -> last accepted step
+
+        self.verified_total = 0
+        self.rejected_total = 0
+        self.replays_total = 0
+
+    def code_at(self, key: bytes, step: int) -> bytes:
+        digest = hmac.new(key, struct.pack(">Q", step), hashlib.sha1).digest()
+        offset = digest[-1] & 0x0F
+        value = struct.unpack(">I", digest[offset:offset + 4])[0] & 0x7FFFFFFF
+        return str(value % 10 ** self.digits).zfill(self.digits).encode()
+
+    def secret_for(self, user_key: str, stored_secret: bytes, decrypt: Callable[[bytes], str]) -> bytes:
+        """Key bytes for a user's stored secret, decrypted and decoded once"""
+        entry = self._secrets.get(user_key)
+        if entry is None or entry.source != stored_secret:
+            entry = _SecretEntry(stored_secret, decode_secret(decrypt(stored_secret)))
+            self._secrets[user_key] = entry
+            if len(self._secrets) > self.secret_cache_size:
+                self._secrets.popitem(last=False)
+        self._secrets.move_to_end(user_key)
+        return entry.key
+
+    def _window_codes(self, key: bytes, user_key: Optional[str], step: int) -> list[tuple[int, bytes]]:
+        steps = range(step - self.valid_window, step + self.valid_window + 1)
+        entry = self._secrets.get(user_key) if user_key is not None else None
+        if entry is None or entry.key != key:
+            return [(s, self.code_at(key, s)) for s in steps]
+        # Reuse codes computed for earlier attempts in this window
+        codes = entry.codes
+        for stale in [s for s in codes if s < steps.start]:
+            del codes[stale]
+        for s in steps:
+            if s not in codes:
+                codes[s] = self.code_at(key, s)
+        return [(s, codes[s]) for s in steps]
+
+    def match(self, key: bytes, code: str, user_key: Optional[str] = None, now: Optional[float] = None) -> Optional[int]:
+        """Time step the code belongs to, or None; every candidate is compared"""
+        candidate = unicodedata.normalize("NFKC", str(code)).encode()
+        step = int((time.time() if now is None else now) // self.interval)
+        matched = None
+        for window_step, expected in self._window_codes(key, user_key, step):
+            if hmac.compare_digest(candidate, expected) and matched is None:
+                matched = window_step
+        return matched
+
+    def last_step(self, user_key: str) -> Optional[int]:
+        return self._last_steps.get(user_key)
+
+    def record(self, user_key: str, step: int):
+        """Remember that `step` was used by this user (also applied from other workers)"""
+        if step <= self._last_steps.get(user_key, -1):
+            return
+        self._last_steps[user_key] = step
+        self._last_steps.move_to_end(user_key)
+        # Entries older than the drift window can't block anything any more
+        oldest_useful = int(time.time() // self.interval) - self.valid_window
+        while self._last_steps:
+            first_key, first_step = next(iter(self._last_steps.items()))
+            if first_step >= oldest_useful and len(self._last_steps) <= self.replay_cache_size:
+                break
+            del self._last_steps[first_key]
+
+    def verify(self, key: bytes, code: str, user_key: Optional[str] = None, now: Optional[float] = None) -> Optional[int]:
+        """
+        Accepted time step, or None if the code is wrong or was already used
+        With a user_key the step is recorded, so the same code (or an older
+        one from the window) is rejected afterwards.
+        """
+        step = self.match(key, code, user_key, now)
+        if step is None:
+            self.rejected_total += 1
+            return None
+        if user_key is not None:
+            if step <= self._last_steps.get(user_key, -1):
+                self.replays_total += 1
+                return None
+            self.record(user_key, step)
+        self.verified_total += 1
+        return step
+
+    def forget(self, user_key: str):
+        """Drop a user's cached secret (e.g. after MFA is disabled)"""
+        self._secrets.pop(user_key, None)
+
+    def metrics(self) -> dict:
+        return {
+            "cached_secrets": len(self._secrets),
+            "replay_entries": len(self._last_steps),
+            "verified_total": self.verified_total,
+            "rejected_total": self.rejected_total,
+            "replays_total": self.replays_total,
+        }
+
+
+totp_verifier = TOTPVerifier(
+    TOTP_DIGITS, TOTP_INTERVAL, TOTP_VALID_WINDOW, TOTP_SECRET_CACHE_SIZE, TOTP_REPLAY_CACHE_SIZE
+)
@@ -0,0 +1,107 @@
+"""
+Shared UserResponse assembly
+Every endpoint that returns users builds the response here, resolving company
+names from a per-process cache so listing users never issues a query per row.
+"""
+import os
+import time
+from typing import Iterable, Optional
+from uuid import UUID
+
+from dotenv import load_dotenv
+from sqlalchemy import select
+
+from app.models import Company
+from app.schemas import UserResponse
+from app.utils.invalidation import invalidation_bus
+from app.utils.last_login import last_login_tracker
+
+load_dotenv()
+
+COMPANY_NAME_CACHE_TTL = float(os.getenv("COMPANY_NAME_CACHE_TTL", "300"))  # seconds
+COMPANY_NAME_CACHE_SIZE = int(os.getenv("COMPANY_NAME_CACHE_SIZE", "10000"))
+
+COMPANY_TOPIC = "company"
+
+
+class CompanyNameCache:
+    """TTL cache of company id -> name"""
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: dict[str, tuple[float, str]] = {}
+
+    def get(self, company_id) -> Optional[str]:
+        entry = self._entries.get(str(company_id))
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def put(self, company_id, name: str):
+        if self.ttl <= 0:
+            return
+        if len(self._entries) >= self.max_size:
+            self._entries.clear()
+        self._entries[str(company_id)] = (time.monotonic() + self.ttl, name)
+
+    def invalidate(self, company_id):
+        self._entries.pop(str(company_id), None)
+
+    def clear(self, _key: str = ""):
+        self._entries.clear()
+
+
+company_names = CompanyNameCache(COMPANY_NAME_CACHE_TTL, COMPANY_NAME_CACHE_SIZE)
+invalidation_bus.subscribe(COMPANY_TOPIC, company_names.invalidate)
+invalidation_bus.subscribe(invalidation_bus.RESET, company_names.clear)
+
+
+async def invalidate_company(db, company_id):
+    """Drop a cached company name on every worker, this one included, once `db` commits"""
+    await invalidation_bus.publish(db, COMPANY_TOPIC, str(company_id))
+
+
+def user_response(user, company_name: Optional[str]) -> UserResponse:
+    """Build a UserResponse from a User row or cached Principal"""
+    return UserResponse(
+        id=user.id,
+        email=user.email,
+        full_name=user.full_name,
+        role=user.role,
+        company_id=user.company_id,
+        company_name=company_name or "",
+        is_active=user.is_active,
+        mfa_enabled=user.mfa_enabled,
+        created_at=user.created_at,
+        last_login=last_login_tracker.latest(user.id, user.last_login)
+    )
+
+
+async def resolve_company_names(db, company_ids: Iterable[UUID]) -> dict[str, str]:
+    """Company names for the given ids: cache first, then one query for the rest"""
+    names = {}
+    missing = set()
+    for company_id in company_ids:
+        key = str(company_id)
+        if key in names or company_id in missing:
+            continue
+        name = company_names.get(key)
+        if name is None:
+            missing.add(company_id)
+        else:
+            names[key] = name
+
+    if missing:
+        rows = await db.execute(select(Company.id, Company.name).where(Company.id.in_(missing)))
+        for company_id, name in rows:
+            company_names.put(company_id, name)
+            names[str(company_id)] = name
+
+    return names
+
+
+async def user_responses(db, users: list) -> list[UserResponse]:
+    """Build UserResponses for many users with at most one company query"""
+    names = await resolve_company_names(db, {user.company_id for user in users})
+    return [user_response(user, names.get(str(user.company_id))) for user in users]
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+MFA backup-code concurrency check
+Enables MFA for a test user, then fires many simultaneous /api/auth/verify-mfa
+calls with the same backup code and checks that exactly one succeeds. Repeats
+this for codes still stored in the legacy encrypted users.mfa_backup_codes
+column (migrated to rows on first use), then disables MFA again with a
+backup code. Exits non-zero on any violation.
+
+Requires DATABASE_URL with test data loaded (database/test_data.sql) and a
+database role that bypasses row-level security (to plant legacy codes).
+Run from the backend directory:
+    python -m benchmarks.backup_code_race
+"""
+
+import json
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pyotp
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, func, select, update
+
+from app.auth import generate_backup_codes
+from app.database import SessionLocal
+from app.main import app
+from app.models import MFABackupCode, User
+from app.utils import rate_limit
+from app.utils.mfa import get_keyring
+
+ADMIN_EMAIL = "admin@techcorp.com"
+PASSWORD = "SecurePass123!"
+CONCURRENCY = 20
+
+
+def race(client, code: str) -> tuple[int, int]:
+    """(successes, rejections) for CONCURRENCY simultaneous uses of one code"""
+    barrier = threading.Barrier(CONCURRENCY)
+
+    def verify(_):
+        barrier.wait()
+        return client.post("/api/auth/verify-mfa", json={"email": ADMIN_EMAIL, "code": code})
+
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        responses = list(pool.map(verify, range(CONCURRENCY)))
+    return (
+        sum(r.status_code == 200 for r in responses),
+        sum(r.status_code == 401 for r in responses),
+    )
+
+
+def plant_legacy_codes(codes: list[str]):
+    """Put a user back in the pre-migration state: codes only in the encrypted column"""
+    with SessionLocal() as db:
+        user_id = db.scalar(select(User.id).where(User.email == ADMIN_EMAIL))
+        db.execute(delete(MFABackupCode).where(MFABackupCode.user_id == user_id))
+        keyring = get_keyring()
+        legacy_blob = keyring.fernets[keyring.primary_version].encrypt(json.dumps(codes).encode()).decode()
+        db.execute(update(User).where(User.id == user_id).values(mfa_backup_codes=legacy_blob))
+        db.commit()
+
+
+def stored_state() -> tuple[bool, int]:
+    """(legacy column still set, number of unused code rows)"""
+    with SessionLocal() as db:
+        user = db.scalar(select(User).where(User.email == ADMIN_EMAIL))
+        unused = db.scalar(
+            select(func.count()).select_from(MFABackupCode)
+            .where(MFABackupCode.user_id == user.id, MFABackupCode.used_at.is_(None))
+        )
+        return user.mfa_backup_codes is not None, unused
+
+
+def main() -> int:
+    failures = []
+    rate_limit.RATE_LIMIT_ENABLED = False  # every racer uses the same email
+
+    with TestClient(app) as client:
+        login = client.post("/api/auth/login", json={"email": ADMIN_EMAIL, "password": PASSWORD})
+        login.raise_for_status()
+        if login.json().get("mfa_required"):
+            print("✗ test user already has MFA enabled")
+            return 1
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        secret = client.post("/api/auth/mfa/setup", headers=headers).json()["secret"]
+        enable = client.post("/api/auth/mfa/enable", headers=headers, json={"code": pyotp.TOTP(secret).now()})
+        enable.raise_for_status()
+        codes = enable.json()["backup_codes"]
+
+        print("=" * 60)
+        print(f"Backup Code Race ({CONCURRENCY} concurrent uses of one code)")
+        print("=" * 60)
+
+        won, rejected = race(client, codes[0])
+        print(f"hashed rows:   successes: {won}, rejected: {rejected}")
+        if won != 1 or rejected != CONCURRENCY - 1:
+            failures.append("a hashed backup code was accepted more than once (or not at all)")
+        if stored_state() != (False, len(codes) - 1):
+            failures.append(f"expected {len(codes) - 1} unused codes, found {stored_state()[1]}")
+
+        legacy = generate_backup_codes()
+        plant_legacy_codes(legacy)
+        won, rejected = race(client, legacy[0].lower())
+        print(f"legacy column: successes: {won}, rejected: {rejected}")
+        if won != 1 or rejected != CONCURRENCY - 1:
+            failures.append("a legacy backup code was accepted more than once (or not at all)")
+        if stored_state() != (False, len(legacy) - 1):
+            failures.append("legacy codes were not moved into rows exactly once")
+
+        login = client.post("/api/auth/verify-mfa", json={"email": ADMIN_EMAIL, "code": legacy[1]})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        disable = client.post("/api/auth/mfa/disable", headers=headers, json={"password": PASSWORD, "code": legacy[2]})
+        print(f"disable with a backup code: HTTP {disable.status_code}")
+        if disable.status_code != 200 or stored_state() != (False, 0):
+            failures.append("disabling MFA with a backup code failed or left codes behind")
+
+    for failure in failures:
+        print(f"✗ {failure}")
+    if not failures:
+        print("✓ every backup code was accepted exactly once")
+    print()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
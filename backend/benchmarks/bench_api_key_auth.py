@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+API-key authentication versus the JWT path
+1. Credential check alone (single core, no database): JWT verification with
+   and without the token cache, against X-API-Key resolution through the
+   in-memory prefix index holding 10,000 keys.
+2. Whole requests in-process: GET /api/auth/me with a bearer token against
+   GET /api/api-keys/whoami with an API key, with SQL statements counted.
+
+Part 2 requires DATABASE_URL with test data loaded (database/test_data.sql).
+Run from the backend directory:
+    python -m benchmarks.bench_api_key_auth
+"""
+
+import time
+import uuid
+from datetime import timedelta
+
+from fastapi.testclient import TestClient
+
+from app.auth import ALGORITHM, SECRET_KEY, JWT_CACHE_SIZE
+from app.database import QueryCounter
+from app.main import app
+from app.models import ApiKey
+from app.utils.api_key_index import ApiKeyIndex
+from app.utils.api_keys import api_key_prefix, generate_api_key, hash_api_key
+from app.utils.signing_keys import SigningKey, SigningKeyRing
+from app.utils.token_verifier import TokenVerifier
+
+ADMIN_EMAIL = "admin@techcorp.com"
+PASSWORD = "SecurePass123!"
+INDEXED_KEYS = 10_000
+REQUESTS = 500
+
+
+def checks_per_second(fn, credentials: list[str], seconds: float = 2.0) -> float:
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        for credential in credentials:
+            fn(credential)
+        count += len(credentials)
+    return count / (time.perf_counter() - start)
+
+
+def credential_checks():
+    ring = SigningKeyRing([], 0, legacy=SigningKey.from_secret(SECRET_KEY, ALGORITHM))
+    exp = int(time.time() + timedelta(minutes=30).total_seconds())
+    tokens = [
+        ring.encode({"sub": str(uuid.uuid4()), "email": "admin@techcorp.com", "company_id": str(uuid.uuid4()),
+                     "role": "admin", "exp": exp, "type": "access"})
+        for _ in range(100)
+    ]
+
+    index = ApiKeyIndex(0, 0, 0)
+    keys = [generate_api_key() for _ in range(INDEXED_KEYS)]
+    company_id = uuid.uuid4()
+    for key in keys:
+        index.add(
+            ApiKey(id=uuid.uuid4(), key_prefix=api_key_prefix(key), key_hash=hash_api_key(key), company_id=company_id),
+            "TechCorp"
+        )
+
+    print("Credential check (1 core, no database)")
+    results = [
+        (f"JWT {ALGORITHM}, no cache", TokenVerifier(ring, backend="native", cache_size=0).decode, tokens),
+        (f"JWT {ALGORITHM} + token cache", TokenVerifier(ring, backend="native", cache_size=JWT_CACHE_SIZE).decode, tokens),
+        (f"X-API-Key, {INDEXED_KEYS:,} keys indexed", index.resolve, keys[:100]),
+    ]
+    for label, fn, credentials in results:
+        print(f"  {label:34} {checks_per_second(fn, credentials):12,.0f} checks/s")
+    print()
+
+
+def requests_per_second(client: TestClient, path: str, headers: dict) -> tuple[float, int]:
+    client.get(path, headers=headers).raise_for_status()  # warm caches
+    with QueryCounter() as counter:
+        client.get(path, headers=headers)
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        client.get(path, headers=headers)
+    return REQUESTS / (time.perf_counter() - start), counter.count
+
+
+def whole_requests():
+    with TestClient(app) as client:
+        login = client.post("/api/auth/login", json={"email": ADMIN_EMAIL, "password": PASSWORD})
+        login.raise_for_status()
+        bearer = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        created = client.post("/api/api-keys/", headers=bearer, json={"name": "bench_api_key_auth"})
+        created.raise_for_status()
+        api_key = {"X-API-Key": created.json()["api_key"]}
+
+        print(f"Whole requests (in-process, {REQUESTS} sequential)")
+        for label, path, headers in (
+            ("Bearer JWT  GET /api/auth/me", "/api/auth/me", bearer),
+            ("X-API-Key   GET /api/api-keys/whoami", "/api/api-keys/whoami", api_key),
+        ):
+            rate, queries = requests_per_second(client, path, headers)
+            print(f"  {label:38} {rate:8,.0f} req/s  {queries} SQL statements/request")
+
+        client.delete(f"/api/api-keys/{created.json()['id']}", headers=bearer)
+    print()
+
+
+def main():
+    print("=" * 60)
+    print("API-Key vs JWT Authentication")
+    print("=" * 60)
+    print()
+    credential_checks()
+    whole_requests()
+
+
+if __name__ == "__main__":
+    main()
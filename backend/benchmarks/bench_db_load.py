@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Load benchmark: sync vs async database layer
+Starts the API once per DB_MODE with the same worker count, logs in as a
+test user and measures requests per second against GET /api/users/me.
+
+Requires a reachable DATABASE_URL with test data loaded (database/test_data.sql)
+and a user without MFA. Run from the backend directory:
+    python -m benchmarks.bench_db_load --workers 1 --concurrency 64 --requests 4000
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+
+def start_server(mode: str, port: int, workers: int) -> subprocess.Popen:
+    env = dict(os.environ, DB_MODE=mode)
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app",
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        env=env,
+    )
+
+
+async def wait_until_ready(base_url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{base_url}/health")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not become ready")
+
+
+async def run_load(base_url: str, email: str, password: str, concurrency: int, total: int) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        response = await client.post("/api/auth/login", json={"email": email, "password": password})
+        response.raise_for_status()
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        remaining = total
+        errors = 0
+
+        async def worker():
+            nonlocal remaining, errors
+            while remaining > 0:
+                remaining -= 1
+                r = await client.get("/api/users/me", headers=headers)
+                if r.status_code != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+
+    return {"rps": total / elapsed, "elapsed": elapsed, "errors": errors}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--email", default="admin@techcorp.com")
+    parser.add_argument("--password", default="SecurePass123!")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"DB Load Benchmark - {args.workers} worker(s), concurrency {args.concurrency}")
+    print("=" * 60)
+    print()
+
+    results = {}
+    for mode in ("sync", "async"):
+        server = start_server(mode, args.port, args.workers)
+        try:
+            base_url = f"http://127.0.0.1:{args.port}"
+            asyncio.run(wait_until_ready(base_url))
+            results[mode] = asyncio.run(
+                run_load(base_url, args.email, args.password, args.concurrency, args.requests)
+            )
+        finally:
+            server.terminate()
+            server.wait()
+
+        r = results[mode]
+        print(f"DB_MODE={mode:5}  {r['rps']:8.1f} req/s  ({r['elapsed']:.2f}s, {r['errors']} errors)")
+
+    print()
+    print(f"Async / sync throughput: {results['async']['rps'] / results['sync']['rps']:.2f}x")
+    print()
+
+
+if __name__ == "__main__":
+    main()
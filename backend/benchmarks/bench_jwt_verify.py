@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+JWT verification throughput (tokens verified per second, single core)
+Compares the previous per-request python-jose decode with the native HMAC
+path and with the verified-token cache, plus native EdDSA / RS256 verification
+with freshly generated keys.
+
+Run from the backend directory:
+    python -m benchmarks.bench_jwt_verify
+"""
+
+import time
+from datetime import timedelta
+
+from jose import jwt
+
+from app.auth import ALGORITHM, SECRET_KEY, JWT_CACHE_SIZE
+from app.utils.signing_keys import SigningKey, SigningKeyRing, generate_private_key_pem
+from app.utils.token_verifier import TokenVerifier
+
+
+def tokens_per_second(fn, tokens: list[str], seconds: float = 2.0) -> float:
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        for token in tokens:
+            fn(token)
+        count += len(tokens)
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    claims = {
+        "sub": "11111111-1111-1111-1111-111111111112",
+        "email": "admin@techcorp.com",
+        "company_id": "11111111-1111-1111-1111-111111111111",
+        "role": "admin",
+    }
+    hmac_ring = SigningKeyRing([], 0, legacy=SigningKey.from_secret(SECRET_KEY, ALGORITHM))
+    eddsa_ring = SigningKeyRing([SigningKey.from_pem("bench-ed", generate_private_key_pem("EdDSA"))], 0)
+    rsa_ring = SigningKeyRing([SigningKey.from_pem("bench-rs", generate_private_key_pem("RS256"))], 0)
+
+    def issue(ring: SigningKeyRing) -> list[str]:
+        # A small working set of distinct tokens, like a worker serving many users
+        exp = int(time.time() + timedelta(minutes=30).total_seconds())
+        return [
+            ring.encode({**claims, "sub": f"{i:08d}-1111-1111-1111-111111111112", "exp": exp, "type": "access"})
+            for i in range(100)
+        ]
+
+    tokens = issue(hmac_ring)
+    uncached_jose = TokenVerifier(hmac_ring, backend="jose", cache_size=0)
+    uncached_native = TokenVerifier(hmac_ring, backend="native", cache_size=0)
+    cached = TokenVerifier(hmac_ring, backend="native", cache_size=JWT_CACHE_SIZE)
+
+    print("=" * 60)
+    print(f"JWT Verification Benchmark ({ALGORITHM}, 1 core)")
+    print("=" * 60)
+    print()
+
+    results = [
+        ("Before: jwt.decode(SECRET_KEY)", lambda t: jwt.decode(t, SECRET_KEY, algorithms=[ALGORITHM])),
+        ("JWT_VERIFY_BACKEND=jose, no cache", uncached_jose.decode),
+        ("native HMAC, no cache", uncached_native.decode),
+        ("native HMAC + token cache", cached.decode),
+    ]
+    baseline = None
+    for label, fn in results:
+        rate = tokens_per_second(fn, tokens)
+        baseline = baseline or rate
+        print(f"{label:34} {rate:12,.0f} tokens/s  ({rate / baseline:5.1f}x)")
+    print()
+
+    for label, ring in (("EdDSA (Ed25519)", eddsa_ring), ("RS256 (3072-bit)", rsa_ring)):
+        ring_tokens = issue(ring)
+        uncached = TokenVerifier(ring, backend="native", cache_size=0).decode
+        cached_ring = TokenVerifier(ring, backend="native", cache_size=JWT_CACHE_SIZE).decode
+        print(f"{label + ', no cache':34} {tokens_per_second(uncached, ring_tokens):12,.0f} tokens/s")
+        print(f"{label + ' + token cache':34} {tokens_per_second(cached_ring, ring_tokens):12,.0f} tokens/s")
+    print()
+
+
+if __name__ == "__main__":
+    main()
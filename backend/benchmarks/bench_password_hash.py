@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Password hashing cost, for sizing API worker pods
+For the configured Argon2id parameters and bcrypt rounds (see app.auth):
+1. Wall time and CPU time per hash on one thread.
+2. Peak memory per hash, measured as the growth of peak RSS in a fresh
+   process (Linux /proc). One running hash holds this much, so the hashing
+   pool needs PASSWORD_HASH_WORKERS times as much at full load.
+3. Throughput with PASSWORD_HASH_WORKERS hashes running side by side.
+
+Run from the backend directory (use the same ARGON2_*/BCRYPT_ROUNDS settings
+as the deployment, and run it under the pod's CPU limit):
+    python -m benchmarks.bench_password_hash
+"""
+
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.auth import ARGON2_MEMORY_COST, ARGON2_PARALLELISM, ARGON2_TIME_COST, BCRYPT_ROUNDS, pwd_context
+from app.utils.hashing import PASSWORD_HASH_WORKERS
+
+PASSWORD = "Benchmark-Password-123!"
+SAMPLES = 10
+THROUGHPUT_HASHES_PER_WORKER = 8
+
+MEMORY_PROBE = """
+import sys
+from app.auth import pwd_context
+
+def status_kib(field):
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith(field))
+
+handler = pwd_context.handler(sys.argv[1])
+with open("/proc/self/clear_refs", "w") as f:
+    f.write("5")  # reset the peak (VmHWM) left behind by the imports
+before = status_kib("VmRSS:")
+handler.hash("Benchmark-Password-123!")
+print(status_kib("VmHWM:") - before)
+"""
+
+
+def single_thread(handler) -> tuple[float, float]:
+    """Median (wall ms, CPU ms) per hash"""
+    handler.hash(PASSWORD)  # warm-up
+    walls, cpus = [], []
+    for _ in range(SAMPLES):
+        wall, cpu = time.perf_counter(), time.thread_time()
+        handler.hash(PASSWORD)
+        walls.append((time.perf_counter() - wall) * 1000)
+        cpus.append((time.thread_time() - cpu) * 1000)
+    return statistics.median(walls), statistics.median(cpus)
+
+
+def peak_memory_mib(scheme: str) -> float:
+    """Peak RSS growth (MiB) of a fresh interpreter over one hash (Linux only)"""
+    result = subprocess.run(
+        [sys.executable, "-c", MEMORY_PROBE, scheme],
+        capture_output=True, text=True, check=True
+    )
+    return int(result.stdout.strip()) / 1024
+
+
+def throughput(handler, workers: int) -> float:
+    """Hashes per second with `workers` threads hashing concurrently"""
+    total = workers * THROUGHPUT_HASHES_PER_WORKER
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        start = time.perf_counter()
+        list(pool.map(lambda _: handler.hash(PASSWORD), range(total)))
+        return total / (time.perf_counter() - start)
+
+
+def main():
+    print("=" * 60)
+    print(f"Password Hashing ({PASSWORD_HASH_WORKERS} pool workers)")
+    print("=" * 60)
+    print()
+
+    schemes = [
+        ("argon2", f"Argon2id t={ARGON2_TIME_COST} m={ARGON2_MEMORY_COST // 1024} MiB p={ARGON2_PARALLELISM}"),
+        ("bcrypt", f"bcrypt rounds={BCRYPT_ROUNDS}"),
+    ]
+    print(f"{'scheme':34} {'wall ms':>8} {'CPU ms':>8} {'MiB/hash':>9} {'hash/s':>8}")
+    results = {}
+    for scheme, label in schemes:
+        handler = pwd_context.handler(scheme)
+        wall, cpu = single_thread(handler)
+        memory = peak_memory_mib(scheme)
+        rate = throughput(handler, PASSWORD_HASH_WORKERS)
+        results[scheme] = (wall, cpu, memory, rate)
+        default = " *" if scheme == pwd_context.default_scheme() else ""
+        print(f"{label + default:34} {wall:8.1f} {cpu:8.1f} {memory:9.1f} {rate:8.1f}")
+    print("(* = PASSWORD_HASH_SCHEME, used for new hashes)")
+    print()
+
+    wall, cpu, memory, rate = results[pwd_context.default_scheme()]
+    print("Per pod, at full hashing load:")
+    print(f"  hashing memory:   {memory * PASSWORD_HASH_WORKERS:8.1f} MiB  ({PASSWORD_HASH_WORKERS} x {memory:.1f} MiB)")
+    print(f"  CPU:              {rate * cpu / 1000:8.2f} cores  ({rate:.1f} hashes/s x {cpu:.1f} ms)")
+    print(f"  logins/s:         {rate:8.1f}  (each login verifies one hash)")
+    print()
+
+
+if __name__ == "__main__":
+    main()
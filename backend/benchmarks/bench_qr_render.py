@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+MFA enrolment QR rendering
+Render time and payload size per format, and the worst event-loop stall while
+a burst of enrolments renders QR codes inline (previous behaviour) versus on
+the QR thread and process pools.
+
+Run from the backend directory:
+    python -m benchmarks.bench_qr_render
+"""
+
+import asyncio
+import time
+
+from app.utils.mfa import generate_mfa_secret, get_totp_uri
+from app.utils.qr_codes import MFASetupCache, render_qr
+
+BURST = 50
+FORMATS = ("png", "svg", "matrix")
+
+
+def uris(count: int) -> list[str]:
+    return [get_totp_uri(generate_mfa_secret(), f"user{i}@techcorp.com") for i in range(count)]
+
+
+async def max_loop_stall(work) -> float:
+    """Longest gap (ms) between ticks of a 1 ms ticker while `work` runs"""
+    worst = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal worst
+        last = time.perf_counter()
+        while not done:
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            worst = max(worst, now - last)
+            last = now
+
+    tick = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    await work()
+    done = True
+    await tick
+    return worst * 1000
+
+
+async def main():
+    print("=" * 60)
+    print("QR Rendering for /mfa/setup")
+    print("=" * 60)
+
+    sample = uris(20)
+    for fmt in FORMATS:
+        start = time.perf_counter()
+        for uri in sample:
+            rendered = render_qr(uri, fmt)
+        elapsed = (time.perf_counter() - start) / len(sample) * 1000
+        size = len(rendered) if isinstance(rendered, str) else sum(len(row) + 3 for row in rendered)
+        print(f"{fmt:<8} {elapsed:>7.2f} ms/render   ~{size:>6,} bytes in the response")
+
+    burst = uris(BURST)
+
+    async def inline():
+        for uri in burst:
+            render_qr(uri, "png")
+            await asyncio.sleep(0)
+
+    def offloaded(cache: MFASetupCache):
+        async def run():
+            entries = [cache.put(i, f"enc-{i}", "", uri) for i, uri in enumerate(burst)]
+            await asyncio.gather(*(cache.render(entry, "png") for entry in entries))
+        return run
+
+    def cached(cache: MFASetupCache):
+        async def run():
+            entries = [cache.get(i, f"enc-{i}") for i in range(BURST)]
+            await asyncio.gather(*(cache.render(entry, "png") for entry in entries))
+        return run
+
+    threads = MFASetupCache(BURST, 600, 2, "thread")
+    processes = MFASetupCache(BURST, 600, 2, "process")
+    await processes.render(processes.put("warmup", "", "", burst[0]), "png")  # start the workers
+
+    print()
+    print(f"Worst event-loop stall during {BURST} PNG enrolments:")
+    print(f"  inline render:          {await max_loop_stall(inline):>7.1f} ms")
+    print(f"  thread pool:            {await max_loop_stall(offloaded(threads)):>7.1f} ms")
+    print(f"  process pool:           {await max_loop_stall(offloaded(processes)):>7.1f} ms")
+    print(f"  cached (reload/retry):  {await max_loop_stall(cached(threads)):>7.1f} ms")
+    threads.shutdown()
+    processes.shutdown()
+    print()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
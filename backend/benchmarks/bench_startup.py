@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+API startup time
+1. Import cost of app.main from `python -X importtime` (fresh interpreter),
+   with the slowest modules, and what the lazily imported modules would add
+   if they were still loaded up front.
+2. Time to first response: spawn uvicorn and poll /health until it answers.
+
+The schema must already be migrated (`alembic upgrade head`); importing the
+app no longer touches the database.
+Run from the backend directory:
+    python -m benchmarks.bench_startup
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+RUNS = 3
+TOP = 12
+# Loaded on first use (MFA enrolment, RS256/ES256 keys, PyJWT-less fallback)
+LAZY_MODULES = ("qrcode", "PIL.Image", "cryptography.fernet", "cryptography.hazmat.primitives.kdf.pbkdf2", "jose.jwt")
+
+
+def import_times(statement: str) -> dict[str, int]:
+    """Cumulative import time (us) per top-level-or-nested module for `statement`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True, text=True, check=True
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = (part.strip() for part in line[len("import time:"):].split("|"))
+        times[module] = int(cumulative)
+    return times
+
+
+def import_cost():
+    runs = [import_times("import app.main") for _ in range(RUNS)]
+    best = min(runs, key=lambda times: times.get("app.main", 0))
+    print(f"import app.main: {best['app.main'] / 1000:8.1f} ms (best of {RUNS})")
+    print()
+    print("Slowest modules (cumulative):")
+    third_party = {
+        module: us for module, us in best.items()
+        if "." not in module and module != "app"
+    }
+    for module, us in sorted(third_party.items(), key=lambda item: -item[1])[:TOP]:
+        print(f"  {module:32} {us / 1000:8.1f} ms")
+    print()
+
+    print("Deferred until first use:")
+    for module in LAZY_MODULES:
+        loaded = module in best
+        extra = import_times(f"import app.main, {module}")
+        cost = extra.get(module, 0) / 1000
+        print(f"  {module:45} {cost:6.1f} ms  {'(still imported!)' if loaded else ''}")
+    print()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def first_response() -> float:
+    """Seconds from spawning uvicorn to the first 200 from /health"""
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=os.environ.copy()
+    )
+    try:
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError("uvicorn exited before answering; is the database migrated?")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.005)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    print("=" * 60)
+    print("API Startup")
+    print("=" * 60)
+    print()
+    import_cost()
+    timings = [first_response() for _ in range(RUNS)]
+    print(f"Time to first /health response: {min(timings) * 1000:8.1f} ms (best of {RUNS}, "
+          f"median {sorted(timings)[RUNS // 2] * 1000:.1f} ms)")
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Password hash cost calibration
+Picks Argon2id parameters (and bcrypt rounds, for comparison or
+PASSWORD_HASH_SCHEME=bcrypt) that take about --target-ms per hash on this
+host, and prints them as environment settings.
+
+Argon2id: memory is fixed at --memory-mib (lowered if even one pass is too
+slow, never below --min-memory-mib) and passes are added until the next one
+would overshoot the target. Parallelism stays at 1: the hashing pool runs
+PASSWORD_HASH_WORKERS hashes side by side already.
+
+Run on the hardware (and CPU limits) the API is deployed on, from the
+backend directory:
+    python -m benchmarks.calibrate_password_hash --target-ms 250
+"""
+
+import argparse
+import statistics
+import time
+
+from passlib.hash import argon2, bcrypt
+
+PASSWORD = "Calibrate-Password-123!"
+SAMPLES = 5
+MAX_TIME_COST = 20
+MAX_BCRYPT_ROUNDS = 16
+
+
+def hash_ms(handler) -> float:
+    """Median wall time of one hash, in ms"""
+    handler.hash(PASSWORD)  # warm-up (allocator, CPU frequency)
+    timings = []
+    for _ in range(SAMPLES):
+        start = time.perf_counter()
+        handler.hash(PASSWORD)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def argon2_handler(time_cost: int, memory_kib: int):
+    return argon2.using(type="ID", time_cost=time_cost, memory_cost=memory_kib, parallelism=1)
+
+
+def calibrate_argon2(target_ms: float, memory_mib: int, min_memory_mib: int) -> tuple[int, int, float]:
+    """(time_cost, memory_cost KiB, ms) closest to target_ms from below"""
+    memory_kib = memory_mib * 1024
+    ms = hash_ms(argon2_handler(1, memory_kib))
+    print(f"  t=1 m={memory_kib // 1024:4d} MiB  {ms:8.1f} ms")
+    while ms > target_ms and memory_kib // 2 >= min_memory_mib * 1024:
+        memory_kib //= 2
+        ms = hash_ms(argon2_handler(1, memory_kib))
+        print(f"  t=1 m={memory_kib // 1024:4d} MiB  {ms:8.1f} ms")
+
+    time_cost = 1
+    while time_cost < MAX_TIME_COST:
+        next_ms = hash_ms(argon2_handler(time_cost + 1, memory_kib))
+        print(f"  t={time_cost + 1} m={memory_kib // 1024:4d} MiB  {next_ms:8.1f} ms")
+        if next_ms > target_ms:
+            break
+        time_cost, ms = time_cost + 1, next_ms
+    return time_cost, memory_kib, ms
+
+
+def calibrate_bcrypt(target_ms: float) -> tuple[int, float]:
+    """(rounds, ms): the most rounds that stay under target_ms (at least 10)"""
+    rounds = 10
+    ms = hash_ms(bcrypt.using(rounds=rounds))
+    print(f"  rounds={rounds}  {ms:8.1f} ms")
+    while rounds < MAX_BCRYPT_ROUNDS:
+        # Each round doubles the cost; stop before it would clearly overshoot
+        if ms * 2 > target_ms * 1.5:
+            break
+        next_ms = hash_ms(bcrypt.using(rounds=rounds + 1))
+        print(f"  rounds={rounds + 1}  {next_ms:8.1f} ms")
+        if next_ms > target_ms:
+            break
+        rounds, ms = rounds + 1, next_ms
+    return rounds, ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target-ms", type=float, default=250, help="wall time per hash to aim for (default 250)")
+    parser.add_argument("--memory-mib", type=int, default=64, help="Argon2id memory per hash to start from (default 64)")
+    parser.add_argument("--min-memory-mib", type=int, default=19, help="never go below this much memory (default 19)")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"Password hash calibration (target {args.target_ms:.0f} ms/hash)")
+    print("=" * 60)
+    print()
+    print("Argon2id:")
+    time_cost, memory_kib, argon2_ms = calibrate_argon2(args.target_ms, args.memory_mib, args.min_memory_mib)
+    print()
+    print("bcrypt:")
+    rounds, bcrypt_ms = calibrate_bcrypt(args.target_ms)
+    print()
+
+    if argon2_ms > args.target_ms:
+        print(f"⚠️  Even t=1 at {memory_kib // 1024} MiB takes {argon2_ms:.0f} ms; "
+              "raise the target or lower --min-memory-mib")
+    print(f"# Argon2id: {argon2_ms:.0f} ms/hash, {memory_kib // 1024} MiB per concurrent hash")
+    print("PASSWORD_HASH_SCHEME=argon2")
+    print(f"ARGON2_TIME_COST={time_cost}")
+    print(f"ARGON2_MEMORY_COST={memory_kib}")
+    print("ARGON2_PARALLELISM=1")
+    print(f"# bcrypt: {bcrypt_ms:.0f} ms/hash")
+    print(f"BCRYPT_ROUNDS={rounds}")
+    print()
+    print("Stored hashes with other parameters are replaced on each user's next login.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+In-memory state changes on commit only
+Runs revoke_all_sessions and revoke_family in transactions that roll back,
+then checks that the user's existing tokens, a fresh login and a refresh
+still work on this worker. Then commits both and checks that the tokens
+stop working, and that a principal cached while a deactivation is being
+committed does not survive the commit. Finally two revocations race
+(logout-all against MFA enable) and both must bump token_version. Exits
+non-zero on any violation.
+
+Requires DATABASE_URL with test data loaded (database/test_data.sql).
+Run from the backend directory (also with DB_MODE=sync):
+    python -m benchmarks.check_after_commit
+"""
+
+import asyncio
+import sys
+from uuid import UUID
+
+from fastapi.testclient import TestClient
+from jose import jwt
+from sqlalchemy import select
+
+from app.database import new_session
+from app.main import app
+from app.models import User
+from app.utils.principal_cache import invalidate_principal
+from app.utils.refresh_tokens import revoke_family
+from app.utils.token_versions import revoke_all_sessions
+
+ADMIN_EMAIL = "admin@techcorp.com"
+PASSWORD = "SecurePass123!"
+
+
+async def revoke(email: str, family_id=None, commit: bool = False):
+    """revoke_all_sessions (or revoke_family), then roll back or commit"""
+    db = new_session()
+    try:
+        user = await db.scalar(select(User).where(User.email == email))
+        if family_id is None:
+            await revoke_all_sessions(db, user)
+        else:
+            await revoke_family(db, family_id)
+        await (db.commit() if commit else db.rollback())
+    finally:
+        await db.close()
+
+
+async def deactivate(email: str, active: bool = False, commit: bool = False):
+    """Change is_active like the users router; returns the open session unless committed"""
+    db = new_session()
+    user = await db.scalar(select(User).where(User.email == email))
+    user.is_active = active
+    await invalidate_principal(db, user.id)
+    await db.flush()
+    if not commit:
+        return db
+    await db.commit()
+    await db.close()
+
+
+async def revoke_concurrently(email: str) -> tuple[int, int]:
+    """Two transactions load the user and revoke at once; returns token_version before and after"""
+    first, second = new_session(), new_session()
+    try:
+        users = [await db.scalar(select(User).where(User.email == email)) for db in (first, second)]
+        before = users[0].token_version
+        await revoke_all_sessions(first, users[0])
+        racing = asyncio.create_task(revoke_all_sessions(second, users[1]))  # waits for the row lock
+        await asyncio.sleep(0.2)
+        await first.commit()
+        await racing
+        await second.commit()
+    finally:
+        await first.close()
+        await second.close()
+    db = new_session()
+    try:
+        return before, await db.scalar(select(User.token_version).where(User.email == email))
+    finally:
+        await db.close()
+
+
+def main() -> int:
+    failures = []
+
+    def check(label: str, status: int, expected: int):
+        ok = status == expected
+        print(f"{'✓' if ok else '✗'} {label}: HTTP {status} (expected {expected})")
+        if not ok:
+            failures.append(label)
+
+    with TestClient(app) as client:
+        print("=" * 60)
+        print("After-commit Invalidation")
+        print("=" * 60)
+
+        def login() -> dict:
+            response = client.post("/api/auth/login", json={"email": ADMIN_EMAIL, "password": PASSWORD})
+            response.raise_for_status()
+            return response.json()
+
+        def me(tokens: dict) -> int:
+            headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+            return client.get("/api/auth/me", headers=headers).status_code
+
+        tokens = login()
+        family_id = UUID(jwt.get_unverified_claims(tokens["access_token"])["sid"])
+
+        client.portal.call(lambda: revoke(ADMIN_EMAIL))
+        check("existing token after a rolled-back logout-all", me(tokens), 200)
+        check("fresh login after a rolled-back logout-all", me(login()), 200)
+
+        client.portal.call(lambda: revoke(ADMIN_EMAIL, family_id))
+        refreshed = client.post("/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+        check("refresh after a rolled-back session revoke", refreshed.status_code, 200)
+        if refreshed.status_code == 200:
+            tokens = refreshed.json()
+
+        client.portal.call(lambda: revoke(ADMIN_EMAIL, family_id, commit=True))
+        check("access token after a committed session revoke", me(tokens), 401)
+
+        tokens = login()
+        client.portal.call(lambda: revoke(ADMIN_EMAIL, commit=True))
+        check("access token after a committed logout-all", me(tokens), 401)
+        check("fresh login after a committed logout-all", me(login()), 200)
+
+        # A principal loaded while a deactivation is not yet committed must
+        # not outlive the commit in the principal cache
+        tokens = login()
+        pending = client.portal.call(lambda: deactivate(ADMIN_EMAIL))
+        check("request in the commit window (row not yet committed)", me(tokens), 200)
+        client.portal.call(pending.commit)
+        client.portal.call(pending.close)
+        check("same token once the deactivation is committed", me(tokens), 403)
+        client.portal.call(lambda: deactivate(ADMIN_EMAIL, active=True, commit=True))
+
+        # Both of two concurrent revocations must take effect
+        before, after = client.portal.call(lambda: revoke_concurrently(ADMIN_EMAIL))
+        ok = after == before + 2
+        print(f"{'✓' if ok else '✗'} concurrent revocations: token_version {before} -> {after} (expected {before + 2})")
+        if not ok:
+            failures.append("concurrent revocations")
+
+    if failures:
+        print(f"✗ {len(failures)} check(s) failed")
+        return 1
+    print("✓ in-memory state changes on commit only")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
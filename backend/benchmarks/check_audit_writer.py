@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Audit writer rejected-row and spill-file check
+A batch that the database refuses must not hold back the rows after it:
+1. A row that was already written (replayed from the spill file after a
+   crash mid-flush) is skipped, and the valid rows queued behind it are
+   written.
+2. A row whose company does not exist is dropped and counted as rejected;
+   the valid rows around it are written.
+3. A row whose user was deleted is written with user_id NULL.
+4. The buffer drains and later rows are written on the next flush.
+Spill files (AUDIT_SPILL_PATH shared by several writers, as by uvicorn workers):
+5. A writer starting next to a running one leaves the other's rows alone.
+6. The spill file is compacted while rows keep arriving, not only once the
+   buffer drains.
+7. After a crash the next writer replays only the rows that were not
+   written, and a clean stop leaves no spill file behind.
+Exits non-zero on any violation; the rows it wrote are deleted at the end.
+
+Requires DATABASE_URL with test data loaded (database/test_data.sql).
+Run from the backend directory (also with DB_MODE=sync):
+    python -m benchmarks.check_audit_writer
+"""
+
+import asyncio
+import glob
+import os
+import sys
+import tempfile
+import uuid
+
+from sqlalchemy import delete, select
+
+from app.database import new_session
+from app.models import AuditLog, User
+from app.utils.audit import AuditWriter
+
+ADMIN_EMAIL = "admin@techcorp.com"
+
+
+def writer(spill_path: str = "", batch_size: int = 50) -> AuditWriter:
+    return AuditWriter(batch_size=batch_size, flush_interval=3600, max_buffer=1000, spill_path=spill_path)
+
+
+async def stored(ids) -> dict:
+    db = new_session()
+    try:
+        rows = await db.execute(select(AuditLog.id, AuditLog.user_id).where(AuditLog.id.in_(list(ids))))
+        return {row_id: user_id for row_id, user_id in rows}
+    finally:
+        await db.close()
+
+
+async def main() -> int:
+    failures = []
+
+    def check(label: str, ok: bool, detail: str):
+        print(f"{'✓' if ok else '✗'} {label}: {detail}")
+        if not ok:
+            failures.append(label)
+
+    db = new_session()
+    try:
+        admin = await db.scalar(select(User).where(User.email == ADMIN_EMAIL))
+        company_id, user_id = admin.company_id, admin.id
+    finally:
+        await db.close()
+
+    print("=" * 60)
+    print("Audit Writer (rejected rows, spill files)")
+    print("=" * 60)
+
+    written_ids = set()
+    try:
+        # A first run writes one row
+        first = writer()
+        first.record(company_id=company_id, user_id=user_id, action="audit_check")
+        replayed = dict(first.buffer[0])
+        await first.flush()
+        written_ids.add(replayed["id"])
+
+        # 1-3. The next run replays it (duplicate id), then a row for a missing
+        # company, a row for a deleted user and valid rows
+        audit = writer()
+        audit.buffer.append(replayed)
+        audit.record(company_id=company_id, user_id=user_id, action="audit_check")
+        audit.record(company_id=uuid.uuid4(), user_id=None, action="audit_check")
+        audit.record(company_id=company_id, user_id=uuid.uuid4(), action="audit_check")
+        audit.record(company_id=company_id, user_id=user_id, action="audit_check")
+        ids = [row["id"] for row in audit.buffer]
+        written_ids.update(ids)
+        await audit.flush()
+        rows = await stored(ids)
+        metrics = audit.metrics()
+
+        check("replayed row skipped, rows behind it written", ids[0] in rows and ids[1] in rows and ids[4] in rows,
+              f"{len(rows)} of {len(ids)} rows stored")
+        check("row for a missing company dropped", ids[2] not in rows and metrics["rejected_total"] == 1,
+              f"rejected {metrics['rejected_total']}")
+        check("row for a deleted user kept without user_id", ids[3] in rows and rows[ids[3]] is None,
+              f"user_id {rows.get(ids[3], 'missing')}")
+        check("buffer drained", metrics["buffered"] == 0 and metrics["failed_flushes_total"] == 0,
+              f"buffered {metrics['buffered']}, failed flushes {metrics['failed_flushes_total']}")
+
+        # 4. Later rows still go out
+        audit.record(company_id=company_id, user_id=user_id, action="audit_check")
+        later = audit.buffer[0]["id"]
+        written_ids.add(later)
+        await audit.flush()
+        check("later rows written", later in await stored([later]), f"{audit.metrics()}")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            spill = os.path.join(tmp, "audit_spill.jsonl")
+
+            # 5. Two writers on one path
+            first, second = writer(spill), writer(spill)
+            await first.start()
+            for _ in range(5):
+                first.record(company_id=company_id, user_id=user_id, action="audit_check")
+            written_ids.update(row["id"] for row in first.buffer)
+            await second.start()
+            check("starting writer leaves a running writer's rows alone",
+                  second.metrics()["buffered"] == 0 and first._spill.records == 5,
+                  f"adopted {second.metrics()['buffered']}, other file holds {first._spill.records}")
+            await second.stop()
+
+            # 6. Rows keep arriving during the first 30 batches: the buffer
+            # doesn't drain until then, the file must still shrink
+            loaded = writer(spill, batch_size=10)
+            await loaded.start()
+            write, sizes = loaded._write, []
+
+            async def write_under_load(rows):
+                for _ in range(5 if len(sizes) < 30 else 0):
+                    loaded.record(company_id=company_id, user_id=user_id, action="audit_check")
+                written_ids.update(row["id"] for row in loaded.buffer)
+                sizes.append(loaded._spill.records)
+                return await write(rows)
+
+            loaded._write = write_under_load
+            for _ in range(100):
+                loaded.record(company_id=company_id, user_id=user_id, action="audit_check")
+            written_ids.update(row["id"] for row in loaded.buffer)
+            await loaded.flush()
+            check("spill file compacted under sustained load", max(sizes) < 100 + 5 * 30,
+                  f"peak {max(sizes)} lines for {loaded.metrics()['written_total']} rows")
+            await loaded.stop()
+
+            # 7. first writes part of its rows, then crashes (its lock goes away)
+            first.batch_size = 3
+            write = first._write
+
+            async def write_then_crash(rows):
+                if first.metrics()["written_total"]:
+                    raise ConnectionError("simulated crash")
+                return await write(rows)
+
+            first._write = write_then_crash
+            await first.flush()
+            first._task.cancel()
+            first._spill._file.close()
+            restarted = writer(spill)
+            await restarted.start()
+            metrics = restarted.metrics()
+            check("crashed writer's unwritten rows replayed", metrics["written_total"] == 2 and metrics["buffered"] == 0,
+                  f"replayed and wrote {metrics['written_total']}, buffered {metrics['buffered']}")
+            await restarted.stop()
+            stored_rows = await stored(written_ids)
+            check("every row written once", len(stored_rows) == len(written_ids) - 1,  # minus the rejected one
+                  f"{len(stored_rows)} of {len(written_ids) - 1}")
+            left = glob.glob(spill + "*")
+            check("no spill files left after clean stops", not left, f"{[os.path.basename(f) for f in left]}")
+    finally:
+        db = new_session()
+        try:
+            await db.execute(delete(AuditLog).where(AuditLog.id.in_(list(written_ids))))
+            await db.commit()
+        finally:
+            await db.close()
+
+    if failures:
+        print(f"✗ {len(failures)} check(s) failed")
+        return 1
+    print("✓ rejected rows never block the rest; spill files stay per writer and compact")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
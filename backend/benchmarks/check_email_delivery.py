@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Email dispatcher delivery check against a local SMTP server (aiosmtpd)
+1. Queued messages are delivered, over the pooled sessions, and the spool
+   ends up empty.
+2. A temporary SMTP failure (451) is retried until the message goes out.
+3. A dispatcher that dies with undelivered mail (workers cancelled and
+   spool lock released, no stop()) leaves it in the spool; the next
+   dispatcher delivers it.
+4. stop() while the server is down keeps the mail in the spool rather than
+   dead-lettering it; the next start delivers it.
+5. A dispatcher starting next to a running one on the same spool path (as
+   uvicorn workers do) leaves the other's queued mail alone.
+6. The spool is compacted while a message keeps failing, not only once
+   nothing is pending.
+7. Replay skips messages marked done and queues each message once.
+Exits non-zero on any violation. Needs aiosmtpd (pip install aiosmtpd).
+
+Run from the backend directory:
+    python -m benchmarks.check_email_delivery
+"""
+
+import asyncio
+import glob
+import json
+import os
+import socket
+import sys
+import tempfile
+from email.mime.text import MIMEText
+
+from aiosmtpd.controller import Controller
+
+from app.utils.email_dispatcher import EmailDispatcher
+
+MESSAGES = 20
+
+
+class RecordingHandler:
+    """Accepts every message, except that the first `fail_first` and any subject "stuck" get a 451"""
+
+    def __init__(self, fail_first: int = 0):
+        self.fail_first = fail_first
+        self.subjects: list[str] = []
+
+    async def handle_DATA(self, server, session, envelope):
+        subject = next(
+            (line[9:] for line in envelope.content.decode().splitlines() if line.startswith("Subject: ")), ""
+        )
+        if self.fail_first > 0 or subject == "stuck":
+            self.fail_first = max(0, self.fail_first - 1)
+            return "451 Try again later"
+        self.subjects.append(subject)
+        return "250 Message accepted"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def message(subject: str) -> MIMEText:
+    msg = MIMEText("Delivery check")
+    msg["From"] = "noreply@example.com"
+    msg["To"] = "user@example.com"
+    msg["Subject"] = subject
+    return msg
+
+
+def dispatcher(port: int, spool_path: str, max_retries: int = 1000) -> EmailDispatcher:
+    # Retries never run out here: mail kept while the server is down must not be dead-lettered
+    return EmailDispatcher(
+        hostname="127.0.0.1", port=port, start_tls=False, pool_size=2,
+        max_retries=max_retries, backoff_base=0.05, backoff_max=0.2, spool_path=spool_path,
+    )
+
+
+async def wait_for(condition, timeout: float = 10.0) -> bool:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            return False
+        await asyncio.sleep(0.05)
+    return True
+
+
+def spool_size(path: str) -> int:
+    """Bytes in all spool files under `path` (one per dispatcher)"""
+    return sum(os.path.getsize(f) for f in glob.glob(path + "*"))
+
+
+async def main() -> int:
+    failures = []
+
+    def check(label: str, ok: bool, detail: str):
+        print(f"{'✓' if ok else '✗'} {label}: {detail}")
+        if not ok:
+            failures.append(label)
+
+    print("=" * 60)
+    print("Email Delivery (aiosmtpd)")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        spool = os.path.join(tmp, "email_spool.jsonl")
+        port = free_port()
+
+        # 1. Plain delivery
+        handler = RecordingHandler()
+        server = Controller(handler, hostname="127.0.0.1", port=port)
+        server.start()
+        sender = dispatcher(port, spool)
+        await sender.start()
+        for i in range(MESSAGES):
+            sender.enqueue(message(f"plain {i}"))
+        delivered = await wait_for(lambda: len(handler.subjects) == MESSAGES)
+        await sender.stop()
+        check("queued messages delivered", delivered and sorted(handler.subjects) == sorted(f"plain {i}" for i in range(MESSAGES)),
+              f"{len(handler.subjects)}/{MESSAGES}")
+        check("spool empty once delivered", spool_size(spool) == 0, f"{spool_size(spool)} bytes")
+
+        # 2. Temporary failures are retried
+        handler.subjects.clear()
+        handler.fail_first = 3
+        sender = dispatcher(port, spool)
+        await sender.start()
+        sender.enqueue(message("retried"))
+        delivered = await wait_for(lambda: handler.subjects == ["retried"])
+        await sender.stop()
+        check("451 retried until delivered", delivered, f"retried {sender.retried_total}x, sent {sender.sent_total}")
+        server.stop()
+
+        # 3. Crash with undelivered mail (server down, process dies without stop())
+        handler.subjects.clear()
+        crashed = dispatcher(port, spool)
+        await crashed.start()
+        for i in range(5):
+            crashed.enqueue(message(f"crash {i}"))
+        await asyncio.sleep(0.3)
+        for task in crashed._workers + list(crashed._retry_tasks):
+            task.cancel()
+        await asyncio.gather(*crashed._workers, *crashed._retry_tasks, return_exceptions=True)
+        crashed._spool._file.close()  # the process is gone: so is its lock
+        check("undelivered mail left in the spool", spool_size(spool) > 0, f"{spool_size(spool)} bytes")
+
+        server = Controller(handler, hostname="127.0.0.1", port=port)
+        server.start()
+        sender = dispatcher(port, spool)
+        await sender.start()
+        delivered = await wait_for(lambda: len(handler.subjects) == 5)
+        await sender.stop()
+        check("spooled mail delivered after restart", delivered and sender.replayed_total == 5,
+              f"replayed {sender.replayed_total}, delivered {len(handler.subjects)}")
+        check("spool empty after replay", spool_size(spool) == 0, f"{spool_size(spool)} bytes")
+        server.stop()
+
+        # 4. Graceful stop while the server is down keeps mail in the spool
+        handler.subjects.clear()
+        sender = dispatcher(port, spool)
+        await sender.start()
+        sender.enqueue(message("kept"))
+        await asyncio.sleep(0.3)
+        await sender.stop(timeout=0.5)
+        check("stop() keeps undelivered mail spooled", sender.dead_lettered_total == 0 and spool_size(spool) > 0,
+              f"dead-lettered {sender.dead_lettered_total}, spool {spool_size(spool)} bytes")
+
+        server = Controller(handler, hostname="127.0.0.1", port=port)
+        server.start()
+        sender = dispatcher(port, spool)
+        await sender.start()
+        delivered = await wait_for(lambda: handler.subjects == ["kept"])
+        await sender.stop()
+        server.stop()
+        check("kept mail delivered on the next start", delivered, f"delivered {handler.subjects}")
+        check("no spool files left after clean stops", not glob.glob(spool + "*"), f"{glob.glob(spool + '*')}")
+
+        # 5. Two dispatchers on one path; the first has undelivered mail (server down)
+        handler.subjects.clear()
+        first = dispatcher(port, spool)
+        await first.start()
+        for i in range(3):
+            first.enqueue(message(f"shared {i}"))
+        await asyncio.sleep(0.3)
+        second = dispatcher(port, spool)
+        await second.start()
+        check("starting dispatcher leaves a running one's mail alone",
+              second.replayed_total == 0 and len(first._spooled) == 3,
+              f"replayed {second.replayed_total}, other still holds {len(first._spooled)}")
+        await second.stop()
+        await first.stop(timeout=0.5)
+
+        server = Controller(handler, hostname="127.0.0.1", port=port)
+        server.start()
+        sender = dispatcher(port, spool)
+        await sender.start()
+        delivered = await wait_for(lambda: len(handler.subjects) == 3)
+        await asyncio.sleep(0.3)
+        await sender.stop()
+        check("shared-path mail delivered exactly once", delivered and sorted(handler.subjects) == [f"shared {i}" for i in range(3)],
+              f"delivered {handler.subjects}")
+
+        # 6. One message keeps failing while 200 others go out
+        handler.subjects.clear()
+        sender = dispatcher(port, spool)
+        await sender.start()
+        sender.enqueue(message("stuck"))
+        peak = 0
+        for i in range(200):
+            sender.enqueue(message(f"load {i}"))
+            if i % 10 == 9:
+                await asyncio.sleep(0.02)
+                peak = max(peak, sender._spool.records)
+        delivered = await wait_for(lambda: len(handler.subjects) == 200)
+        peak = max(peak, sender._spool.records)
+        check("spool compacted while a message stays pending", delivered and peak < 100,
+              f"peak {peak} records for 201 messages, still pending {len(sender._spooled)}")
+        await sender.stop(timeout=0.2)
+        server.stop()
+
+        # 7. A crashed process's spool: the stuck message, one marked done, one
+        # duplicated by an interrupted compaction
+        for f in glob.glob(spool + "*"):
+            os.remove(f)
+        with open(f"{spool}.99999.deadbeef", "w") as f:
+            for email_id, subject in (("sent", "already sent"), ("twice", "once only"), ("twice", "once only")):
+                f.write(json.dumps({"op": "add", "id": email_id, "message": message(subject).as_string()}) + "\n")
+            f.write(json.dumps({"op": "done", "id": "sent"}) + "\n")
+            f.write('{"op": "retry", "id": "tw')  # torn last line
+        handler.subjects.clear()
+        server = Controller(handler, hostname="127.0.0.1", port=port)
+        server.start()
+        sender = dispatcher(port, spool)
+        await sender.start()
+        delivered = await wait_for(lambda: handler.subjects == ["once only"])
+        await asyncio.sleep(0.3)
+        await sender.stop()
+        server.stop()
+        check("replay skips done messages and queues each once", delivered and handler.subjects == ["once only"],
+              f"replayed {sender.replayed_total}, delivered {handler.subjects}")
+
+    if failures:
+        print(f"✗ {len(failures)} check(s) failed")
+        return 1
+    print("✓ queued mail is delivered and survives restarts")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
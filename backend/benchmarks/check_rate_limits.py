@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Company-scope rate limit check
+The company budget must stop a distributed attack on one tenant's accounts
+without letting anyone lock out a shared email domain or a busy tenant:
+1. Failed logins with made-up emails on a shared domain, each from its own
+   IP, don't throttle a real account on that domain.
+2. Many successful logins across one company from many IPs aren't throttled.
+3. Failures against one company's accounts throttle that company (429 with
+   Retry-After) but not another company.
+MFA endpoints (the mfa limiter as configured, on a fresh memory backend):
+4. Signing in with MFA and then disabling it, repeatedly within one
+   window, is never throttled: successes don't count per email.
+5. Failed MFA codes for one email are still throttled after
+   MFA_RATE_LIMIT_EMAIL failures, across verify-mfa and mfa/disable.
+Exits non-zero on any violation. Needs no database.
+
+Run from the backend directory:
+    python -m benchmarks.check_rate_limits
+"""
+
+import asyncio
+import sys
+import uuid
+
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.utils.rate_limit import (
+    LOGIN_LOCKOUT,
+    LOGIN_RATE_LIMIT_COMPANY,
+    MFA_RATE_LIMIT_EMAIL,
+    MemoryBackend,
+    RateLimiter,
+    mfa_limiter,
+    parse_rate,
+)
+
+COMPANY_RULE = parse_rate(LOGIN_RATE_LIMIT_COMPANY) or (100, 60.0)
+
+
+def request_from(ip: str) -> Request:
+    return Request({"type": "http", "client": (ip, 40000), "headers": []})
+
+
+def limiter() -> RateLimiter:
+    # Only the company rule: per-IP and per-email limits are not under test
+    return RateLimiter("check", MemoryBackend(100000), {"company": COMPANY_RULE}, lockout=parse_rate(LOGIN_LOCKOUT))
+
+
+async def attempt(rl: RateLimiter, ip: str, email: str, company_id=None) -> int:
+    """HTTP status the login flow would end in before password verification"""
+    try:
+        await rl.check(request_from(ip), email)
+        await rl.check_company(company_id)
+    except HTTPException as e:
+        return e.status_code
+    return 200
+
+
+async def main() -> int:
+    failures = []
+    limit, _ = COMPANY_RULE
+
+    def check(label: str, ok: bool, detail: str):
+        print(f"{'✓' if ok else '✗'} {label}: {detail}")
+        if not ok:
+            failures.append(label)
+
+    print("=" * 60)
+    print(f"Company Rate Limit ({limit} failures / {COMPANY_RULE[1]:.0f} s)")
+    print("=" * 60)
+
+    # 1. Junk emails on a shared domain (unknown accounts: no company resolved)
+    rl = limiter()
+    victim_company = uuid.uuid4()
+    for i in range(limit * 2):
+        await attempt(rl, f"10.0.{i // 250}.{i % 250}", f"junk{i}@gmail.com")
+        await rl.record_failure(f"junk{i}@gmail.com")
+    status = await attempt(rl, "192.0.2.1", "victim@gmail.com", victim_company)
+    check("real account on a shared domain after junk failures", status == 200, f"HTTP {status}")
+
+    # 2. A busy tenant: successful logins only
+    rl = limiter()
+    company = uuid.uuid4()
+    statuses = [await attempt(rl, f"10.1.{i // 250}.{i % 250}", f"user{i}@bigcorp.com", company) for i in range(limit * 3)]
+    throttled = sum(s == 429 for s in statuses)
+    check("successful logins across a busy company", throttled == 0, f"{throttled} of {len(statuses)} throttled")
+
+    # 3. A distributed attack on one tenant's accounts
+    rl = limiter()
+    target, other = uuid.uuid4(), uuid.uuid4()
+    for i in range(limit):
+        await attempt(rl, f"10.2.{i // 250}.{i % 250}", f"user{i % 20}@target.com", target)
+        await rl.record_failure(f"user{i % 20}@target.com", target)
+    try:
+        await rl.check_company(target)
+        check("attacked company after the failure budget", False, "not throttled")
+    except HTTPException as e:
+        retry_after = e.headers.get("Retry-After")
+        check("attacked company after the failure budget", e.status_code == 429 and retry_after is not None,
+              f"HTTP {e.status_code}, Retry-After {retry_after}")
+    status = await attempt(rl, "192.0.2.2", "someone@other.com", other)
+    check("another company meanwhile", status == 200, f"HTTP {status}")
+    print(f"rejections: {rl.metrics()['rejected_total']}")
+
+    print("=" * 60)
+    print(f"MFA Email Limit ({MFA_RATE_LIMIT_EMAIL} failures)")
+    print("=" * 60)
+    mfa_limiter.backend = MemoryBackend(100000)
+    email_limit, _ = parse_rate(MFA_RATE_LIMIT_EMAIL)
+    mfa_company = uuid.uuid4()
+
+    async def verify_then_disable(email: str) -> list[int]:
+        """Limiter calls of a successful verify-mfa, then of mfa/disable (limit_mfa_disable)"""
+        statuses = []
+        for step in ("verify", "disable"):
+            try:
+                await mfa_limiter.check(request_from("192.0.2.3"), email)
+                await mfa_limiter.check_company(mfa_company)
+            except HTTPException as e:
+                statuses.append(e.status_code)
+                continue
+            if step == "verify":
+                await mfa_limiter.record_success(email)
+            statuses.append(200)
+        return statuses
+
+    # 4. Sign in with MFA, disable it, re-enable, repeat
+    statuses = [status for _ in range(email_limit + 2) for status in await verify_then_disable("mfa-user@example.com")]
+    throttled = sum(s == 429 for s in statuses)
+    check("verify-mfa then mfa/disable, repeatedly", throttled == 0, f"{throttled} of {len(statuses)} throttled")
+
+    # 5. Wrong codes: alternate endpoints, each failure counts
+    for _ in range(email_limit):
+        await mfa_limiter.check(request_from("192.0.2.4"), "guessed@example.com")
+        await mfa_limiter.record_failure("guessed@example.com", mfa_company)
+    try:
+        await mfa_limiter.check(request_from("192.0.2.5"), "guessed@example.com")
+        check("wrong codes for one email after the limit", False, "not throttled")
+    except HTTPException as e:
+        check("wrong codes for one email after the limit", e.status_code == 429, f"HTTP {e.status_code}")
+
+    if failures:
+        print(f"✗ {len(failures)} check(s) failed")
+        return 1
+    print("✓ failure-only scopes ignore successful attempts and still stop guessing")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
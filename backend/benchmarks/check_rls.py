@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Row-Level Security enforcement check
+Proves the policies in database/init.sql isolate companies when queries go
+through the app's session context (set_company_context). Table owners and
+superusers bypass RLS, so every check runs under a temporary role without
+BYPASSRLS (created here, dropped at the end):
+
+1. Without a company context no users are visible.
+2. With company A's context only A's users are visible, also in a second
+   transaction on the same session (the context is re-applied after commit).
+3. Company B's rows can be neither updated nor inserted under A's context.
+4. A pooled connection handed to a new session carries no context over.
+
+Exits non-zero if any check fails. Requires DATABASE_URL (PostgreSQL) with
+test data loaded (database/test_data.sql) and a role allowed to CREATE ROLE.
+Run from the backend directory:
+    python -m benchmarks.check_rls
+"""
+
+import asyncio
+import sys
+import uuid
+
+from sqlalchemy import func, select, text, update
+
+from app.database import new_session, set_company_context
+from app.models import User
+
+PROBE_ROLE = f"rls_check_{uuid.uuid4().hex[:8]}"
+
+
+async def run(statement_fn, company_id=None):
+    """Run `statement_fn(db)` as the probe role, in a fresh session"""
+    db = new_session()
+    try:
+        if company_id is not None:
+            await set_company_context(db, company_id)
+        await db.execute(text(f"SET LOCAL ROLE {PROBE_ROLE}"))
+        return await statement_fn(db)
+    finally:
+        await db.rollback()
+        await db.close()
+
+
+async def visible_companies(db) -> dict:
+    rows = await db.execute(select(User.company_id, func.count()).group_by(User.company_id))
+    return {str(company_id): count for company_id, count in rows}
+
+
+async def main() -> int:
+    db = new_session()
+    try:
+        owner_view = await visible_companies(db)
+        await db.execute(text(f"CREATE ROLE {PROBE_ROLE} NOLOGIN NOBYPASSRLS"))
+        await db.execute(text(f"GRANT SELECT, INSERT, UPDATE, DELETE ON users, audit_logs TO {PROBE_ROLE}"))
+        await db.commit()
+    finally:
+        await db.close()
+
+    if len(owner_view) < 2:
+        print("❌ Need users in at least two companies (load database/test_data.sql)")
+        return 1
+    (company_a, users_a), (company_b, _) = sorted(owner_view.items(), key=lambda item: -item[1])[:2]
+
+    results = []
+
+    def check(label: str, ok: bool, detail: str = ""):
+        results.append(ok)
+        print(f"{'✓' if ok else '✗'} {label}{f'  ({detail})' if detail else ''}")
+
+    try:
+        print("=" * 60)
+        print(f"Row-Level Security (as role {PROBE_ROLE})")
+        print("=" * 60)
+
+        seen = await run(visible_companies)
+        check("no context: no users visible", seen == {}, str(seen))
+
+        seen = await run(visible_companies, company_a)
+        check("company A context: only A's users", seen == {company_a: users_a}, str(seen))
+
+        async def across_commit(db):
+            await db.commit()  # ends the transaction that applied the context
+            await db.execute(text(f"SET LOCAL ROLE {PROBE_ROLE}"))
+            return await visible_companies(db)
+
+        seen = await run(across_commit, company_a)
+        check("context survives commit", seen == {company_a: users_a}, str(seen))
+
+        async def update_other(db):
+            result = await db.execute(
+                update(User).where(User.company_id == company_b).values(full_name=User.full_name)
+                .execution_options(synchronize_session=False)
+            )
+            return result.rowcount
+
+        updated = await run(update_other, company_a)
+        check("company A context: B's users not updatable", updated == 0, f"{updated} rows")
+
+        async def insert_other(db):
+            try:
+                await db.execute(text(
+                    "INSERT INTO users (email, hashed_password, full_name, company_id) "
+                    "VALUES (:email, 'x', 'RLS probe', CAST(:company_id AS uuid))"
+                ), {"email": f"{PROBE_ROLE}@example.com", "company_id": company_b})
+            except Exception as e:
+                return str(e)
+            return "inserted"
+
+        error = await run(insert_other, company_a)
+        check("company A context: insert into B rejected", "row-level security" in error, error.splitlines()[0])
+
+        # The next session may get the same pooled connection back
+        await run(visible_companies, company_a)
+        seen = await run(visible_companies)
+        check("pooled connection: context reset on checkin", seen == {}, str(seen))
+    finally:
+        db = new_session()
+        try:
+            await db.execute(text(f"DROP OWNED BY {PROBE_ROLE}"))
+            await db.execute(text(f"DROP ROLE {PROBE_ROLE}"))
+            await db.commit()
+        finally:
+            await db.close()
+
+    print()
+    print("✅ RLS enforced" if all(results) else "❌ RLS not enforced")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
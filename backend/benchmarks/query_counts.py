@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Query-count budget check
+Calls each endpoint in-process and counts the SQL statements it sends
+(warm caches). Exits non-zero if any endpoint exceeds its budget, so a
+reintroduced N+1 fails CI.
+
+Requires DATABASE_URL with test data loaded (database/test_data.sql).
+Run from the backend directory:
+    python -m benchmarks.query_counts
+"""
+
+import os
+import sys
+import uuid
+
+# Audit rows and last_login are written in the background; hold them until
+# shutdown so the writers' batches don't land inside a measured request
+os.environ.setdefault("AUDIT_FLUSH_INTERVAL", "3600")
+os.environ.setdefault("LAST_LOGIN_FLUSH_INTERVAL", "3600")
+
+import pyotp
+from fastapi.testclient import TestClient
+
+from app.database import QueryCounter
+from app.main import app
+
+ADMIN_EMAIL = "admin@techcorp.com"
+PASSWORD = "SecurePass123!"
+
+# (method, path) -> maximum statements per request with warm caches.
+# "{user_id}" is replaced with another user from the admin's company.
+QUERY_BUDGETS = {
+    ("GET", "/api/auth/me"): 0,
+    ("GET", "/api/auth/sessions"): 2,
+    ("GET", "/api/users/me"): 0,
+    ("GET", "/api/users/"): 2,
+    ("GET", "/api/users/{user_id}"): 2,
+}
+
+# Same, authenticated with an X-API-Key instead of a bearer token
+API_KEY_QUERY_BUDGETS = {
+    ("GET", "/api/api-keys/whoami"): 0,
+}
+
+# Auth flows for a freshly registered company: step -> (statements, commits).
+# Each flow is one unit of work: at most one commit, none when it is rejected.
+# The MFA management steps run under a company context, which asyncpg sends
+# as one extra set_config statement (see app.database).
+AUTH_FLOW_BUDGETS = {
+    "register": (2, 1),
+    "register, duplicate email": (2, 0),
+    "login": (2, 1),
+    "refresh": (3, 1),
+    "mfa/setup": (4, 1),
+    "mfa/enable": (7, 1),  # token_version is bumped by its own UPDATE ... RETURNING (atomic)
+    "login, MFA required": (1, 0),
+    "verify-mfa, backup code": (3, 1),
+}
+
+
+def auth_flows(client: TestClient):
+    """Yield (step, response, counter) for each AUTH_FLOW_BUDGETS step, in order"""
+    domain = f"qc-{uuid.uuid4().hex[:12]}.example.com"
+    account = {"email": f"admin@{domain}", "password": PASSWORD}
+
+    def step(name, method, url, **kwargs):
+        with QueryCounter() as counter:
+            response = client.request(method, url, **kwargs)
+        return name, response, counter
+
+    registration = {**account, "full_name": "Query Counts", "company_name": "Query Counts", "company_domain": domain}
+    yield step("register", "POST", "/api/auth/register", json=registration)
+    yield step("register, duplicate email", "POST", "/api/auth/register",
+               json={**registration, "company_domain": f"other-{domain}"})
+
+    name, login, counter = step("login", "POST", "/api/auth/login", json=account)
+    yield name, login, counter
+    tokens = login.json()
+    yield step("refresh", "POST", "/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    name, setup, counter = step("mfa/setup", "POST", "/api/auth/mfa/setup", headers=headers)
+    yield name, setup, counter
+    code = pyotp.TOTP(setup.json()["secret"]).now()
+    name, enable, counter = step("mfa/enable", "POST", "/api/auth/mfa/enable", headers=headers, json={"code": code})
+    yield name, enable, counter
+
+    yield step("login, MFA required", "POST", "/api/auth/login", json=account)
+    backup_code = enable.json()["backup_codes"][0]
+    yield step("verify-mfa, backup code", "POST", "/api/auth/verify-mfa",
+               json={"email": account["email"], "code": backup_code})
+
+
+def main() -> int:
+    failures = 0
+    with TestClient(app) as client:
+        login = client.post("/api/auth/login", json={"email": ADMIN_EMAIL, "password": PASSWORD})
+        login.raise_for_status()
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        users = client.get("/api/users/", headers=headers).json()
+        other_user = next(u for u in users if u["email"] != ADMIN_EMAIL)
+
+        api_key = client.post("/api/api-keys/", headers=headers, json={"name": "query-counts"}).json()
+        api_key_headers = {"X-API-Key": api_key["api_key"]}
+        budgets = [(entry, budget, headers) for entry, budget in QUERY_BUDGETS.items()]
+        budgets += [(entry, budget, api_key_headers) for entry, budget in API_KEY_QUERY_BUDGETS.items()]
+
+        print("=" * 60)
+        print("Query Counts per Endpoint (warm caches)")
+        print("=" * 60)
+
+        for (method, path), budget, request_headers in budgets:
+            url = path.replace("{user_id}", other_user["id"])
+            client.request(method, url, headers=request_headers)  # warm caches
+
+            with QueryCounter() as counter:
+                response = client.request(method, url, headers=request_headers)
+
+            ok = response.status_code < 400 and counter.count <= budget
+            failures += not ok
+            print(f"{'✓' if ok else '✗'} {method:6} {path:28} {counter.count} queries (budget {budget}, HTTP {response.status_code})")
+            if not ok:
+                for statement in counter.statements:
+                    print(f"    {' '.join(statement.split())[:100]}")
+
+        print()
+        print("=" * 60)
+        print("Auth Flow Round Trips (statements, commits)")
+        print("=" * 60)
+
+        for name, response, counter in auth_flows(client):
+            budget, commit_budget = AUTH_FLOW_BUDGETS[name]
+            rejected = name == "register, duplicate email"
+            ok = (
+                (response.status_code >= 400) == rejected
+                and counter.count <= budget
+                and counter.commits <= commit_budget
+            )
+            failures += not ok
+            print(f"{'✓' if ok else '✗'} {name:28} {counter.count} statements (budget {budget}), "
+                  f"{counter.commits} commits (budget {commit_budget}), HTTP {response.status_code}")
+            if not ok:
+                for statement in counter.statements:
+                    print(f"    {' '.join(statement.split())[:100]}")
+
+    print()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Refresh-token rotation concurrency check
+Fires many simultaneous /api/auth/refresh calls with the same refresh token
+and checks that exactly one succeeds, that the winner's rotated token keeps
+working, and that replaying a rotated token later revokes the whole family.
+Exits non-zero on any violation.
+
+Requires DATABASE_URL with test data loaded (database/test_data.sql).
+Run from the backend directory:
+    python -m benchmarks.refresh_race
+"""
+
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.utils import refresh_tokens
+
+ADMIN_EMAIL = "admin@techcorp.com"
+PASSWORD = "SecurePass123!"
+CONCURRENCY = 20
+
+
+def main() -> int:
+    failures = []
+    with TestClient(app) as client:
+        login = client.post("/api/auth/login", json={"email": ADMIN_EMAIL, "password": PASSWORD})
+        login.raise_for_status()
+        original = login.json()["refresh_token"]
+
+        print("=" * 60)
+        print(f"Refresh Rotation Race ({CONCURRENCY} concurrent refreshes)")
+        print("=" * 60)
+
+        barrier = threading.Barrier(CONCURRENCY)
+
+        def refresh(_):
+            barrier.wait()
+            return client.post("/api/auth/refresh", json={"refresh_token": original})
+
+        with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+            responses = list(pool.map(refresh, range(CONCURRENCY)))
+
+        winners = [r for r in responses if r.status_code == 200]
+        losers = [r for r in responses if r.status_code == 401]
+        print(f"winners: {len(winners)}, rejected: {len(losers)}, other: {CONCURRENCY - len(winners) - len(losers)}")
+        if len(winners) != 1 or len(losers) != CONCURRENCY - 1:
+            print("✗ expected exactly one winner")
+            return 1
+
+        # Losers raced within the grace window: the family must still be live
+        rotated = winners[0].json()["refresh_token"]
+        if rotated == original:
+            failures.append("refresh token was not rotated")
+        follow_up = client.post("/api/auth/refresh", json={"refresh_token": rotated})
+        print(f"winner's rotated token: HTTP {follow_up.status_code}")
+        if follow_up.status_code != 200:
+            failures.append("winner's rotated token was rejected")
+        latest = follow_up.json().get("refresh_token")
+
+        # A replay outside the grace window is theft: the whole family goes
+        refresh_tokens.REFRESH_REUSE_GRACE_SECONDS = 0
+        replay = client.post("/api/auth/refresh", json={"refresh_token": original})
+        after_replay = client.post("/api/auth/refresh", json={"refresh_token": latest})
+        print(f"replayed token: HTTP {replay.status_code}; family's latest token afterwards: HTTP {after_replay.status_code}")
+        if replay.status_code != 401 or after_replay.status_code != 401:
+            failures.append("replay did not revoke the family")
+
+    for failure in failures:
+        print(f"✗ {failure}")
+    if not failures:
+        print("✓ exactly one winner, rotation and reuse detection behave")
+    print()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
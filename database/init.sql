@@ -12,7 +12,6 @@ CREATE TABLE IF NOT EXISTS companies (
     address TEXT,
     phone_number_1 VARCHAR(20),
     phone_number_2 VARCHAR(20),
-    api_key VARCHAR(255) UNIQUE,
     is_active BOOLEAN DEFAULT true NOT NULL,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE
@@ -32,29 +31,63 @@ CREATE TABLE IF NOT EXISTS users (
     is_active BOOLEAN DEFAULT true NOT NULL,
     email_verified BOOLEAN DEFAULT false NOT NULL,
     mfa_enabled BOOLEAN DEFAULT false NOT NULL,
-    mfa_secret VARCHAR(255),
+    mfa_secret BYTEA,
     mfa_backup_codes TEXT,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE,
-    last_login TIMESTAMP WITH TIME ZONE
+    last_login TIMESTAMP WITH TIME ZONE,
+    token_version INTEGER DEFAULT 0 NOT NULL  -- bumped to revoke every issued token
 );
 
 CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
-CREATE INDEX IF NOT EXISTS idx_users_company_id ON users(company_id);
+CREATE INDEX IF NOT EXISTS idx_users_company_created_id ON users(company_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_users_company_email_prefix ON users(company_id, email text_pattern_ops);
 
 -- Create refresh tokens table
 CREATE TABLE IF NOT EXISTS refresh_tokens (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-    token VARCHAR(500) UNIQUE NOT NULL,
+    token_hash BYTEA NOT NULL,  -- SHA-256 of the refresh token
+    family_id UUID NOT NULL DEFAULT uuid_generate_v4(),  -- shared by every rotation of one login
     expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-    revoked BOOLEAN DEFAULT false NOT NULL
+    revoked BOOLEAN DEFAULT false NOT NULL,
+    user_agent VARCHAR(255),  -- device that last used the session
+    ip_address VARCHAR(45)
 );
 
-CREATE INDEX IF NOT EXISTS idx_refresh_tokens_token ON refresh_tokens(token);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_refresh_tokens_active_hash ON refresh_tokens(token_hash) WHERE NOT revoked;
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_active_family ON refresh_tokens(family_id) WHERE NOT revoked;
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_expires_at ON refresh_tokens(expires_at);
 CREATE INDEX IF NOT EXISTS idx_refresh_tokens_user_id ON refresh_tokens(user_id);
 
+-- Create MFA backup codes table
+CREATE TABLE IF NOT EXISTS mfa_backup_codes (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    code_hash BYTEA NOT NULL,  -- HMAC-SHA256 of the normalized code
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    used_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mfa_backup_codes_user_hash ON mfa_backup_codes(user_id, code_hash);
+
+-- Create API keys table (only SHA-256 digests are stored)
+CREATE TABLE IF NOT EXISTS api_keys (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    company_id UUID NOT NULL REFERENCES companies(id) ON DELETE CASCADE,
+    name VARCHAR(100),
+    key_prefix VARCHAR(32) UNIQUE NOT NULL,  -- zlavox_live_ + first 12 hex characters
+    key_hash BYTEA NOT NULL,  -- SHA-256 of the full key
+    created_by UUID REFERENCES users(id) ON DELETE SET NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    revoked_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE INDEX IF NOT EXISTS idx_api_keys_company_id ON api_keys(company_id);
+CREATE INDEX IF NOT EXISTS idx_api_keys_updated_at ON api_keys(updated_at);
+
 -- Create audit logs table
 CREATE TABLE IF NOT EXISTS audit_logs (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -94,9 +127,10 @@ CREATE POLICY company_isolation_policy_audit_logs ON audit_logs
     FOR ALL
     USING (company_id::text = current_setting('app.current_company_id', true));
 
--- Note: RLS is not enabled on companies and refresh_tokens tables
+-- Note: RLS is not enabled on companies, refresh_tokens, mfa_backup_codes and api_keys tables
 -- Companies: Can be accessed by all (for registration)
--- Refresh tokens: Managed by application logic, not by RLS
+-- Refresh tokens, backup codes: Managed by application logic (always by user_id), not by RLS
+-- API keys: Resolved before any company context exists; the key determines the company
 
 -- ============================================
 -- Functions and Triggers
@@ -117,10 +151,17 @@ CREATE TRIGGER update_companies_updated_at
     FOR EACH ROW
     EXECUTE FUNCTION update_updated_at_column();
 
--- Trigger for users
+-- Trigger for users (recording a login is not a change to the account)
 CREATE TRIGGER update_users_updated_at
     BEFORE UPDATE ON users
     FOR EACH ROW
+    WHEN (OLD.last_login IS NOT DISTINCT FROM NEW.last_login)
+    EXECUTE FUNCTION update_updated_at_column();
+
+-- Trigger for API keys (updated_at drives the workers' incremental key refresh)
+CREATE TRIGGER update_api_keys_updated_at
+    BEFORE UPDATE ON api_keys
+    FOR EACH ROW
     EXECUTE FUNCTION update_updated_at_column();
 
 -- ============================================
@@ -139,16 +180,18 @@ GRANT ALL PRIVILEGES ON ALL SEQUENCES IN SCHEMA public TO postgres;
 
 COMMENT ON TABLE companies IS 'Stores company/organization information for multi-tenancy';
 COMMENT ON TABLE users IS 'Stores user accounts with MFA support';
-COMMENT ON TABLE refresh_tokens IS 'Stores JWT refresh tokens for session management';
+COMMENT ON TABLE refresh_tokens IS 'Stores SHA-256 digests of JWT refresh tokens for session management';
+COMMENT ON TABLE api_keys IS 'SHA-256 digests of company API keys (X-API-Key)';
+COMMENT ON TABLE mfa_backup_codes IS 'Keyed hashes of MFA backup codes, one row per code';
 COMMENT ON TABLE audit_logs IS 'Audit trail for security and compliance';
 
-COMMENT ON COLUMN users.mfa_secret IS 'Encrypted TOTP secret for MFA';
-COMMENT ON COLUMN users.mfa_backup_codes IS 'Encrypted backup codes (JSON array)';
+COMMENT ON COLUMN users.mfa_secret IS 'Encrypted TOTP secret for MFA (format | key version | nonce | ciphertext | tag)';
+COMMENT ON COLUMN users.mfa_backup_codes IS 'Legacy encrypted backup codes (JSON array), migrated to mfa_backup_codes';
 
 -- ============================================
 -- Database Info
 -- ============================================
 
 SELECT 'Database initialized successfully!' as status;
-SELECT 'Tables created: companies, users, refresh_tokens, audit_logs' as info;
+SELECT 'Tables created: companies, users, refresh_tokens, mfa_backup_codes, api_keys, audit_logs' as info;
 SELECT 'Row-Level Security enabled on: users, audit_logs' as security;
@@ -0,0 +1,18 @@
+-- Migration: Composite indexes for keyset-paginated user listing
+-- Date: 2026-10-16
+-- Description: Supports GET /api/users/ (cursor on created_at, id) and the
+--              NDJSON export with email prefix filtering for large tenants.
+--              CONCURRENTLY avoids blocking writes; run outside a transaction block.
+
+-- Keyset pagination: WHERE company_id = ? AND (created_at, id) > (?, ?) ORDER BY created_at, id
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_company_created_id
+    ON users (company_id, created_at, id);
+
+-- Email prefix filter: WHERE company_id = ? AND email LIKE 'prefix%'
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_company_email_prefix
+    ON users (company_id, email text_pattern_ops);
+
+-- idx_users_company_id is a prefix of idx_users_company_created_id and no longer needed
+DROP INDEX CONCURRENTLY IF EXISTS idx_users_company_id;
+
+SELECT 'Migration completed: Added idx_users_company_created_id and idx_users_company_email_prefix' as status;
@@ -0,0 +1,9 @@
+-- Migration: Allow longer refresh tokens
+-- Date: 2026-10-16
+-- Description: RS256-signed tokens (with a kid header) exceed 500 characters.
+--              VARCHAR -> TEXT is binary compatible, so this only updates the
+--              catalog: no table rewrite and the unique index is kept.
+
+ALTER TABLE refresh_tokens ALTER COLUMN token TYPE TEXT;
+
+SELECT 'Migration completed: refresh_tokens.token is now TEXT' as status;
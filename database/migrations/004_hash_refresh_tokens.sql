@@ -0,0 +1,62 @@
+-- Migration: Store refresh tokens as SHA-256 digests (phase 1 of 2: expand + backfill)
+-- Date: 2026-10-16
+-- Description: Adds refresh_tokens.token_hash (32-byte digest), backfills it in
+--              small committed batches, and indexes live tokens only.
+--              Run BEFORE deploying the application version that reads
+--              token_hash; run 005 once every instance has been updated.
+--              Must run outside a transaction block (psql autocommit) because
+--              of the per-batch COMMITs and CREATE INDEX CONCURRENTLY.
+--              Requires PostgreSQL 12+.
+
+-- 1. New column; nullable with no default, so this is a catalog-only change
+ALTER TABLE refresh_tokens ADD COLUMN IF NOT EXISTS token_hash BYTEA;
+
+-- The new application no longer writes the plaintext token
+ALTER TABLE refresh_tokens ALTER COLUMN token DROP NOT NULL;
+
+-- 2. Keep token_hash filled for rows inserted by not-yet-updated instances
+CREATE OR REPLACE FUNCTION refresh_tokens_fill_hash() RETURNS trigger AS $$
+BEGIN
+    IF NEW.token_hash IS NULL AND NEW.token IS NOT NULL THEN
+        NEW.token_hash := sha256(convert_to(NEW.token, 'UTF8'));
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS refresh_tokens_fill_hash ON refresh_tokens;
+CREATE TRIGGER refresh_tokens_fill_hash
+    BEFORE INSERT OR UPDATE OF token ON refresh_tokens
+    FOR EACH ROW EXECUTE FUNCTION refresh_tokens_fill_hash();
+
+-- 3. Backfill existing rows 5000 at a time; each batch commits, so row locks are
+--    short-lived and concurrent logins/refreshes are never blocked for long
+DO $$
+DECLARE
+    updated INTEGER;
+BEGIN
+    LOOP
+        UPDATE refresh_tokens
+        SET token_hash = sha256(convert_to(token, 'UTF8'))
+        WHERE id IN (
+            SELECT id FROM refresh_tokens
+            WHERE token_hash IS NULL AND token IS NOT NULL
+            LIMIT 5000
+            FOR UPDATE SKIP LOCKED
+        );
+        GET DIAGNOSTICS updated = ROW_COUNT;
+        COMMIT;
+        EXIT WHEN updated = 0;
+        PERFORM pg_sleep(0.05);
+    END LOOP;
+END;
+$$;
+
+-- 4. Lookup index on live tokens only, and the sweeper's expiry index
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_refresh_tokens_active_hash
+    ON refresh_tokens (token_hash) WHERE NOT revoked;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_refresh_tokens_expires_at
+    ON refresh_tokens (expires_at);
+
+SELECT 'Migration completed: refresh_tokens.token_hash backfilled and indexed' as status;
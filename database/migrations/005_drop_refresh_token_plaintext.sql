@@ -0,0 +1,32 @@
+-- Migration: Store refresh tokens as SHA-256 digests (phase 2 of 2: contract)
+-- Date: 2026-10-16
+-- Description: Run after 004 once every application instance writes token_hash.
+--              Enforces NOT NULL without a long ACCESS EXCLUSIVE lock and drops
+--              the plaintext token column with its full-width indexes.
+--              Run outside a transaction block (DROP INDEX CONCURRENTLY).
+
+-- Rows written by old instances after 004's backfill already got a hash from the
+-- trigger; this only catches stragglers
+UPDATE refresh_tokens
+SET token_hash = sha256(convert_to(token, 'UTF8'))
+WHERE token_hash IS NULL AND token IS NOT NULL;
+
+-- Plaintext-only rows that still have no hash can't be looked up any more
+DELETE FROM refresh_tokens WHERE token_hash IS NULL;
+
+-- NOT NULL via a validated CHECK: VALIDATE scans under a lock that allows reads
+-- and writes, then SET NOT NULL reuses the proof instead of rescanning
+ALTER TABLE refresh_tokens
+    ADD CONSTRAINT refresh_tokens_token_hash_not_null CHECK (token_hash IS NOT NULL) NOT VALID;
+ALTER TABLE refresh_tokens VALIDATE CONSTRAINT refresh_tokens_token_hash_not_null;
+ALTER TABLE refresh_tokens ALTER COLUMN token_hash SET NOT NULL;
+ALTER TABLE refresh_tokens DROP CONSTRAINT refresh_tokens_token_hash_not_null;
+
+DROP TRIGGER IF EXISTS refresh_tokens_fill_hash ON refresh_tokens;
+DROP FUNCTION IF EXISTS refresh_tokens_fill_hash();
+
+-- Plaintext column and its indexes
+DROP INDEX CONCURRENTLY IF EXISTS idx_refresh_tokens_token;
+ALTER TABLE refresh_tokens DROP COLUMN IF EXISTS token;
+
+SELECT 'Migration completed: refresh tokens are stored as digests only' as status;
@@ -0,0 +1,47 @@
+-- Migration: Refresh-token rotation families
+-- Date: 2026-10-16
+-- Description: Adds refresh_tokens.family_id. Every token rotated from one login
+--              shares a family, so reuse of a rotated token revokes the family
+--              with a single indexed UPDATE. Existing tokens each become their
+--              own family. Run after 005, outside a transaction block.
+
+-- 1. Nullable column (catalog-only), then a default that applies to new rows
+--    only, so instances that don't set family_id yet keep working. Adding the
+--    column with a volatile default directly would rewrite the table.
+ALTER TABLE refresh_tokens ADD COLUMN IF NOT EXISTS family_id UUID;
+ALTER TABLE refresh_tokens ALTER COLUMN family_id SET DEFAULT uuid_generate_v4();
+
+-- 2. Backfill existing rows in committed batches
+DO $$
+DECLARE
+    updated INTEGER;
+BEGIN
+    LOOP
+        UPDATE refresh_tokens
+        SET family_id = id
+        WHERE id IN (
+            SELECT id FROM refresh_tokens
+            WHERE family_id IS NULL
+            LIMIT 5000
+            FOR UPDATE SKIP LOCKED
+        );
+        GET DIAGNOSTICS updated = ROW_COUNT;
+        COMMIT;
+        EXIT WHEN updated = 0;
+        PERFORM pg_sleep(0.05);
+    END LOOP;
+END;
+$$;
+
+-- 3. NOT NULL without a long exclusive lock (see 005)
+ALTER TABLE refresh_tokens
+    ADD CONSTRAINT refresh_tokens_family_id_not_null CHECK (family_id IS NOT NULL) NOT VALID;
+ALTER TABLE refresh_tokens VALIDATE CONSTRAINT refresh_tokens_family_id_not_null;
+ALTER TABLE refresh_tokens ALTER COLUMN family_id SET NOT NULL;
+ALTER TABLE refresh_tokens DROP CONSTRAINT refresh_tokens_family_id_not_null;
+
+-- 4. Family revocation only ever needs the family's live token
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_refresh_tokens_active_family
+    ON refresh_tokens (family_id) WHERE NOT revoked;
+
+SELECT 'Migration completed: Added refresh_tokens.family_id' as status;
@@ -0,0 +1,26 @@
+-- Migration: Per-code MFA backup-code rows
+-- Date: 2026-10-16
+-- Description: Adds mfa_backup_codes with one keyed hash (HMAC-SHA256) per
+--              backup code, so a code is used up by a single conditional
+--              UPDATE instead of decrypting and rewriting users.mfa_backup_codes.
+--              The legacy column stays: the application moves a user's codes
+--              into rows the first time they are needed, and
+--              `python -m app.utils.backup_codes` migrates the rest in batches
+--              (hashing needs the application's key, so it can't be done here).
+--              Drop users.mfa_backup_codes once that has run on every instance.
+
+CREATE TABLE IF NOT EXISTS mfa_backup_codes (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    code_hash BYTEA NOT NULL,  -- HMAC-SHA256 of the normalized code
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    used_at TIMESTAMP WITH TIME ZONE
+);
+
+-- New table, so no CONCURRENTLY needed
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mfa_backup_codes_user_hash ON mfa_backup_codes(user_id, code_hash);
+
+COMMENT ON TABLE mfa_backup_codes IS 'Keyed hashes of MFA backup codes, one row per code';
+COMMENT ON COLUMN users.mfa_backup_codes IS 'Legacy encrypted backup codes (JSON array), migrated to mfa_backup_codes';
+
+SELECT 'Migration completed: Added mfa_backup_codes table' as status;
@@ -0,0 +1,68 @@
+-- Migration: Hashed API keys
+-- Date: 2026-10-16
+-- Description: Moves API keys out of companies.api_key (plaintext) into
+--              api_keys, which stores only a SHA-256 digest plus the public
+--              prefix used to find it (zlavox_live_ + 12 hex characters).
+--              Several keys per company, each revocable. Needs PostgreSQL 11+
+--              for sha256(). Fails, changing nothing, if two existing keys
+--              share a prefix: issue one of those companies a new key first.
+
+-- One transaction: psql carries on after an error, and nothing below (the
+-- DROP COLUMN in particular) may run once a check has failed
+BEGIN;
+
+-- Keys are looked up by prefix, so two keys with the same one can't both be
+-- migrated; refuse rather than silently dropping a customer's key
+DO $$
+DECLARE
+    collisions TEXT;
+BEGIN
+    SELECT string_agg(format('%s (companies %s)', prefix, company_ids), '; ')
+    INTO collisions
+    FROM (
+        SELECT left(api_key, 24) AS prefix, string_agg(id::text, ', ' ORDER BY id) AS company_ids
+        FROM companies
+        WHERE api_key IS NOT NULL
+        GROUP BY left(api_key, 24)
+        HAVING count(*) > 1
+    ) duplicates;
+    IF collisions IS NOT NULL THEN
+        RAISE EXCEPTION 'API keys share a lookup prefix: %', collisions
+            USING HINT = 'Give all but one company in each group a new companies.api_key, then rerun this migration';
+    END IF;
+END $$;
+
+CREATE TABLE IF NOT EXISTS api_keys (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    company_id UUID NOT NULL REFERENCES companies(id) ON DELETE CASCADE,
+    name VARCHAR(100),
+    key_prefix VARCHAR(32) UNIQUE NOT NULL,
+    key_hash BYTEA NOT NULL,  -- SHA-256 of the full key
+    created_by UUID REFERENCES users(id) ON DELETE SET NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    revoked_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE INDEX IF NOT EXISTS idx_api_keys_company_id ON api_keys(company_id);
+-- Workers refresh their in-memory key index from rows changed since the last poll
+CREATE INDEX IF NOT EXISTS idx_api_keys_updated_at ON api_keys(updated_at);
+
+CREATE TRIGGER update_api_keys_updated_at
+    BEFORE UPDATE ON api_keys
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at_column();
+
+-- Existing keys keep working: store their digests, then drop the plaintext
+INSERT INTO api_keys (company_id, name, key_prefix, key_hash)
+SELECT id, 'migrated', left(api_key, 24), sha256(convert_to(api_key, 'UTF8'))
+FROM companies
+WHERE api_key IS NOT NULL;
+
+ALTER TABLE companies DROP COLUMN IF EXISTS api_key;
+
+COMMENT ON TABLE api_keys IS 'SHA-256 digests of company API keys (X-API-Key)';
+
+SELECT 'Migration completed: Moved company API keys to hashed api_keys' as status;
+
+COMMIT;
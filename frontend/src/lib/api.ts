@@ -22,6 +22,29 @@ api.interceptors.request.use(
   (error) => Promise.reject(error)
 );
 
+// One refresh at a time: refresh tokens are single-use, so requests that
+// fail together must share the rotated pair instead of each spending the
+// same refresh token
+let refreshing: Promise<string> | null = null;
+
+const refreshAccessToken = (refreshToken: string): Promise<string> => {
+  if (!refreshing) {
+    refreshing = axios
+      .post(`${API_URL}/api/auth/refresh`, { refresh_token: refreshToken })
+      .then((response) => {
+        const { access_token, refresh_token } = response.data;
+        Cookies.set('access_token', access_token);
+        // The old refresh token is now spent; using it again logs the user out
+        Cookies.set('refresh_token', refresh_token);
+        return access_token as string;
+      })
+      .finally(() => {
+        refreshing = null;
+      });
+  }
+  return refreshing;
+};
+
 // Response interceptor to handle token refresh
 api.interceptors.response.use(
   (response) => response,
@@ -35,12 +58,7 @@ api.interceptors.response.use(
       try {
         const refreshToken = Cookies.get('refresh_token');
         if (refreshToken) {
-          const response = await axios.post(`${API_URL}/api/auth/refresh`, {
-            refresh_token: refreshToken,
-          });
-
-          const { access_token } = response.data;
-          Cookies.set('access_token', access_token);
+          const access_token = await refreshAccessToken(refreshToken);
 
           originalRequest.headers.Authorization = `Bearer ${access_token}`;
           return api(originalRequest);
@@ -77,7 +95,7 @@ export const authAPI = {
   logout: (refreshToken: string) =>
     api.post('/api/auth/logout', { refresh_token: refreshToken }),
 
-  setupMFA: () => api.post('/api/auth/mfa/setup'),
+  setupMFA: () => api.post('/api/auth/mfa/setup', null, { params: { format: 'svg' } }),
 
   enableMFA: (code: string) => api.post('/api/auth/mfa/enable', { code }),
 
@@ -94,7 +112,21 @@ export const usersAPI = {
   getProfile: () => api.get('/api/users/me'),
   updateProfile: (data: { full_name?: string; email?: string }) =>
     api.put('/api/users/me', data),
-  listUsers: () => api.get('/api/users/'),
+  // One page; pass the previous page's X-Next-Cursor header as `cursor`
+  listUsersPage: (params: { limit?: number; cursor?: string } = {}) =>
+    api.get('/api/users/', { params }),
+  // Every company user: follows X-Next-Cursor until the last page
+  listUsers: async () => {
+    const users: unknown[] = [];
+    let cursor: string | undefined;
+    let response;
+    do {
+      response = await api.get('/api/users/', { params: { limit: 1000, cursor } });
+      users.push(...response.data);
+      cursor = response.headers['x-next-cursor'];
+    } while (cursor);
+    return { ...response, data: users };
+  },
 };
 
 export default api;